@@ -1,17 +1,54 @@
 # github520_app.py
+import time
+# 程序启动时刻，用于统计启动耗时，需在其他导入之前记录
+STARTUP_TIME = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import urllib.request
-import urllib.error
+from tkinter import font as tkfont
+import urllib.parse
 import os
 import sys
 from datetime import datetime
 import json
-import shutil
-import webbrowser
-import time
 import logging
-import ctypes
+import queue
+import threading
+
+import metrics
+import history_log
+import hosts_core
+import jobs
+import hosts_diff
+import netprobe
+import tracing
+from config_store import ConfigStore
+from hosts_preview import HostsPreview
+from line_index import LineIndex
+from timeseries import TimeSeriesStore
+from hosts_core import get_hosts_path, read_hosts_file, parse_hosts_entries, hosts_mapping
+
+# 检查更新的仓库，与release_client.DEFAULT_REPO相同（release_client等网络模块在检查更新时才导入，不拖慢启动）
+GITHUB_REPO = "2489742701/GithubFasterChina"
+
+# 备份管理器每页显示的备份数
+BACKUP_PAGE_SIZE = 100
+
+# 网络诊断、刷新DNS等调用系统命令的后台任务的超时(秒)，超时后界面不再等待结果
+NETWORK_JOB_TIMEOUT = 60
+
+# 备份类型 -> 显示名称
+BACKUP_REASON_NAMES = {
+    'update': "GitHub更新",
+    'steam_update': "Steam更新",
+    'before_restore': "恢复前",
+    'original': "原始备份",
+    'other': "其他",
+}
+
+# 筛选框选项 -> 备份类型（None表示全部）
+BACKUP_REASON_FILTERS = {"全部": None}
+BACKUP_REASON_FILTERS.update({name: [reason] for reason, name in BACKUP_REASON_NAMES.items()})
 
 class GitHub520App:
     def __init__(self, root):
@@ -30,22 +67,44 @@ class GitHub520App:
         # 初始化日志系统
         self.setup_logging()
         
-        # 检查管理员权限
-        self.is_admin = self.check_admin_privileges()
-        if not self.is_admin:
-            self.show_admin_warning()
+        # 管理员权限在窗口显示后检查（见finish_startup）
+        self.is_admin = None
         
-        self.config_file = "github520_config.json"
+        self.config_file = hosts_core.CONFIG_FILE
         self.current_hosts = ""
-        self.update_history = []
+        self.history = None         # 更新历史日志，在load_config中打开
+        self.last_fetch = {}        # 最近一次获取GitHub hosts的来源、耗时和字节数
+        self.steam_last_fetch = {}
+        
+        # 更新前后测速对比设置
+        self.benchmark_enabled = False
+        self.benchmark_url = "https://raw.githubusercontent.com/521xueweihan/GitHub520/main/README.md"
+        
+        # 本地OpenMetrics指标端点（默认关闭）
+        self.metrics_enabled = False
+        self.metrics_port = 9464
+        self.metrics_server = None
         
         # 备份目录设置
-        self.backup_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backup")
-        self.original_backup = os.path.join(self.backup_dir, "hosts.original_backup")
+        self.backup_dir = hosts_core.BACKUP_DIR
+        self.original_backup = hosts_core.ORIGINAL_BACKUP
         
         # 创建备份目录
         os.makedirs(self.backup_dir, exist_ok=True)
         
+        # 探测与诊断结果的时序存储，在窗口显示后打开
+        self.timeseries = None
+        
+        # 后台线程的结果通过此队列交给主线程处理
+        self.ui_queue = queue.Queue()
+        
+        # 耗时操作作为后台任务执行（同一操作不会重复执行），回调同样通过ui_queue在主线程执行
+        self.jobs = jobs.JobExecutor(self.run_in_ui)
+        
+        # 启动耗时统计(毫秒)
+        self.startup_timings = {}
+        self.startup_benchmark = False
+        
         logging.info("程序启动成功")
         
         # DNS服务器列表
@@ -56,119 +115,219 @@ class GitHub520App:
             "223.5.5.5",
             "119.29.29.29"
         ]
+        # 以下设置会保存到配置文件，启动时在load_config中恢复
+        self.dns_choice = self.dns_servers[0]
+        self.custom_dns_value = ""
+        self.steam_source = "GitMirror国内镜像"
+        self.font_size_setting = 9
+        self.saved_source = None
         # hosts源配置
-        self.hosts_sources = {
-            "GitHub520": "https://raw.hellogithub.com/hosts",
-            "TinsFox": "https://github-hosts.tinsfox.com/hosts"
-        }
+        self.hosts_sources = dict(hosts_core.HOSTS_SOURCES)
         self.current_source = "GitHub520"
+        # 局域网缓存节点（配置文件中的 lan_sources），优先于上游源
+        self.lan_sources = []
         
         # GitHub配置项
-        self.github_repo = "2489742701/GithubFasterChina"
+        self.github_repo = GITHUB_REPO
         self.current_version = "2.0.0"
-        self.api_url = f"https://api.github.com/repos/{self.github_repo}/releases/latest"
+        # 返回与Release API相同JSON的镜像地址（配置文件中的 release_mirrors），API被限流时使用
+        self.release_mirrors = []
         self.releases_url = f"https://github.com/{self.github_repo}/releases"
         
         self.load_config()
-        self.backup_original_hosts()  # 备份原始hosts
+        self.add_lan_sources()
         self.setup_ui()
+        self.process_ui_queue()
         self.load_hosts_data()
+        
+        # 非关键的启动工作推迟到首次绘制之后
+        self.root.after_idle(self.on_first_paint)
+    
+    def on_first_paint(self):
+        """首次空闲时窗口已完成绘制，记录耗时后执行推迟的启动工作"""
+        self.startup_timings['first_paint_ms'] = round((time.perf_counter() - STARTUP_TIME) * 1000, 1)
+        self.root.after(1, self.finish_startup)
+    
+    def finish_startup(self):
+        """执行推迟的启动工作：权限检查、原始hosts备份、时序数据库和指标端点"""
+        self.is_admin = self.check_admin_privileges()
+        self.backup_original_hosts()  # 备份原始hosts
+        self.timeseries = self.open_timeseries_store()
+        self.start_metrics_server()
+        if not self.is_admin:
+            self.show_admin_warning()
+        self.root.after_idle(self.on_interactive)
+    
+    def on_interactive(self):
+        """启动工作全部完成，界面可以响应操作"""
+        self.startup_timings['interactive_ms'] = round((time.perf_counter() - STARTUP_TIME) * 1000, 1)
+        logging.info(f"启动耗时: 首次绘制 {self.startup_timings['first_paint_ms']}ms，"
+                     f"可交互 {self.startup_timings['interactive_ms']}ms")
+        if self.startup_benchmark:
+            print(json.dumps(self.startup_timings))
+            self.root.destroy()
     
     def backup_original_hosts(self):
         """备份用户原始hosts文件"""
         try:
-            if os.name == 'nt':  # Windows
-                hosts_path = r'C:\Windows\System32\drivers\etc\hosts'
-            else:  # Linux/Mac
-                hosts_path = '/etc/hosts'
-            
             # 如果原始备份不存在，且系统hosts文件存在，则创建备份
-            if not os.path.exists(self.original_backup) and os.path.exists(hosts_path):
-                shutil.copy2(hosts_path, self.original_backup)
+            if hosts_core.backup_original_hosts(self.original_backup):
                 print(f"原始hosts已备份到: {self.original_backup}")
         except Exception as e:
             print(f"备份原始hosts失败: {e}")
     
     def check_admin_privileges(self):
         """检查是否有管理员权限"""
-        try:
-            if os.name == 'nt':  # Windows系统
-                # 使用ctypes检查Windows管理员权限
-                return ctypes.windll.shell32.IsUserAnAdmin() != 0
-            else:  # Linux/Mac系统
-                # 检查是否为root用户
-                return os.geteuid() == 0
-        except:
-            logging.error("检查管理员权限时出错")
-            return False
+        return hosts_core.is_admin()
     
     def show_admin_warning(self):
-        """显示没有管理员权限的警告弹窗"""
+        """在页面顶部显示没有管理员权限的提示条（不阻塞操作）"""
         # 记录警告
         logging.warning("程序以普通用户权限启动，某些功能可能无法使用")
         
-        # 创建自定义警告弹窗
-        warning_window = tk.Toplevel(self.root)
-        warning_window.title("权限警告")
-        warning_window.geometry("400x250")
-        warning_window.resizable(False, False)
-        warning_window.transient(self.root)
-        warning_window.grab_set()  # 模态窗口
-        
-        # 设置样式
         style = ttk.Style()
-        style.configure("Warning.TLabel", font=("Arial", 11), foreground="#d32f2f")
-        style.configure("Info.TLabel", font=("Arial", 10), foreground="#333333")
-        style.configure("Warning.TButton", font=("Arial", 10))
-        
-        # 主框架
-        main_frame = ttk.Frame(warning_window, padding="20")
-        main_frame.pack(fill=tk.BOTH, expand=True)
-        
-        # 警告图标和标题
-        warning_label = ttk.Label(main_frame, text="⚠️ 权限警告", style="Warning.TLabel")
-        warning_label.pack(pady=(0, 15))
-        
-        # 警告信息
-        message_text = """当前程序没有以管理员权限运行，这可能导致：
-
-• 无法更新系统hosts文件
-• 无法备份或恢复hosts文件
-• 部分核心功能不可用
-
-请关闭程序，右键点击程序图标，选择"以管理员身份运行"，以获得完整功能。"""
+        style.configure("Banner.TFrame", background="#fff3cd")
+        style.configure("Banner.TLabel", background="#fff3cd", foreground="#8a6d3b", font=("Arial", 10))
         
-        message_label = ttk.Label(main_frame, text=message_text, style="Info.TLabel", justify=tk.LEFT)
-        message_label.pack(fill=tk.BOTH, expand=True, pady=(0, 20))
+        banner = ttk.Frame(self.banner_frame, style="Banner.TFrame", padding=(10, 6))
+        banner.pack(fill=tk.X, pady=(0, 5))
         
-        # 确认按钮
-        button_frame = ttk.Frame(main_frame)
-        button_frame.pack(fill=tk.X)
+        ttk.Label(banner, text="⚠️ 当前没有以管理员权限运行：无法更新、备份或恢复hosts文件",
+                  style="Banner.TLabel").pack(side=tk.LEFT)
         
-        ok_button = ttk.Button(button_frame, text="我知道了", style="Warning.TButton", 
-                             command=warning_window.destroy)
-        ok_button.pack(side=tk.RIGHT)
+        ttk.Button(banner, text="×", width=3, command=banner.destroy).pack(side=tk.RIGHT)
+        if os.name == 'nt':
+            ttk.Button(banner, text="以管理员身份重新启动",
+                       command=self.restart_as_admin).pack(side=tk.RIGHT, padx=(0, 5))
+    
+    def restart_as_admin(self):
+        """以管理员权限重新启动程序（Windows）"""
+        try:
+            import ctypes
+            ctypes.windll.shell32.ShellExecuteW(None, "runas", sys.executable, " ".join(sys.argv), None, 1)
+            self.root.destroy()
+        except Exception as e:
+            logging.error(f"以管理员身份重新启动失败: {str(e)}")
+            messagebox.showerror("错误", f"以管理员身份重新启动失败: {str(e)}")
+    
+    def run_in_ui(self, callback, *args):
+        """从后台线程提交需要在主线程执行的回调（Tk控件只能在主线程访问）"""
+        self.ui_queue.put((callback, args))
+    
+    def process_ui_queue(self):
+        """在主线程执行后台线程提交的回调，由root.after定时调用"""
+        while True:
+            try:
+                callback, args = self.ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception as e:
+                logging.error(f"界面回调执行失败: {str(e)}")
+        self.root.after(50, self.process_ui_queue)
+    
+    def open_timeseries_store(self):
+        """打开探测结果时序数据库，失败时返回None（不影响其他功能）"""
+        try:
+            return TimeSeriesStore(hosts_core.PROBE_DB)
+        except Exception as e:
+            logging.error(f"打开时序数据库失败: {str(e)}")
+            return None
+    
+    def record_timeseries(self, method, *args):
+        """向时序数据库写入数据，写入失败只记录日志"""
+        if self.timeseries is None:
+            return
+        try:
+            getattr(self.timeseries, method)(*args)
+        except Exception as e:
+            logging.warning(f"写入时序数据失败: {str(e)}")
+    
+    def add_lan_sources(self):
+        """把局域网缓存节点加到hosts源列表最前面，并默认使用第一个节点；上次选择的源仍可用时继续使用"""
+        if self.lan_sources:
+            lan_sources = {f"局域网缓存 {urllib.parse.urlparse(url).netloc}": f"{url}/hosts"
+                           for url in self.lan_sources}
+            self.hosts_sources = {**lan_sources, **hosts_core.HOSTS_SOURCES}
+            self.current_source = next(iter(lan_sources))
+        if self.saved_source in self.hosts_sources:
+            self.current_source = self.saved_source
+    
+    def lan_source_urls(self):
+        """局域网缓存节点的hosts地址"""
+        return [f"{url}/hosts" for url in self.lan_sources]
+    
+    def start_metrics_server(self):
+        """按配置启动本地指标端点 http://127.0.0.1:端口/metrics"""
+        metrics.BACKUP_DIR_BYTES.set_function(lambda: metrics.directory_size(self.backup_dir))
+        if not self.metrics_enabled:
+            return
+        try:
+            self.metrics_server = metrics.MetricsServer(port=self.metrics_port).start()
+            logging.info(f"指标端点已启动: http://127.0.0.1:{self.metrics_port}/metrics")
+        except Exception as e:
+            logging.error(f"启动指标端点失败: {str(e)}")
     
     def load_config(self):
         """加载配置和历史记录"""
-        if os.path.exists(self.config_file):
-            try:
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                    self.update_history = config.get('update_history', [])
-            except:
-                self.update_history = []
+        self.config_store = ConfigStore(self.config_file)
+        
+        try:
+            # 旧版本保存在配置文件中的历史记录会在首次打开时导入
+            self.history = history_log.open_history(config_file=self.config_file)
+            # 旧记录已经写入配置目录中的日志文件后才从配置中删除
+            if os.path.exists(self.history.path):
+                self.config_store.remove('update_history')
+        except Exception as e:
+            logging.error(f"打开历史记录失败: {str(e)}")
+            # 不导入旧记录，直接打开日志（读取失败时为空）
+            self.history = history_log.HistoryLog(history_log.history_path(self.config_file))
+        
+        try:
+            benchmark = self.config_store.get('benchmark', {})
+            self.benchmark_enabled = benchmark.get('enabled', self.benchmark_enabled)
+            self.benchmark_url = benchmark.get('url', self.benchmark_url)
+            metrics_config = self.config_store.get('metrics', {})
+            self.metrics_enabled = metrics_config.get('enabled', self.metrics_enabled)
+            self.metrics_port = metrics_config.get('port', self.metrics_port)
+            
+            ui = self.config_store.get('ui', {})
+            self.saved_source = ui.get('source')
+            self.steam_source = ui.get('steam_source', self.steam_source)
+            self.font_size_setting = min(20, max(8, int(ui.get('font_size', self.font_size_setting))))
+            
+            dns = self.config_store.get('dns', {})
+            self.dns_choice = dns.get('server', self.dns_choice)
+            self.custom_dns_value = dns.get('custom', self.custom_dns_value)
+            
+            self.lan_sources = hosts_core.lan_sources(self.config_file)
+            mirrors = self.config_store.get('release_mirrors', [])
+            self.release_mirrors = [mirrors] if isinstance(mirrors, str) else list(mirrors)
+        except Exception as e:
+            logging.warning(f"配置文件格式错误，使用默认设置: {str(e)}")
     
     def save_config(self):
-        """保存配置和历史记录"""
-        config = {
-            'update_history': self.update_history[-10:]  # 只保留最近10次记录
-        }
-        try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, ensure_ascii=False, indent=2)
-        except:
-            pass
+        """保存配置（短时间内的多次修改会合并，稍后在后台线程写入）"""
+        self.config_store.update({
+            'benchmark': {
+                'enabled': self.benchmark_enabled,
+                'url': self.benchmark_url
+            },
+            'metrics': {
+                'enabled': self.metrics_enabled,
+                'port': self.metrics_port
+            },
+            'ui': {
+                'source': self.current_source,
+                'steam_source': self.steam_source,
+                'font_size': self.font_size_setting
+            },
+            'dns': {
+                'server': self.dns_choice,
+                'custom': self.custom_dns_value
+            }
+        })
     
     def setup_ui(self):
         """设置用户界面 - 带侧边栏的横向布局"""
@@ -221,25 +380,26 @@ class GitHub520App:
         self.thanks_btn.pack(fill=tk.X, pady=(5, 0))
         
         # 更新按钮
-        self.update_btn = ttk.Button(nav_buttons_frame, text="🔄 检查更新", 
+        self.update_nav_btn = ttk.Button(nav_buttons_frame, text="🔄 检查更新", 
                                    command=self.show_update_content,
                                    style="Sidebar.TButton")
-        self.update_btn.pack(fill=tk.X, pady=(5, 0))
+        self.update_nav_btn.pack(fill=tk.X, pady=(5, 0))
         
         # 样式配置
         self.configure_styles()
         
         # ========== 主内容区域 ==========
+        # 提示条区域（如权限提示），位于各页面上方
+        self.banner_frame = ttk.Frame(content_frame)
+        self.banner_frame.pack(side=tk.TOP, fill=tk.X)
+        
         self.main_content_frame = ttk.Frame(content_frame)
         self.thanks_content_frame = ttk.Frame(content_frame)
         self.steam_content_frame = ttk.Frame(content_frame)
         self.update_content_frame = ttk.Frame(content_frame)
         
-        # 初始化显示主程序内容
+        # 只构建主程序页面，其他页面在首次切换时构建
         self.setup_main_content()
-        self.setup_thanks_content()
-        self.setup_steam_content()
-        self.setup_update_content()
         
         # 设置初始按钮状态
         self.main_btn.config(style="Pressed.TButton")
@@ -291,10 +451,14 @@ class GitHub520App:
         self.main_btn.config(style="Pressed.TButton")
         self.thanks_btn.config(style="Sidebar.TButton")
         self.steam_btn.config(style="Sidebar.TButton")
-        self.update_btn.config(style="Sidebar.TButton")
+        self.update_nav_btn.config(style="Sidebar.TButton")
     
     def show_thanks_content(self):
         """显示致谢内容"""
+        # 首次显示时构建致谢页面
+        if len(self.thanks_content_frame.winfo_children()) == 0:
+            self.setup_thanks_content()
+        
         # 隐藏其他内容
         self.main_content_frame.pack_forget()
         self.steam_content_frame.pack_forget()
@@ -307,10 +471,14 @@ class GitHub520App:
         self.main_btn.config(style="Sidebar.TButton")
         self.thanks_btn.config(style="Pressed.TButton")
         self.steam_btn.config(style="Sidebar.TButton")
-        self.update_btn.config(style="Sidebar.TButton")
+        self.update_nav_btn.config(style="Sidebar.TButton")
         
     def show_update_content(self):
         """显示更新页面内容"""
+        # 首次显示时构建更新页面
+        if len(self.update_content_frame.winfo_children()) == 0:
+            self.setup_update_content()
+        
         # 隐藏其他内容
         self.main_content_frame.pack_forget()
         self.steam_content_frame.pack_forget()
@@ -323,7 +491,7 @@ class GitHub520App:
         self.main_btn.config(style="Sidebar.TButton")
         self.thanks_btn.config(style="Sidebar.TButton")
         self.steam_btn.config(style="Sidebar.TButton")
-        self.update_btn.config(style="Pressed.TButton")
+        self.update_nav_btn.config(style="Pressed.TButton")
         
     def setup_update_content(self):
         """设置更新页面内容"""
@@ -399,28 +567,20 @@ class GitHub520App:
         self.download_update_btn.config(state=tk.DISABLED)
         self.latest_version = None
         self.download_url = None
+        self.update_asset = None
         
     def check_for_updates(self):
-        """检查程序更新"""
-        try:
-            import requests
-            from packaging import version
-            
-            # 更新界面状态
-            self.update_status_label.config(text="正在检查最新版本，请稍候...")
-            self.check_update_btn.config(state=tk.DISABLED)
-            self.update_content_frame.update_idletasks()
-            
-            # 发送请求获取最新版本信息
-            response = requests.get(self.api_url, timeout=10)
-            response.raise_for_status()
-            
-            # 解析版本信息
-            latest_info = response.json()
-            latest_version = latest_info['tag_name'].lstrip('v')
-            release_notes = latest_info['body']
-            download_url = latest_info['assets'][0]['browser_download_url'] if latest_info['assets'] else None
-            
+        """检查程序更新（在后台线程获取版本信息，不阻塞界面）
+        
+        版本信息会缓存，短时间内重复检查直接使用缓存；API被限流时使用局域网缓存节点或镜像
+        """
+        import release_client
+        
+        client = release_client.ReleaseClient(self.github_repo, lan_urls=self.lan_sources,
+                                              mirrors=self.release_mirrors)
+        current_version = self.current_version
+        
+        def show_result(latest_version, release_notes, asset, is_newer, source):
             # 更新界面显示
             self.latest_version = latest_version
             self.latest_version_label.config(text=f"v{latest_version}")
@@ -431,22 +591,54 @@ class GitHub520App:
             self.update_info_text.insert(tk.END, release_notes)
             self.update_info_text.config(state=tk.DISABLED)
             
-            # 比较版本
-            if version.parse(latest_version) > version.parse(self.current_version):
+            download_url = asset['url'] if asset else None
+            # 不是刚从API获取的信息时注明来源
+            source_text = "" if source in ('api', 'not_modified') else \
+                f"（版本信息来自{release_client.SOURCE_NAMES.get(source, source)}）"
+            if is_newer and not download_url:
+                self.update_status_label.config(text=f"发现新版本！请访问发布页面下载。{source_text}")
+                self.download_url = None
+                self.update_asset = None
+                self.download_update_btn.config(state=tk.DISABLED)
+            elif is_newer:
                 # 有新版本
-                self.update_status_label.config(text="发现新版本！请点击下载更新按钮获取最新版本。")
+                self.update_status_label.config(text=f"发现新版本！请点击下载更新按钮获取最新版本。{source_text}")
                 self.download_url = download_url
+                self.update_asset = asset
                 self.download_update_btn.config(state=tk.NORMAL if download_url else tk.DISABLED)
             else:
-                self.update_status_label.config(text="当前已是最新版本！")
+                self.update_status_label.config(text=f"当前已是最新版本！{source_text}")
                 self.download_update_btn.config(state=tk.DISABLED)
-                
-        except Exception as e:
-            logging.error(f"检查更新失败: {str(e)}")
-            self.update_status_label.config(text=f"检查更新时出错：{str(e)}")
-        finally:
             self.check_update_btn.config(state=tk.NORMAL)
+        
+        def show_error(error):
+            self.update_status_label.config(text=f"检查更新时出错：{str(error)}")
+            self.check_update_btn.config(state=tk.NORMAL)
+        
+        def do_check(job):
+            from packaging import version
+            import delta_update
+            import downloader
             
+            # 获取最新版本信息（缓存、ETag条件请求，限流时使用备用来源）
+            latest_info, source = client.latest()
+            logging.info(f"最新版本信息来源: {source}，API额度: {client.rate_limit()}")
+            
+            # 解析版本信息并比较
+            latest_version = latest_info['tag_name'].lstrip('v')
+            is_newer = version.parse(latest_version) > version.parse(current_version)
+            asset = downloader.release_asset(latest_info)
+            # 打包的程序可以使用从当前版本升级的增量补丁
+            if asset and is_newer and delta_update.current_executable():
+                asset['patch'] = delta_update.find_patch(latest_info, current_version)
+            return latest_version, latest_info.get('body') or "", asset, is_newer, source
+        
+        if self.jobs.submit("检查更新", do_check, key='check_update', timeout=NETWORK_JOB_TIMEOUT,
+                            on_done=lambda result: show_result(*result), on_error=show_error) is None:
+            return
+        self.update_status_label.config(text="正在检查最新版本，请稍候...")
+        self.check_update_btn.config(state=tk.DISABLED)
+    
     def start_download_update(self):
         """开始下载更新"""
         if hasattr(self, 'download_url') and self.download_url:
@@ -458,80 +650,137 @@ class GitHub520App:
         webbrowser.open(self.releases_url)
             
     def download_update(self, download_url):
-        """下载更新文件"""
-        try:
-            import requests
-            from tkinter import ttk
-            import tempfile
-            import os
-            import webbrowser
-            
-            # 创建进度窗口
-            progress_window = tk.Toplevel(self.root)
-            progress_window.title("下载更新")
-            progress_window.geometry("400x150")
-            progress_window.resizable(False, False)
-            progress_window.transient(self.root)
-            progress_window.grab_set()
-            
-            # 进度标签
-            progress_label = ttk.Label(progress_window, text="正在下载更新文件...")
-            progress_label.pack(pady=20)
-            
-            # 进度条
-            progress_var = tk.DoubleVar()
-            progress_bar = ttk.Progressbar(progress_window, variable=progress_var, length=350)
-            progress_bar.pack(pady=10)
-            
-            # 百分比标签
-            percent_label = ttk.Label(progress_window, text="0%")
-            percent_label.pack()
-            
-            # 下载文件
-            temp_dir = tempfile.gettempdir()
-            filename = os.path.basename(download_url)
-            filepath = os.path.join(temp_dir, filename)
-            
-            # 定义回调函数更新进度
-            def update_progress(count, block_size, total_size):
-                if total_size > 0:
-                    percent = int(count * block_size * 100 / total_size)
-                    progress_var.set(percent)
-                    percent_label.config(text=f"{percent}%")
-                    progress_window.update_idletasks()
-            
-            # 下载文件
-            with open(filepath, 'wb') as f:
-                with requests.get(download_url, stream=True, timeout=30) as r:
-                    r.raise_for_status()
-                    total_size = int(r.headers.get('content-length', 0))
-                    downloaded = 0
-                    for chunk in r.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            update_progress(downloaded, 1, total_size)
-            
-            # 下载完成
-            progress_window.destroy()
-            
-            # 提示用户
-            if tk.messagebox.askyesno("下载完成", f"更新文件已下载完成：\n{filepath}\n\n是否打开文件所在文件夹？"):
-                # 打开文件所在文件夹
-                os.startfile(os.path.dirname(filepath))
-                
-        except Exception as e:
-            logging.error(f"下载更新失败: {str(e)}")
-            tk.messagebox.showerror("下载失败", f"下载更新文件时出错：{str(e)}")
+        """下载更新文件（后台任务下载，支持断点续传和取消，下载后校验大小和SHA-256）"""
+        import tempfile
+        import delta_update
+        import downloader
+        
+        if self.jobs.is_running('download_update'):
+            return
+        
+        # 创建进度窗口
+        progress_window = tk.Toplevel(self.root)
+        progress_window.title("下载更新")
+        progress_window.geometry("400x190")
+        progress_window.resizable(False, False)
+        progress_window.transient(self.root)
+        progress_window.grab_set()
+        
+        # 进度标签
+        progress_label = ttk.Label(progress_window, text="正在下载更新文件...")
+        progress_label.pack(pady=(20, 10))
+        
+        # 进度条
+        progress_var = tk.DoubleVar()
+        progress_bar = ttk.Progressbar(progress_window, variable=progress_var, length=350)
+        progress_bar.pack(pady=5)
+        
+        # 百分比和速度标签
+        percent_label = ttk.Label(progress_window, text="0%")
+        percent_label.pack()
+        
+        # 取消按钮：通知下载任务停止，已下载的部分保留供下次续传
+        def cancel():
+            job.cancel()
+            cancel_btn.config(state=tk.DISABLED, text="正在取消...")
+        
+        cancel_btn = ttk.Button(progress_window, text="取消", command=cancel)
+        cancel_btn.pack(pady=10)
+        progress_window.protocol("WM_DELETE_WINDOW", cancel)
+        self.download_update_btn.config(state=tk.DISABLED)
+        
+        # 下载文件（未完成的部分保存在 <文件名>.part，再次下载时续传）
+        temp_dir = tempfile.gettempdir()
+        filename = os.path.basename(download_url)
+        filepath = os.path.join(temp_dir, filename)
+        
+        # 发布时公布的大小和摘要
+        asset = self.update_asset if self.update_asset and self.update_asset.get('url') == download_url else {}
+        
+        # 后台任务报告的进度在主线程处理之前只保留最新的一次
+        speed_sample = {'time': time.monotonic(), 'bytes': None, 'speed': 0}
+        
+        def show_progress(downloaded, total_size):
+            if not progress_window.winfo_exists():
+                return
+            now = time.monotonic()
+            if speed_sample['bytes'] is None:
+                speed_sample.update(time=now, bytes=downloaded)
+            elif now - speed_sample['time'] >= 1:
+                speed_sample['speed'] = (downloaded - speed_sample['bytes']) / (now - speed_sample['time'])
+                speed_sample.update(time=now, bytes=downloaded)
+            speed = f"  {self.format_file_size(speed_sample['speed'])}/s" if speed_sample['speed'] else ""
+            if total_size:
+                percent = int(downloaded * 100 / total_size)
+                progress_var.set(percent)
+                percent_label.config(text=f"{percent}%  {self.format_file_size(downloaded)} / "
+                                          f"{self.format_file_size(total_size)}{speed}")
+            else:
+                percent_label.config(text=f"{self.format_file_size(downloaded)}{speed}")
+        
+        def close_window():
+            self.download_update_btn.config(state=tk.NORMAL if self.download_url else tk.DISABLED)
             try:
                 progress_window.destroy()
-            except:
+            except tk.TclError:
                 pass
         
-        # 检查是否需要初始化致谢内容UI
-        # 我们可以通过检查main_frame是否已经存在来判断
-        if len(self.thanks_content_frame.winfo_children()) == 0:
-            self.setup_thanks_content()
+        def on_finished(verified):
+            close_window()
+            # 提示用户
+            verified_text = "（已通过SHA-256校验）" if verified else ""
+            if messagebox.askyesno("下载完成", f"更新文件已下载完成{verified_text}：\n{filepath}\n\n是否打开文件所在文件夹？"):
+                # 打开文件所在文件夹
+                os.startfile(os.path.dirname(filepath))
+        
+        def on_cancelled():
+            logging.info("已取消下载更新")
+            close_window()
+            messagebox.showinfo("已取消", "下载已取消，已下载的部分会保留，再次下载时将继续。")
+        
+        def on_failed(error):
+            close_window()
+            messagebox.showerror("下载失败", f"下载更新文件时出错：{str(error)}\n\n已下载的部分会保留，再次下载时将继续。")
+        
+        def do_download(job):
+            expected_sha256 = asset.get('sha256')
+            if not expected_sha256 and asset.get('checksum_url'):
+                try:
+                    expected_sha256 = downloader.fetch_checksum(asset['checksum_url'])
+                except Exception as e:
+                    logging.warning(f"获取校验文件失败: {str(e)}")
+            if not expected_sha256:
+                logging.warning("发布信息中没有SHA-256摘要，下载后只校验文件大小")
+            
+            # 有从当前版本升级的补丁时先尝试增量更新，失败时下载完整文件
+            patch = asset.get('patch')
+            current_exe = delta_update.current_executable()
+            if patch and current_exe:
+                try:
+                    self.run_in_ui(lambda: progress_label.config(text="正在下载增量更新..."))
+                    patch_path = os.path.join(temp_dir, patch['name'])
+                    downloader.download(patch['url'], patch_path, size=patch.get('size'),
+                                        sha256=patch.get('sha256'), cancel=job.cancel_event,
+                                        progress=job.progress)
+                    delta_update.apply_patch(current_exe, patch_path, filepath, expected_sha256)
+                    os.remove(patch_path)
+                    logging.info(f"增量更新完成: {patch['name']}")
+                    return True
+                except downloader.DownloadCancelled:
+                    raise
+                except Exception as e:
+                    logging.warning(f"增量更新失败，改为下载完整文件: {str(e)}")
+                    self.run_in_ui(lambda: progress_label.config(text="正在下载更新文件..."))
+            
+            # 多连接分段下载，服务器不支持分段时自动改为单连接
+            downloader.download_segmented(download_url, filepath, size=asset.get('size'),
+                                          sha256=expected_sha256, cancel=job.cancel_event,
+                                          progress=job.progress)
+            return bool(expected_sha256)
+        
+        job = self.jobs.submit("下载更新", do_download, key='download_update',
+                               on_done=on_finished, on_error=on_failed, on_cancel=on_cancelled,
+                               on_progress=show_progress)
     
     def setup_thanks_content(self):
         """设置致谢页面内容"""
@@ -654,6 +903,7 @@ class GitHub520App:
         
     def open_url(self, url):
         """打开指定URL"""
+        import webbrowser
         webbrowser.open(url)
     
     def setup_steam_content(self):
@@ -720,7 +970,7 @@ class GitHub520App:
         
         # URL选择下拉框
         self.steam_url_var = tk.StringVar()
-        self.steam_url_var.set("GitMirror国内镜像")  # 默认选择GitMirror国内镜像
+        self.steam_url_var.set(self.steam_source)  # 默认选择GitMirror国内镜像
         
         url_frame = ttk.Frame(right_frame)
         url_frame.pack(side=tk.RIGHT, padx=(10, 0))
@@ -729,15 +979,15 @@ class GitHub520App:
         url_combobox = ttk.Combobox(url_frame, textvariable=self.steam_url_var, 
                                   values=["GitHub", "GitMirror国内镜像", "GitHubUser源"], width=15, state="readonly")
         url_combobox.pack(side=tk.RIGHT)
+        url_combobox.bind('<<ComboboxSelected>>', lambda e: self.on_steam_source_change())
         
         # 获取按钮
         ttk.Button(right_frame, text="获取配置", 
                   command=self.load_steam_hosts_data).pack(side=tk.RIGHT)
         
-        # 文本框
-        self.steam_hosts_text = scrolledtext.ScrolledText(hosts_frame, wrap=tk.WORD, 
-                                                         font=('Consolas', 9))
-        self.steam_hosts_text.pack(fill=tk.BOTH, expand=True)
+        # 预览（分批显示、可见区域着色、按域名筛选）
+        self.steam_hosts_preview = HostsPreview(hosts_frame, font=('Consolas', 9))
+        self.steam_hosts_preview.pack(fill=tk.BOTH, expand=True)
         
         # 说明信息
         info_frame = ttk.LabelFrame(main_frame, text="使用说明", padding="10")
@@ -777,7 +1027,7 @@ class GitHub520App:
         self.main_btn.config(style="Sidebar.TButton")
         self.thanks_btn.config(style="Sidebar.TButton")
         self.steam_btn.config(style="Pressed.TButton")
-        self.update_btn.config(style="Sidebar.TButton")
+        self.update_nav_btn.config(style="Sidebar.TButton")
         
         # 检查是否需要初始化Steam内容UI
         if not hasattr(self, 'steam_status_label'):
@@ -788,88 +1038,50 @@ class GitHub520App:
         self.steam_update_btn.config(state="normal")
     
     def load_steam_hosts_data(self):
-        """加载Steam hosts数据 - 使用重试机制"""
-        try:
-            self.steam_status_label.config(text="正在获取Steam专用hosts配置...")
-            self.steam_update_btn.config(state="disabled")
+        """在后台加载Steam hosts数据 - 使用重试机制，所选的源失败时自动切换到另一个源"""
+        selected_source = self.steam_url_var.get()
+        lan_sources = list(self.lan_sources)
+        
+        def do_fetch(job):
+            logging.info(f"使用{selected_source}获取Steam hosts")
+            started = time.perf_counter()
+            steam_hosts, used_url = hosts_core.fetch_steam_hosts(selected_source, lan_sources)
+            fetch_info = {
+                'source': selected_source,
+                'duration': round(time.perf_counter() - started, 3),
+                'bytes': len(steam_hosts.encode('utf-8')),
+            }
+            return steam_hosts, used_url, fetch_info
+        
+        def on_loaded(result):
+            steam_hosts, used_url, fetch_info = result
+            self.steam_current_hosts = steam_hosts
+            self.steam_last_fetch = fetch_info
             
-            # 根据用户选择获取相应的URL
-            selected_url = self.steam_url_var.get()
-            if "GitMirror" in selected_url:
-                url = "https://hub.gitmirror.com/raw.githubusercontent.com/Clov614/SteamHostSync/main/Hosts_steam"
-                logging.info("使用GitMirror国内镜像获取Steam hosts")
-
-            elif "GitHubUser" in selected_url:
-                url = "https://raw.githubusercontent.com/Clov614/SteamHostSync/main/Hosts_steam"
-                logging.info("使用GitHubUser源获取Steam hosts")
+            # 更新UI
+            self.steam_hosts_preview.set_content(steam_hosts)
+            if used_url == hosts_core.STEAM_HOSTS_SOURCES[selected_source]:
+                self.steam_status_label.config(text="已获取最新Steam专用hosts配置")
+            elif used_url not in hosts_core.STEAM_HOSTS_SOURCES.values():
+                self.steam_status_label.config(text="已从局域网缓存获取Steam hosts配置")
             else:
-                url = "https://raw.githubusercontent.com/Clov614/SteamHostSync/main/Hosts_steam"
-                logging.info("使用GitHub获取Steam hosts")
-            
-            # 使用带重试机制的网络请求
-            try:
-                with self.fetch_with_retry(url) as response:
-                    content = response.read().decode('utf-8')
-                    
-                    # 添加调试信息
-                    logging.info(f"获取到的原始内容长度: {len(content)} 字符")
-                    # 记录前200个字符作为样本
-                    logging.debug(f"原始内容前200字符:\n{content[:200]}...")
-                    
-                    # 提取Steam相关hosts
-                    steam_hosts = self.extract_steam_hosts(content)
-                    self.steam_current_hosts = steam_hosts
-                    
-                    # 更新UI
-                    self.steam_hosts_text.delete(1.0, tk.END)
-                    self.steam_hosts_text.insert(tk.END, steam_hosts)
-                    self.steam_status_label.config(text="已获取最新Steam专用hosts配置")
-                    self.steam_update_btn.config(state="normal")
-                    self.check_steam_hosts_status()
-                    
-            except Exception as e:
-                logging.warning(f"获取Steam hosts失败: {str(e)}")
-                # 尝试自动切换到另一个源
-                try:
-                    logging.info("尝试切换到另一个URL源...")
-                    # 切换到另一个源
-                    if "GitMirror" in selected_url:
-                        fallback_url = "https://raw.githubusercontent.com/Clov614/SteamHostSync/main/Hosts_steam"
-                        logging.info("切换到GitHub直接源")
-                    elif "GitHubUser" in selected_url:
-                        fallback_url = "https://hub.gitmirror.com/raw.githubusercontent.com/Clov614/SteamHostSync/main/Hosts_steam"
-                        logging.info("切换到GitMirror国内镜像源")
-                    else:
-                        fallback_url = "https://hub.gitmirror.com/raw.githubusercontent.com/Clov614/SteamHostSync/main/Hosts_steam"
-                        logging.info("切换到GitMirror国内镜像源")
-                    
-                    with self.fetch_with_retry(fallback_url) as response:
-                        content = response.read().decode('utf-8')
-                        
-                        # 提取Steam相关hosts
-                        steam_hosts = self.extract_steam_hosts(content)
-                        self.steam_current_hosts = steam_hosts
-                        
-                        # 更新UI
-                        self.steam_hosts_text.delete(1.0, tk.END)
-                        self.steam_hosts_text.insert(tk.END, steam_hosts)
-                        self.steam_status_label.config(text="已通过备用源获取Steam hosts配置")
-                        self.steam_update_btn.config(state="normal")
-                        self.check_steam_hosts_status()
-                except:
-                    # 两个源都失败时使用示例数据
-                    self.fallback_to_sample_steam_hosts()
-                    self.steam_status_label.config(text="使用示例配置，可手动更新")
-                    self.steam_update_btn.config(state="normal")
-                    self.check_steam_hosts_status()
-                
-        except Exception as e:
-            logging.error(f"加载Steam hosts数据完全失败: {str(e)}")
-            # 完全失败时确保有默认数据
+                self.steam_status_label.config(text="已通过备用源获取Steam hosts配置")
+            self.steam_update_btn.config(state="normal")
+            self.check_steam_hosts_status()
+        
+        def on_failed(error):
+            # 所有源都失败时使用示例数据
+            logging.error(f"加载Steam hosts数据失败: {str(error)}")
             self.fallback_to_sample_steam_hosts()
-            self.steam_status_label.config(text="获取失败，使用示例配置")
+            self.steam_status_label.config(text="使用示例配置，可手动更新")
             self.steam_update_btn.config(state="normal")
             self.check_steam_hosts_status()
+        
+        if self.jobs.submit("获取Steam hosts", do_fetch, key='load_steam_hosts',
+                            on_done=on_loaded, on_error=on_failed) is None:
+            return
+        self.steam_status_label.config(text="正在获取Steam专用hosts配置...")
+        self.steam_update_btn.config(state="disabled")
     
     def fallback_to_sample_steam_hosts(self):
         """使用示例Steam hosts数据作为后备"""
@@ -881,72 +1093,13 @@ class GitHub520App:
 # 或访问上述链接手动复制hosts内容到此文本框
 """
         self.steam_current_hosts = sample_hosts
-        self.steam_hosts_text.delete(1.0, tk.END)
-        self.steam_hosts_text.insert(tk.END, sample_hosts)
-    
-    def extract_steam_hosts(self, content):
-        """从原始hosts中提取Steam相关条目"""
-        # 检查是否包含 #steam Start 标记
-        if '#steam Start' in content and '#steam End' in content:
-            # 提取 #steam Start 和 #steam End 之间的内容
-            start_idx = content.find('#steam Start') + len('#steam Start')
-            end_idx = content.find('#steam End')
-            steam_section = content[start_idx:end_idx]
-            lines = steam_section.split('\n')
-        else:
-            # 按行处理
-            lines = content.split('\n')
-        
-        steam_domains = [
-            'steamcommunity.com',
-            'store.steampowered.com',
-            'api.steampowered.com',
-            'media.steampowered.com',
-            'cloud-ops.steamstatic.com',
-            'client-download.steamstatic.com',
-            'cm.steampowered.com',
-            'content.steampowered.com',
-            'content1.steampowered.com',
-            'content2.steampowered.com',
-            'content3.steampowered.com',
-            'content4.steampowered.com',
-            'content5.steampowered.com',
-            'content6.steampowered.com',
-            'content7.steampowered.com',
-            'content8.steampowered.com',
-            'edge.steam-dns.top.comcast.net'
-        ]
-        
-        steam_lines = []
-        
-        # 遍历所有行，提取Steam相关hosts
-        for line in lines:
-            line = line.strip()
-            if line and not line.startswith('#'):
-                # 检查是否包含Steam相关域名
-                if any(domain in line for domain in steam_domains):
-                    steam_lines.append(line)
-        
-        # 添加文件头注释
-        header = """# Steam Hosts 配置
-# 来源: https://github.com/Clov614/SteamHostSync
-# 更新时间: {}\n\n""".format(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-        
-        # 如果没有找到任何Steam相关hosts条目，添加提示信息
-        if not steam_lines:
-            logging.warning("未提取到Steam相关hosts条目，可能源文件格式发生变化")
-            # 添加示例hosts条目作为参考
-            sample_entries = """
-# 示例Steam hosts条目（当前未提取到实际内容）
-# 您可以手动从GitHub仓库复制最新配置
-# 或尝试刷新获取最新数据
-"""
-            return header + sample_entries
-        
-        return header + '\n'.join(steam_lines)
+        self.steam_last_fetch = {}
+        self.steam_hosts_preview.set_content(sample_hosts)
     
     def update_steam_hosts(self):
-        """更新Steam hosts文件 - 修复版本"""
+        """更新Steam hosts文件（确认后在后台写入）"""
+        if self.hosts_write_running():
+            return
         # 检查是否有有效数据
         if not hasattr(self, 'steam_current_hosts') or not self.steam_current_hosts:
             messagebox.showwarning("警告", "请先获取Steam hosts配置数据")
@@ -971,106 +1124,55 @@ class GitHub520App:
         if not confirm_result:
             return
         
-        try:
-            self.steam_update_btn.config(state="disabled", text="更新中...")
-            
-            # 确定hosts文件路径
-            if os.name == 'nt':  # Windows
-                hosts_path = r'C:\Windows\System32\drivers\etc\hosts'
-            else:  # Linux/Mac
-                hosts_path = '/etc/hosts'
-            
-            # 读取当前hosts文件
-            current_content = ""
-            if os.path.exists(hosts_path):
-                with open(hosts_path, 'r', encoding='utf-8') as f:
-                    current_content = f.read()
-            
-            # 备份原文件
-            backup_filename = f"hosts.steam_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            backup_path = os.path.join(self.backup_dir, backup_filename)
-            if os.path.exists(hosts_path):
-                shutil.copy2(hosts_path, backup_path)
-            
-            # 移除旧的Steam相关配置
-            cleaned_content = self.remove_old_steam_hosts(current_content)
-            
-            # 添加新的Steam配置
-            new_content = cleaned_content.strip() + "\n\n" + self.steam_current_hosts
+        steam_hosts = self.steam_current_hosts
+        steam_last_fetch = self.steam_last_fetch
+        backup_dir = self.backup_dir
+        
+        def do_update(job):
+            # 读取、备份、移除旧的Steam配置并添加新配置、写入在同一次加锁中完成
+            backup_name, _, changed = hosts_core.update_hosts_file(
+                lambda current: hosts_core.merge_steam_hosts(current, steam_hosts),
+                "hosts.steam_backup_", backup_dir=backup_dir)
+            return backup_name, changed
+        
+        def on_updated(result):
+            backup_name, changed = result
+            self.steam_update_btn.config(state="normal", text="立即更新Steam Hosts")
             
-            # 写入新内容
-            with open(hosts_path, 'w', encoding='utf-8') as f:
-                f.write(new_content)
+            if not changed:
+                messagebox.showinfo("无需更新", "hosts文件中的Steam配置已是最新，hosts文件未修改")
+                return
             
             # 记录更新历史
-            update_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            hosts_count = len([line for line in self.steam_current_hosts.split('\n') 
-                             if line.strip() and not line.startswith('#')])
+            hosts_count = hosts_core.count_entries(steam_hosts)
             
-            self.update_history.append({
-                'time': update_time,
-                'count': f"Steam {hosts_count}条",
-                'type': 'steam_update'
-            })
-            self.save_config()
+            self.history.append('steam_update', entries=hosts_count, backup=backup_name, 
+                                **steam_last_fetch)
+            self.record_timeseries('record_event', 'steam_update', f"{hosts_count}条")
+            metrics.record_hosts_apply('steam_update', hosts_count)
             
             # 更新UI
             self.check_steam_hosts_status()
             
             messagebox.showinfo("成功", f"Steam hosts配置更新成功！\n更新了 {hosts_count} 条记录")
-            
-        except PermissionError:
-            messagebox.showerror("权限错误", 
-                "需要管理员权限来修改hosts文件。\n\n"
-                "请以管理员身份运行此程序。")
-        except Exception as e:
-            messagebox.showerror("错误", f"更新失败: {str(e)}")
-        finally:
-            self.steam_update_btn.config(state="normal", text="立即更新Steam Hosts")
-    
-    def remove_old_steam_hosts(self, content):
-        """移除旧的Steam相关hosts配置"""
-        steam_keywords = [
-            'steamcommunity.com',
-            'store.steampowered.com',
-            'Steam Hosts',
-            'SteamHostSync'
-        ]
         
-        lines = content.split('\n')
-        cleaned_lines = []
-        in_steam_section = False
-        
-        for line in lines:
-            line_stripped = line.strip()
-            
-            # 检查是否进入Steam配置区域
-            if any(keyword in line for keyword in ['Steam Hosts', 'SteamHostSync']):
-                in_steam_section = True
-                continue
-            
-            # 如果在Steam区域，跳过所有行直到空行
-            if in_steam_section:
-                if not line_stripped:  # 遇到空行，结束Steam区域
-                    in_steam_section = False
-                continue
-            
-            # 移除单独的Steam域名行
-            if line_stripped and not line_stripped.startswith('#'):
-                if any(domain in line for domain in ['steamcommunity.com', 'store.steampowered.com']):
-                    continue
-            
-            cleaned_lines.append(line)
+        def on_failed(error):
+            self.steam_update_btn.config(state="normal", text="立即更新Steam Hosts")
+            if isinstance(error, PermissionError):
+                messagebox.showerror("权限错误", 
+                    "需要管理员权限来修改hosts文件。\n\n"
+                    "请以管理员身份运行此程序。")
+            else:
+                messagebox.showerror("错误", f"更新失败: {str(error)}")
         
-        return '\n'.join(cleaned_lines)
+        if self.submit_hosts_write("更新Steam hosts", do_update, on_updated, on_failed) is None:
+            return
+        self.steam_update_btn.config(state="disabled", text="更新中...")
     
     def check_steam_hosts_status(self):
         """检查Steam hosts文件状态"""
         try:
-            if os.name == 'nt':  # Windows
-                hosts_path = r'C:\Windows\System32\drivers\etc\hosts'
-            else:  # Linux/Mac
-                hosts_path = '/etc/hosts'
+            hosts_path = get_hosts_path()
             
             if os.path.exists(hosts_path):
                 with open(hosts_path, 'r', encoding='utf-8') as f:
@@ -1088,10 +1190,9 @@ class GitHub520App:
                 self.steam_status_label.config(text="未找到hosts文件")
                 
             # 显示最后更新时间
-            steam_updates = [h for h in self.update_history if h.get('type') == 'steam_update']
-            if steam_updates:
-                last_time = steam_updates[-1]['time']
-                self.steam_last_update_label.config(text=f"上次更新: {last_time}")
+            last_update = self.history.last('steam_update')
+            if last_update:
+                self.steam_last_update_label.config(text=f"上次更新: {last_update['time']}")
                 
         except PermissionError:
             self.steam_status_icon.config(foreground="red")
@@ -1144,6 +1245,17 @@ class GitHub520App:
                                     command=self.update_hosts, state="normal")
         self.update_btn.pack(fill=tk.X, pady=(10, 0))
         
+        # 更新前后测速对比
+        benchmark_frame = ttk.Frame(status_frame)
+        benchmark_frame.pack(fill=tk.X, pady=(5, 0))
+        
+        self.benchmark_var = tk.BooleanVar(value=self.benchmark_enabled)
+        ttk.Checkbutton(benchmark_frame, text="更新前后测速对比", variable=self.benchmark_var,
+                       command=self.on_benchmark_toggle).pack(side=tk.LEFT)
+        
+        ttk.Button(benchmark_frame, text="测速设置", width=8, 
+                  command=self.show_benchmark_settings).pack(side=tk.RIGHT)
+        
         # 紧急恢复区域
         emergency_frame = ttk.LabelFrame(left_frame, text="紧急恢复", padding="10")
         emergency_frame.pack(fill=tk.X, pady=(0, 15))
@@ -1181,9 +1293,21 @@ class GitHub520App:
         ttk.Button(tools_frame, text="网络诊断", 
                   command=self.network_diagnosis).pack(fill=tk.X, pady=2)
         
+        probe_tools = ttk.Frame(tools_frame)
+        probe_tools.pack(fill=tk.X, pady=2)
+        
+        ttk.Button(probe_tools, text="连接耗时分析", 
+                  command=self.phase_diagnosis).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 2))
+        
+        ttk.Button(probe_tools, text="趋势记录", 
+                  command=self.show_trend_view).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(2, 0))
+        
         ttk.Button(tools_frame, text="备份管理", 
                   command=self.show_backup_manager).pack(fill=tk.X, pady=2)
         
+        ttk.Button(tools_frame, text="查看本机hosts", 
+                  command=self.view_system_hosts).pack(fill=tk.X, pady=2)
+        
         # 字体控制
         font_frame = ttk.LabelFrame(left_frame, text="显示设置", padding="10")
         font_frame.pack(fill=tk.X)
@@ -1192,7 +1316,7 @@ class GitHub520App:
         font_control.pack(fill=tk.X)
         
         ttk.Label(font_control, text="字体大小:").pack(side=tk.LEFT)
-        self.font_size = tk.IntVar(value=9)
+        self.font_size = tk.IntVar(value=self.font_size_setting)
         
         ttk.Button(font_control, text="A-", width=3, 
                    command=lambda: self.change_font_size(-1)).pack(side=tk.LEFT, padx=(5, 2))
@@ -1212,10 +1336,9 @@ class GitHub520App:
         
         ttk.Label(control_frame, text="最新hosts配置预览:").pack(side=tk.LEFT)
         
-        # 文本框
-        self.hosts_text = scrolledtext.ScrolledText(hosts_frame, wrap=tk.WORD, 
-                                                   font=('Consolas', self.font_size.get()))
-        self.hosts_text.pack(fill=tk.BOTH, expand=True)
+        # 预览（分批显示、可见区域着色、按域名筛选）
+        self.hosts_preview = HostsPreview(hosts_frame, font=('Consolas', self.font_size.get()))
+        self.hosts_preview.pack(fill=tk.BOTH, expand=True)
         
         # 历史记录区域
         history_frame = ttk.LabelFrame(right_frame, text="更新历史", padding="10")
@@ -1231,7 +1354,7 @@ class GitHub520App:
                    command=self.clear_history).pack(side=tk.RIGHT)
         
         self.history_text = scrolledtext.ScrolledText(history_frame, height=6,
-                                                     font=('Arial', 8))
+                                                     font=('Arial', max(8, self.font_size_setting - 1)))
         self.history_text.pack(fill=tk.X)
         self.update_history_display()
         
@@ -1248,58 +1371,76 @@ class GitHub520App:
     def on_source_change(self):
         """切换hosts源"""
         self.current_source = self.source_var.get()
+        self.save_config()
         self.update_btn.config(state="disabled", text="加载中...")
         self.load_hosts_data()
     
     def load_hosts_data(self):
-        """从选择的源加载hosts数据 - 使用重试机制"""
-        def do_load():
-            try:
-                self.status_label.config(text=f"正在从{self.current_source}获取hosts配置...")
-                self.update_btn.config(state="disabled")
-                
-                url = self.hosts_sources[self.current_source]
+        """在后台从选择的源加载hosts数据 - 使用重试机制
+        
+        切换源时不取消之前的任务，但只显示当前选择的源的结果
+        """
+        import urllib.error
+        
+        source = self.current_source
+        url = self.hosts_sources[source]
+        is_lan_source = url in self.lan_source_urls()
+        
+        def do_load(job):
+            started = time.perf_counter()
+            if is_lan_source:
+                # 局域网缓存节点不可用时回退到上游源
+                base_url = url[:-len("/hosts")]
+                content = hosts_core.fetch_github_hosts("GitHub520", [base_url])
+            else:
                 # 使用带重试机制的网络请求
-                with self.fetch_with_retry(url) as response:
-                    self.current_hosts = response.read().decode('utf-8')
-                    
-                    # 在主线程中更新UI
-                    self.root.after(0, self.update_ui_after_load)
-                    
-            except urllib.error.URLError as e:
-                error_msg = f"网络错误: {e.reason}"
-                self.root.after(0, lambda msg=error_msg: self.show_error(msg))
-            except Exception as e:
-                error_msg = f"从{self.current_source}获取配置失败: {str(e)}"
-                self.root.after(0, lambda msg=error_msg: self.show_error(msg))
+                with hosts_core.fetch_with_retry(url) as response:
+                    content = response.read().decode('utf-8')
+            
+            fetch_info = {
+                'source': source,
+                'duration': round(time.perf_counter() - started, 3),
+                'bytes': len(content.encode('utf-8')),
+            }
+            return content, fetch_info
         
-        # 在后台线程中加载
-        import threading
-        thread = threading.Thread(target=do_load)
-        thread.daemon = True
-        thread.start()
+        def on_loaded(result):
+            if source == self.current_source:
+                self.update_ui_after_load(*result)
+        
+        def on_failed(error):
+            if source != self.current_source:
+                return
+            if isinstance(error, urllib.error.URLError):
+                self.show_error(f"网络错误: {error.reason}")
+            else:
+                self.show_error(f"从{source}获取配置失败: {str(error)}")
+        
+        if self.jobs.submit(f"从{source}获取hosts", do_load, key=f"load_hosts:{source}",
+                            on_done=on_loaded, on_error=on_failed) is None:
+            return
+        self.status_label.config(text=f"正在从{source}获取hosts配置...")
+        self.update_btn.config(state="disabled")
     
-    def update_ui_after_load(self):
+    def update_ui_after_load(self, content, fetch_info=None):
         """加载完成后更新UI"""
-        self.hosts_text.delete(1.0, tk.END)
-        self.hosts_text.insert(tk.END, self.current_hosts)
+        self.current_hosts = content
+        self.last_fetch = fetch_info or {}
+        self.hosts_preview.set_content(self.current_hosts)
         self.status_label.config(text="已获取最新hosts配置")
-        self.update_btn.config(state="normal")
+        self.update_btn.config(state="normal", text="立即更新")
         self.check_hosts_status()
     
     def show_error(self, message):
-        """显示错误信息"""
-        messagebox.showerror("错误", message)
-        self.status_label.config(text="获取配置失败")
-        self.update_btn.config(state="normal")
+        """在状态栏显示加载错误（不弹出模态对话框，避免启动时阻塞）"""
+        logging.error(message)
+        self.status_label.config(text=message)
+        self.update_btn.config(state="normal", text="立即更新")
     
     def check_hosts_status(self):
         """检查hosts文件状态"""
         try:
-            if os.name == 'nt':  # Windows
-                hosts_path = r'C:\Windows\System32\drivers\etc\hosts'
-            else:  # Linux/Mac
-                hosts_path = '/etc/hosts'
+            hosts_path = get_hosts_path()
             
             if os.path.exists(hosts_path):
                 with open(hosts_path, 'r', encoding='utf-8') as f:
@@ -1317,9 +1458,9 @@ class GitHub520App:
                 self.status_label.config(text="未找到hosts文件")
                 
             # 显示最后更新时间
-            if self.update_history:
-                last_time = self.update_history[-1]['time']
-                self.last_update_label.config(text=f"上次更新: {last_time}")
+            last_update = self.history.last('update')
+            if last_update:
+                self.last_update_label.config(text=f"上次更新: {last_update['time']}")
                 
         except PermissionError:
             self.status_icon.config(foreground="red")
@@ -1339,28 +1480,6 @@ class GitHub520App:
             ]
         )
     
-    def validate_hosts_content(self, content):
-        """验证hosts内容格式"""
-        required_domains = ['github.com', 'raw.githubusercontent.com']
-        is_valid = all(domain in content for domain in required_domains)
-        logging.info(f"Hosts内容验证结果: {is_valid}")
-        return is_valid
-    
-    def fetch_with_retry(self, url, retries=3):
-        """带重试机制的网络请求"""
-        for i in range(retries):
-            try:
-                logging.info(f"第{i+1}/{retries}次尝试获取: {url}")
-                response = urllib.request.urlopen(url, timeout=10)
-                logging.info(f"成功获取数据: {url}")
-                return response
-            except Exception as e:
-                logging.warning(f"第{i+1}次获取失败: {str(e)}")
-                if i == retries - 1:
-                    logging.error(f"所有重试失败: {url}")
-                    raise
-                time.sleep(2)
-    
     def confirm_update(self):
         """确认更新操作"""
         if not self.current_hosts:
@@ -1369,7 +1488,7 @@ class GitHub520App:
             return False
         
         # 验证hosts内容
-        if not self.validate_hosts_content(self.current_hosts):
+        if not hosts_core.validate_hosts_content(self.current_hosts):
             messagebox.showwarning("警告", "获取的hosts内容不完整，可能无法正常工作")
             logging.warning("Hosts内容验证失败")
         
@@ -1382,95 +1501,148 @@ class GitHub520App:
         logging.info(f"用户确认更新: {result}")
         return result
     
-    def create_backup(self):
-        """创建hosts文件备份"""
-        try:
-            # 确定hosts文件路径
-            if os.name == 'nt':  # Windows
-                hosts_path = r'C:\Windows\System32\drivers\etc\hosts'
-            else:  # Linux/Mac
-                hosts_path = '/etc/hosts'
-            
-            # 备份原文件到backup目录
-            backup_filename = f"hosts.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            backup_path = os.path.join(self.backup_dir, backup_filename)
-            
-            if os.path.exists(hosts_path):
-                shutil.copy2(hosts_path, backup_path)
-                logging.info(f"成功创建备份: {backup_path}")
-            else:
-                logging.warning(f"hosts文件不存在: {hosts_path}")
-                
-            return True, backup_path
-        except Exception as e:
-            logging.error(f"创建备份失败: {str(e)}")
-            return False, str(e)
-    
-    def apply_new_hosts(self, hosts_content, hosts_path):
-        """应用新的hosts内容"""
-        try:
-            with open(hosts_path, 'w', encoding='utf-8') as f:
-                f.write(hosts_content)
-            logging.info(f"成功应用新的hosts内容: {hosts_path}")
-            return True
-        except PermissionError:
-            logging.error(f"权限错误: 无法写入hosts文件 {hosts_path}")
-            messagebox.showerror("权限错误", 
-                "需要管理员权限来修改hosts文件。\n\n"
-                "请以管理员身份运行此程序。")
-            return False
-        except Exception as e:
-            logging.error(f"应用hosts失败: {str(e)}")
-            return False
-    
-    def record_success(self, backup_path):
+    def record_success(self, backup_name, benchmark=None):
         """记录更新成功并更新UI"""
         # 记录更新历史
-        update_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        hosts_count = len([line for line in self.current_hosts.split('\n') 
-                         if line.strip() and not line.startswith('#')])
-        
-        self.update_history.append({
-            'time': update_time,
-            'count': hosts_count
-        })
-        self.save_config()
+        hosts_count = hosts_core.count_entries(self.current_hosts)
+        self.history.append('update', entries=hosts_count, backup=backup_name or None, 
+                            benchmark=benchmark, **self.last_fetch)
+        self.record_timeseries('record_event', 'update', f"{hosts_count}条")
+        metrics.record_hosts_apply('update', hosts_count)
         
         # 更新UI
         self.check_hosts_status()
         self.update_history_display()
+        self.update_btn.config(state="normal", text="立即更新")
         
         # 显示成功对话框
-        self.show_backup_success_dialog(hosts_count, backup_path)
+        self.show_backup_success_dialog(hosts_count, backup_name, benchmark)
         
         logging.info(f"更新记录已保存，更新了 {hosts_count} 条记录")
     
     def update_hosts(self):
         """更新hosts文件 - 重构版本"""
+        if self.hosts_write_running():
+            return
         if self.confirm_update():
             self.update_btn.config(state="disabled", text="更新中...")
             
-            success, backup_path = self.create_backup()
-            if success:
-                # 确定hosts文件路径
-                hosts_path = r'C:\Windows\System32\drivers\etc\hosts' if os.name == 'nt' else '/etc/hosts'
-                
-                if self.apply_new_hosts(self.current_hosts, hosts_path):
-                    self.record_success(backup_path)
+            if self.benchmark_enabled:
+                # 先在后台测量更新前的速度，完成后再应用hosts
+                if self.run_benchmark(self.perform_hosts_update) is None:
+                    self.update_btn.config(state="normal", text="立即更新")
                     return
-                else:
-                    messagebox.showerror("错误", "应用hosts内容失败")
+                self.status_label.config(text="正在测量更新前的下载速度...")
             else:
-                messagebox.showerror("错误", f"创建备份失败: {backup_path}")
-        
-        self.update_btn.config(state="normal", text="立即更新")
+                self.perform_hosts_update(None)
     
-    def show_backup_success_dialog(self, hosts_count, backup_path):
+    def perform_hosts_update(self, benchmark_before):
+        """在后台备份并应用新的hosts内容，benchmark_before为更新前的测速结果"""
+        hosts_content = self.current_hosts
+        backup_dir = self.backup_dir
+        
+        def do_update(job):
+            # 读取、备份、写入在同一次加锁中完成（hosts文件不存在时不创建备份）
+            backup_name, _, changed = hosts_core.update_hosts_file(
+                lambda current: hosts_content, "hosts.backup_", backup_dir=backup_dir)
+            return backup_name or "", changed
+        
+        def on_updated(result):
+            backup_name, changed = result
+            if not changed:
+                self.update_btn.config(state="normal", text="立即更新")
+                self.check_hosts_status()
+                messagebox.showinfo("无需更新", "hosts内容无变化，hosts文件未修改")
+                return
+            if benchmark_before is None:
+                self.record_success(backup_name)
+                return
+            
+            # 刷新DNS缓存后测量更新后的速度
+            def measure_after(flushed):
+                if self.run_benchmark(lambda benchmark_after: self.record_success(
+                        backup_name, netprobe.compare_benchmarks(benchmark_before, benchmark_after))) is None:
+                    # 无法测速时仍然记录这次更新
+                    self.record_success(backup_name)
+                    return
+                self.status_label.config(text="正在测量更新后的下载速度...")
+            
+            self.status_label.config(text="正在刷新DNS缓存...")
+            self.flush_dns(silent=True, callback=measure_after)
+        
+        def on_failed(error):
+            if isinstance(error, PermissionError):
+                logging.error(f"权限错误: 无法写入hosts文件 {get_hosts_path()}")
+                messagebox.showerror("权限错误", 
+                    "需要管理员权限来修改hosts文件。\n\n"
+                    "请以管理员身份运行此程序。")
+            else:
+                logging.error(f"应用hosts失败: {str(error)}")
+                messagebox.showerror("错误", f"应用hosts内容失败: {str(error)}")
+            self.update_btn.config(state="normal", text="立即更新")
+        
+        if self.submit_hosts_write("更新hosts", do_update, on_updated, on_failed) is None:
+            self.update_btn.config(state="normal", text="立即更新")
+            return
+        self.status_label.config(text="正在写入hosts文件...")
+    
+    def run_benchmark(self, callback):
+        """在后台下载测试对象，完成后在主线程调用callback(结果)；已有测速在执行时返回None"""
+        url = self.benchmark_url
+        
+        def do_benchmark(job):
+            result = netprobe.benchmark_download(url)
+            logging.info(f"测速结果: {result}")
+            self.record_timeseries('record_benchmark', result)
+            metrics.observe_benchmark(result)
+            return result
+        
+        return self.jobs.submit("测速", do_benchmark, key='benchmark', on_done=callback)
+    
+    def on_benchmark_toggle(self):
+        """切换更新前后测速对比"""
+        self.benchmark_enabled = self.benchmark_var.get()
+        self.save_config()
+    
+    def show_benchmark_settings(self):
+        """设置测速使用的测试对象URL"""
+        settings_window = tk.Toplevel(self.root)
+        settings_window.title("测速设置")
+        settings_window.geometry("500x160")
+        settings_window.resizable(False, False)
+        settings_window.transient(self.root)
+        settings_window.grab_set()
+        
+        main_frame = ttk.Frame(settings_window, padding="15")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(main_frame, text="测试对象URL（Release附件或raw文件，最多下载5MB）:").pack(anchor=tk.W)
+        
+        url_entry = ttk.Entry(main_frame)
+        url_entry.insert(0, self.benchmark_url)
+        url_entry.pack(fill=tk.X, pady=(5, 15))
+        
+        def save_settings():
+            url = url_entry.get().strip()
+            if not url.startswith(("http://", "https://")):
+                messagebox.showwarning("警告", "请输入有效的http/https地址", parent=settings_window)
+                return
+            self.benchmark_url = url
+            self.save_config()
+            settings_window.destroy()
+        
+        button_frame = ttk.Frame(main_frame)
+        button_frame.pack(fill=tk.X)
+        
+        ttk.Button(button_frame, text="保存", command=save_settings).pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="取消", command=settings_window.destroy).pack(side=tk.RIGHT)
+    
+    def show_backup_success_dialog(self, hosts_count, backup_name, benchmark=None):
         """显示更新成功对话框并允许访问备份目录"""
         # 创建自定义对话框
         dialog = tk.Toplevel(self.root)
         dialog.title("更新成功")
-        dialog.geometry("500x200")
+        dialog.geometry("500x230" if benchmark else "500x200")
         dialog.resizable(False, False)
         dialog.transient(self.root)
         dialog.grab_set()
@@ -1500,9 +1672,15 @@ class GitHub520App:
         ttk.Label(text_frame, text=f"更新了 {hosts_count} 条记录", 
                  font=('Arial', 10)).pack(anchor=tk.W)
         
+        # 测速对比结果，速度变慢时用红色提示
+        if benchmark:
+            slower = (benchmark['throughput_change_pct'] or 0) < 0 or benchmark['after'].get('error')
+            ttk.Label(text_frame, text=netprobe.format_comparison(benchmark), 
+                     font=('Arial', 9), foreground="red" if slower else "green").pack(anchor=tk.W)
+        
         # 备份信息
-        backup_info = f"原文件已备份为: {os.path.basename(backup_path)}"
-        backup_dir = os.path.dirname(backup_path)
+        backup_info = f"原文件已备份为: {backup_name}"
+        backup_dir = self.backup_dir
         
         backup_frame = ttk.Frame(content_frame)
         backup_frame.pack(fill=tk.X, pady=(0, 20))
@@ -1519,50 +1697,45 @@ class GitHub520App:
                   command=lambda: self.open_backup_directory(backup_dir, dialog)).pack(side=tk.LEFT, padx=(0, 10))
         
         ttk.Button(button_frame, text="查看备份文件", 
-                  command=lambda: self.view_backup_file(backup_path, dialog)).pack(side=tk.LEFT, padx=(0, 10))
+                  command=lambda: self.view_backup_file(backup_name, dialog)).pack(side=tk.LEFT, padx=(0, 10))
         
         ttk.Button(button_frame, text="恢复此备份", 
-                  command=lambda: self.restore_backup(backup_path, dialog)).pack(side=tk.LEFT, padx=(0, 10))
+                  command=lambda: self.restore_backup(backup_name, dialog)).pack(side=tk.LEFT, padx=(0, 10))
         
         ttk.Button(button_frame, text="确定", 
                   command=dialog.destroy).pack(side=tk.RIGHT)
     
     def restore_original_backup(self):
-        """恢复原始备份"""
-        try:
-            if not os.path.exists(self.original_backup):
-                messagebox.showerror("错误", "原始备份文件不存在")
-                return
-            
-            result = messagebox.askyesno("确认恢复", 
-                "确定要恢复原始hosts备份吗？\n\n"
-                "这将撤销所有GitHub加速设置，恢复系统原始状态。")
-            
-            if not result:
-                return
-            
-            # 确定hosts文件路径
-            if os.name == 'nt':  # Windows
-                hosts_path = r'C:\Windows\System32\drivers\etc\hosts'
-            else:  # Linux/Mac
-                hosts_path = '/etc/hosts'
-            
-            # 创建恢复前的备份
-            restore_backup_path = os.path.join(self.backup_dir, f"hosts.before_restore_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
-            if os.path.exists(hosts_path):
-                shutil.copy2(hosts_path, restore_backup_path)
-            
-            # 恢复原始备份
-            shutil.copy2(self.original_backup, hosts_path)
+        """恢复原始备份（在后台写入hosts文件）"""
+        if self.hosts_write_running():
+            return
+        if not os.path.exists(self.original_backup):
+            messagebox.showerror("错误", "原始备份文件不存在")
+            return
+        
+        result = messagebox.askyesno("确认恢复", 
+            "确定要恢复原始hosts备份吗？\n\n"
+            "这将撤销所有GitHub加速设置，恢复系统原始状态。")
+        
+        if not result:
+            return
+        
+        original_backup = self.original_backup
+        backup_dir = self.backup_dir
+        
+        def do_restore(job):
+            original_content = hosts_core.read_hosts_file(original_backup)
             
+            # 备份当前内容并恢复原始备份（同一次加锁完成）
+            backup_name, _, _ = hosts_core.update_hosts_file(
+                lambda current: original_content, "hosts.before_restore_", backup_dir=backup_dir)
+            return backup_name
+        
+        def on_restored(backup_name):
             # 记录恢复历史
-            restore_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self.update_history.append({
-                'time': restore_time,
-                'count': '恢复原始备份',
-                'type': 'restore_original'
-            })
-            self.save_config()
+            self.history.append('restore_original', backup=backup_name)
+            self.record_timeseries('record_event', 'restore_original')
+            metrics.record_hosts_apply('restore_original', 0)
             
             # 更新UI
             self.check_hosts_status()
@@ -1571,11 +1744,14 @@ class GitHub520App:
             messagebox.showinfo("恢复成功", 
                 "已成功恢复原始hosts文件！\n\n"
                 "所有GitHub加速设置已被清除。")
-            
-        except PermissionError:
-            messagebox.showerror("权限错误", "需要管理员权限来恢复hosts文件")
-        except Exception as e:
-            messagebox.showerror("错误", f"恢复原始备份失败: {str(e)}")
+        
+        def on_failed(error):
+            if isinstance(error, PermissionError):
+                messagebox.showerror("权限错误", "需要管理员权限来恢复hosts文件")
+            else:
+                messagebox.showerror("错误", f"恢复原始备份失败: {str(error)}")
+        
+        self.submit_hosts_write("恢复原始备份", do_restore, on_restored, on_failed)
     
     def open_backup_directory(self, directory, dialog=None):
         """打开备份文件所在目录"""
@@ -1592,52 +1768,20 @@ class GitHub520App:
         except Exception as e:
             messagebox.showerror("错误", f"无法打开目录: {str(e)}")
     
-    def view_backup_file(self, backup_path, dialog=None):
-        """查看备份文件内容"""
+    def view_backup_file(self, backup_name, dialog=None):
+        """查看备份内容"""
         try:
-            if os.path.exists(backup_path):
-                # 创建查看窗口
-                view_window = tk.Toplevel(self.root)
-                view_window.title("查看备份文件")
-                view_window.geometry("800x500")
-                view_window.transient(self.root)
-                
-                # 标题
-                title_frame = ttk.Frame(view_window, padding="10")
-                title_frame.pack(fill=tk.X)
-                
-                ttk.Label(title_frame, text=f"备份文件: {os.path.basename(backup_path)}", 
-                         font=('Arial', 11, 'bold')).pack(anchor=tk.W)
-                ttk.Label(title_frame, text=f"路径: {backup_path}", 
-                         font=('Arial', 9), foreground="gray").pack(anchor=tk.W)
-                
-                # 内容区域
-                content_frame = ttk.Frame(view_window, padding="10")
-                content_frame.pack(fill=tk.BOTH, expand=True)
-                
-                # 添加滚动文本框
-                text_frame = ttk.Frame(content_frame)
-                text_frame.pack(fill=tk.BOTH, expand=True)
-                
-                backup_text = scrolledtext.ScrolledText(text_frame, wrap=tk.WORD, 
-                                                       font=('Consolas', 9))
-                backup_text.pack(fill=tk.BOTH, expand=True)
-                
-                # 读取并显示备份文件内容
-                with open(backup_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    backup_text.insert(tk.END, content)
-                    backup_text.config(state=tk.DISABLED)  # 设为只读
-                
-                # 按钮区域
-                button_frame = ttk.Frame(content_frame)
-                button_frame.pack(fill=tk.X, pady=(10, 0))
-                
-                ttk.Button(button_frame, text="打开文件位置", 
-                          command=lambda: self.open_backup_directory(os.path.dirname(backup_path))).pack(side=tk.LEFT)
+            store = hosts_core.backup_store(self.backup_dir)
+            if store.get(backup_name):
+                # 原始备份是普通文件，可以直接内存映射；其他备份需要先从增量链还原
+                if backup_name == "hosts.original_backup":
+                    load_source = lambda: store.original_path
+                else:
+                    load_source = lambda: store.read_bytes(backup_name)
                 
-                ttk.Button(button_frame, text="关闭", 
-                          command=view_window.destroy).pack(side=tk.RIGHT)
+                self.show_text_viewer("查看备份文件", f"备份: {backup_name}", load_source, 
+                                      extra_button=("打开备份目录", 
+                                                    lambda: self.open_backup_directory(self.backup_dir)))
                 
                 if dialog:
                     dialog.destroy()
@@ -1647,12 +1791,225 @@ class GitHub520App:
         except Exception as e:
             messagebox.showerror("错误", f"无法查看备份文件: {str(e)}")
     
+    def view_system_hosts(self):
+        """查看本机hosts文件"""
+        hosts_path = get_hosts_path()
+        if not os.path.exists(hosts_path):
+            messagebox.showerror("错误", f"hosts文件不存在: {hosts_path}")
+            return
+        
+        def load_snapshot():
+            # 不映射正在使用的hosts文件：Windows上映射期间无法截断或替换文件，会导致写入失败
+            with open(hosts_path, 'rb') as f:
+                return f.read()
+        
+        self.show_text_viewer("查看本机hosts", f"hosts文件: {hosts_path}", load_snapshot)
+    
+    def show_text_viewer(self, title, subtitle, load_source, extra_button=None):
+        """只读查看大文件：后台建立行索引，文本框中只渲染当前可见的行
+        
+        load_source在后台线程中调用，返回文件路径（内存映射，只用于备份文件）或bytes。
+        """
+        view_window = tk.Toplevel(self.root)
+        view_window.title(title)
+        view_window.geometry("800x500")
+        view_window.transient(self.root)
+        
+        # 标题
+        title_frame = ttk.Frame(view_window, padding="10")
+        title_frame.pack(fill=tk.X)
+        
+        ttk.Label(title_frame, text=subtitle, 
+                 font=('Arial', 11, 'bold')).pack(anchor=tk.W)
+        info_label = ttk.Label(title_frame, text="正在加载...", 
+                               font=('Arial', 9), foreground="gray")
+        info_label.pack(anchor=tk.W)
+        
+        # 查找栏
+        search_frame = ttk.Frame(view_window, padding=(10, 0))
+        search_frame.pack(fill=tk.X)
+        
+        search_var = tk.StringVar()
+        ttk.Label(search_frame, text="查找:").pack(side=tk.LEFT)
+        search_entry = ttk.Entry(search_frame, textvariable=search_var, width=30)
+        search_entry.pack(side=tk.LEFT, padx=(5, 10))
+        
+        ttk.Button(search_frame, text="查找下一个", 
+                  command=lambda: find('text')).pack(side=tk.LEFT)
+        ttk.Button(search_frame, text="跳转到域名", 
+                  command=lambda: find('domain')).pack(side=tk.LEFT, padx=(10, 0))
+        
+        # 内容区域
+        content_frame = ttk.Frame(view_window, padding="10")
+        content_frame.pack(fill=tk.BOTH, expand=True)
+        
+        text_frame = ttk.Frame(content_frame)
+        text_frame.pack(fill=tk.BOTH, expand=True)
+        
+        text_font = ('Consolas', 9)
+        line_height = tkfont.Font(root=self.root, font=text_font).metrics('linespace')
+        viewer_text = tk.Text(text_frame, wrap=tk.NONE, font=text_font)
+        viewer_text.tag_configure('match', background="yellow")
+        
+        yscroll = ttk.Scrollbar(text_frame, orient=tk.VERTICAL)
+        xscroll = ttk.Scrollbar(text_frame, orient=tk.HORIZONTAL, command=viewer_text.xview)
+        viewer_text.configure(xscrollcommand=xscroll.set, state=tk.DISABLED)
+        
+        viewer_text.grid(row=0, column=0, sticky="nsew")
+        yscroll.grid(row=0, column=1, sticky="ns")
+        xscroll.grid(row=1, column=0, sticky="ew")
+        text_frame.rowconfigure(0, weight=1)
+        text_frame.columnconfigure(0, weight=1)
+        
+        # 按钮区域
+        button_frame = ttk.Frame(content_frame)
+        button_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        if extra_button:
+            ttk.Button(button_frame, text=extra_button[0], 
+                      command=extra_button[1]).pack(side=tk.LEFT)
+        
+        ttk.Button(button_frame, text="关闭", 
+                  command=view_window.destroy).pack(side=tk.RIGHT)
+        
+        state = {'index': None, 'top': 0, 'match': None}
+        
+        def visible_lines():
+            return max(1, viewer_text.winfo_height() // line_height)
+        
+        def render():
+            index = state['index']
+            if index is None:
+                return
+            total = index.line_count
+            visible = visible_lines()
+            top = max(0, min(state['top'], total - visible))
+            state['top'] = top
+            lines = index.lines(top, visible)
+            
+            viewer_text.config(state=tk.NORMAL)
+            viewer_text.delete(1.0, tk.END)
+            viewer_text.insert(tk.END, "\n".join(lines))
+            match = state['match']
+            if match is not None and top <= match < top + len(lines):
+                viewer_text.tag_add('match', f"{match - top + 1}.0", f"{match - top + 1}.end")
+            viewer_text.config(state=tk.DISABLED)
+            
+            if total:
+                yscroll.set(top / total, (top + len(lines)) / total)
+            else:
+                yscroll.set(0, 1)
+        
+        def scroll(*args):
+            index = state['index']
+            if index is None:
+                return
+            if args[0] == 'moveto':
+                state['top'] = int(float(args[1]) * index.line_count)
+            elif args[0] == 'scroll':
+                step = int(args[1])
+                if args[2] == 'pages':
+                    step *= visible_lines()
+                state['top'] = max(0, state['top'] + step)
+            render()
+        
+        def on_wheel(event):
+            if event.num == 4:
+                step = -3
+            elif event.num == 5:
+                step = 3
+            else:
+                step = -3 if event.delta > 0 else 3
+            scroll('scroll', step, 'units')
+            return "break"
+        
+        def poll_index():
+            # 索引建立期间定时刷新行数，完成后停止
+            index = state['index']
+            if index is None or not view_window.winfo_exists():
+                return
+            if index.done.is_set():
+                info_label.config(text=f"共 {index.line_count} 行，{self.format_file_size(index.size)}")
+            else:
+                info_label.config(text=f"正在建立索引... 已读取 {index.line_count} 行")
+                self.root.after(200, poll_index)
+            render()
+        
+        def attach(index):
+            if not view_window.winfo_exists():
+                return
+            state['index'] = index
+            index.start()
+            poll_index()
+        
+        def load():
+            try:
+                index = LineIndex(load_source())
+            except Exception as e:
+                message = f"加载失败: {str(e)}"
+                logging.error(message)
+                self.run_in_ui(lambda: view_window.winfo_exists() and info_label.config(text=message))
+                return
+            self.run_in_ui(attach, index)
+        
+        def show_match(query, lineno):
+            if not view_window.winfo_exists():
+                return
+            if lineno is None:
+                info_label.config(text=f"未找到: {query}")
+                return
+            state['match'] = lineno
+            state['top'] = max(0, lineno - 3)
+            info_label.config(text=f"第 {lineno + 1} 行 / 共 {state['index'].line_count} 行")
+            render()
+        
+        def find(kind):
+            index = state['index']
+            query = search_var.get().strip()
+            if index is None or not query:
+                return
+            start = state['match'] + 1 if state['match'] is not None else state['top']
+            info_label.config(text="正在查找...")
+            
+            def do_find():
+                try:
+                    if kind == 'domain':
+                        lineno = index.find_domain(query, start)
+                    else:
+                        lineno = index.search(query, start)
+                except Exception as e:
+                    # 查找过程中窗口被关闭
+                    logging.debug(f"查找中断: {str(e)}")
+                    return
+                self.run_in_ui(show_match, query, lineno)
+            
+            threading.Thread(target=do_find, daemon=True).start()
+        
+        def on_destroy(event):
+            if event.widget is view_window and state['index'] is not None:
+                state['index'].close()
+        
+        yscroll.config(command=scroll)
+        viewer_text.bind('<Configure>', lambda e: render())
+        viewer_text.bind('<MouseWheel>', on_wheel)
+        viewer_text.bind('<Button-4>', on_wheel)
+        viewer_text.bind('<Button-5>', on_wheel)
+        view_window.bind('<Prior>', lambda e: scroll('scroll', -1, 'pages'))
+        view_window.bind('<Next>', lambda e: scroll('scroll', 1, 'pages'))
+        search_entry.bind('<Return>', lambda e: find('text'))
+        view_window.bind('<Destroy>', on_destroy)
+        
+        threading.Thread(target=load, daemon=True).start()
+        return view_window
+    
     def change_font_size(self, delta):
         """改变字体大小"""
         new_size = self.font_size.get() + delta
         if 8 <= new_size <= 20:  # 限制字体大小范围
             self.font_size.set(new_size)
-            self.hosts_text.config(font=('Consolas', new_size))
+            self.font_size_setting = new_size
+            self.save_config()
+            self.hosts_preview.set_font(('Consolas', new_size))
             
             # 同时更新历史记录框的字体大小
             history_size = max(8, new_size - 1)  # 历史记录字体稍小
@@ -1660,45 +2017,25 @@ class GitHub520App:
     
     def clear_history(self):
         """清空更新历史"""
-        if self.update_history:
+        if len(self.history):
             result = messagebox.askyesno("确认清空", "确定要清空所有更新历史记录吗？")
             if result:
-                self.update_history = []
-                self.save_config()
+                self.history.clear()
                 self.update_history_display()
     
     def update_history_display(self):
         """更新历史记录显示"""
         self.history_text.delete(1.0, tk.END)
-        if not self.update_history:
+        recent = self.history.recent(5)  # 显示最近5次
+        if not recent:
             self.history_text.insert(tk.END, "暂无更新记录")
-        else:
-            # 过滤并只保留字典类型的记录
-            valid_history = []
-            for history in self.update_history[-5:]:  # 显示最近5次
-                if isinstance(history, dict):
-                    valid_history.append(history)
-                else:
-                    logging.warning(f"发现无效的历史记录类型: {type(history).__name__}")
-            
-            if not valid_history:
-                self.history_text.insert(tk.END, "历史记录格式错误")
-            else:
-                for history in valid_history:
-                    if history.get('type') == 'restore':
-                        self.history_text.insert(tk.END, 
-                            f"{history['time']} - {history['count']} ({history['backup_file']})\n")
-                    elif history.get('type') == 'restore_original':
-                        self.history_text.insert(tk.END, 
-                            f"{history['time']} - {history['count']}\n")
-                    else:
-                        self.history_text.insert(tk.END, 
-                            f"{history['time']} - 更新了 {history['count']} 条记录\n")
-            
-            # 如果有无效记录，清理更新历史
-            if len(valid_history) != len(self.update_history[-5:]):
-                self.update_history = valid_history + [h for h in self.update_history[:-5] if isinstance(h, dict)]
-                self.save_config()
+            return
+        
+        for event in reversed(recent):
+            line = history_log.describe(event)
+            if event.get('benchmark'):
+                line += f" [{netprobe.format_comparison(event['benchmark'])}]"
+            self.history_text.insert(tk.END, line + "\n")
     
     # DNS和网络相关方法
     def show_dns_helper(self):
@@ -1739,7 +2076,7 @@ class GitHub520App:
         dns_frame = ttk.LabelFrame(main_frame, text="选择DNS服务器", padding="10")
         dns_frame.pack(fill=tk.X, pady=(0, 15))
         
-        self.selected_dns = tk.StringVar(value=self.dns_servers[0])
+        self.selected_dns = tk.StringVar(value=self.dns_choice)
         
         for i, dns in enumerate(self.dns_servers):
             ttk.Radiobutton(dns_frame, text=dns, variable=self.selected_dns, 
@@ -1752,8 +2089,13 @@ class GitHub520App:
         ttk.Radiobutton(custom_frame, text="自定义:", variable=self.selected_dns, 
                        value="custom").pack(side=tk.LEFT)
         self.custom_dns = ttk.Entry(custom_frame, width=15)
+        self.custom_dns.insert(0, self.custom_dns_value)
         self.custom_dns.pack(side=tk.LEFT, padx=(5, 0))
         
+        # 选择变化时保存，连接耗时分析也使用这里选择的DNS
+        self.selected_dns.trace_add('write', lambda *args: self.on_dns_choice_change())
+        self.custom_dns.bind('<KeyRelease>', lambda e: self.on_dns_choice_change())
+        
         # 操作选项
         action_frame = ttk.LabelFrame(main_frame, text="网络修复操作", padding="10")
         action_frame.pack(fill=tk.X, pady=(0, 15))
@@ -1819,126 +2161,412 @@ class GitHub520App:
             messagebox.showerror("错误", f"DNS设置失败: {str(e)}")
     
     def execute_network_ops(self, window):
-        """执行选中的网络操作"""
-        try:
+        """在后台执行选中的网络操作，全部完成后显示结果"""
+        flush = self.flush_dns_var.get()
+        reset = self.reset_winsock_var.get()
+        if not (flush or reset):
+            messagebox.showwarning("警告", "请至少选择一个操作")
+            return
+        
+        def run(operation):
+            try:
+                return operation()
+            except Exception as e:
+                logging.error(f"网络操作失败: {str(e)}")
+                return False
+        
+        def do_ops(job):
             results = []
-            
-            if self.flush_dns_var.get():
-                success = self.flush_dns(silent=True)
+            if flush:
+                success = run(hosts_core.flush_dns)
                 results.append(f"刷新DNS缓存: {'成功' if success else '失败'}")
-            
-            if self.reset_winsock_var.get():
-                success = self.reset_winsock()
-                results.append(f"重置Winsock: {'成功' if success else '失败'}")
-            
-            if results:
-                messagebox.showinfo("操作完成", "\n".join(results))
-            else:
-                messagebox.showwarning("警告", "请至少选择一个操作")
-                
-        except Exception as e:
-            messagebox.showerror("错误", f"操作执行失败: {str(e)}")
+            if reset:
+                success = run(hosts_core.reset_winsock)
+                if success is None:
+                    results.append("重置Winsock: 此功能仅适用于Windows系统")
+                else:
+                    results.append(f"重置Winsock: {'成功，请重启电脑生效' if success else '失败'}")
+            return results
+        
+        self.jobs.submit("网络操作", do_ops, key='network_ops', timeout=NETWORK_JOB_TIMEOUT,
+                         on_done=lambda results: messagebox.showinfo("操作完成", "\n".join(results)),
+                         on_error=lambda error: messagebox.showerror("错误", f"操作执行失败: {str(error)}"))
     
-    def flush_dns(self, silent=False):
-        """刷新DNS缓存"""
-        try:
-            import subprocess
-            
-            if os.name == 'nt':  # Windows
-                result = subprocess.run(['ipconfig', '/flushdns'], 
-                                      capture_output=True, text=True)
-                success = result.returncode == 0
-            else:  # Linux/Mac
-                result = subprocess.run(['sudo', 'systemd-resolve', '--flush-caches'], 
-                                      capture_output=True, text=True)
-                success = result.returncode == 0
-            
+    def flush_dns(self, silent=False, callback=None):
+        """在后台刷新DNS缓存，完成后在主线程调用callback(是否成功)"""
+        def on_done(success):
             if not silent:
                 if success:
                     messagebox.showinfo("成功", "DNS缓存已刷新")
                 else:
                     messagebox.showerror("错误", "DNS缓存刷新失败")
-            
-            return success
-            
-        except Exception as e:
+            if callback:
+                callback(success)
+        
+        def on_error(error):
             if not silent:
-                messagebox.showerror("错误", f"刷新DNS缓存失败: {str(e)}")
-            return False
-    
-    def reset_winsock(self):
-        """重置Winsock"""
-        try:
-            if os.name == 'nt':  # Windows
-                import subprocess
-                result = subprocess.run(['netsh', 'winsock', 'reset'], 
-                                      capture_output=True, text=True)
-                success = result.returncode == 0
-                
-                if success:
-                    messagebox.showinfo("成功", "Winsock已重置，请重启电脑生效")
-                else:
-                    messagebox.showerror("错误", "Winsock重置失败")
-                
-                return success
-            else:
-                messagebox.showinfo("提示", "此功能仅适用于Windows系统")
-                return False
-                
-        except Exception as e:
-            messagebox.showerror("错误", f"重置Winsock失败: {str(e)}")
-            return False
+                messagebox.showerror("错误", f"刷新DNS缓存失败: {str(error)}")
+            if callback:
+                callback(False)
+        
+        job = self.jobs.submit("刷新DNS缓存", lambda job: hosts_core.flush_dns(), key='flush_dns',
+                               timeout=NETWORK_JOB_TIMEOUT, on_done=on_done, on_error=on_error)
+        if job is None and callback:
+            # 已经在刷新（如用户刚点击了刷新按钮），不必等待
+            callback(False)
     
     def network_diagnosis(self):
-        """网络诊断"""
-        try:
-            import subprocess
-            
-            # 测试网络连通性
-            targets = ['github.com', 'raw.githubusercontent.com', '8.8.8.8']
-            diagnosis_results = []
-            
-            for target in targets:
-                param = '-n' if os.name == 'nt' else '-c'
-                result = subprocess.run(['ping', param, '3', target], 
-                                      capture_output=True, text=True)
-                is_reachable = result.returncode == 0
-                status_text = "可访问" if is_reachable else "不可访问"
-                diagnosis_results.append((target, status_text, is_reachable))
-            
-            # 创建自定义对话框显示结果
-            diag_window = tk.Toplevel(self.root)
-            diag_window.title("网络诊断结果")
-            diag_window.geometry("400x200")
-            diag_window.transient(self.root)
-            
-            # 主框架
-            main_frame = ttk.Frame(diag_window, padding="20")
-            main_frame.pack(fill=tk.BOTH, expand=True)
+        """网络诊断（在后台逐个测试连通性，结果窗口中显示进度）"""
+        if self.jobs.is_running('network_diagnosis'):
+            return
+        targets = list(netprobe.DIAGNOSIS_TARGETS)
+        
+        # 创建自定义对话框显示结果
+        diag_window = tk.Toplevel(self.root)
+        diag_window.title("网络诊断结果")
+        diag_window.geometry("400x200")
+        diag_window.transient(self.root)
+        
+        # 主框架
+        main_frame = ttk.Frame(diag_window, padding="20")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        status_label = ttk.Label(main_frame, text="正在检测网络连通性，请稍候...")
+        status_label.pack(anchor=tk.W)
+        
+        results_frame = ttk.Frame(main_frame)
+        results_frame.pack(fill=tk.X)
+        
+        # 关闭按钮（关闭时取消尚未完成的诊断）
+        def close():
+            job.cancel()
+            diag_window.destroy()
+        
+        button_frame = ttk.Frame(main_frame)
+        button_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=(20, 0))
+        
+        close_button = ttk.Button(button_frame, text="关闭", command=close)
+        close_button.pack(side=tk.RIGHT)
+        diag_window.protocol("WM_DELETE_WINDOW", close)
+        
+        def show_progress(index, target):
+            if diag_window.winfo_exists():
+                status_label.config(text=f"正在检测 {target} ({index + 1}/{len(targets)})...")
+        
+        def show_results(results):
+            if not diag_window.winfo_exists():
+                return
+            status_label.config(text="诊断完成")
             
             # 显示每个目标的诊断结果
-            for target, status, is_reachable in diagnosis_results:
-                result_frame = ttk.Frame(main_frame)
+            for target, is_reachable in results:
+                result_frame = ttk.Frame(results_frame)
                 result_frame.pack(fill=tk.X, pady=5)
                 
                 # 目标名称标签
                 ttk.Label(result_frame, text=f"{target}: ", width=25).pack(side=tk.LEFT)
                 
                 # 状态标签，根据连通性设置不同颜色
-                status_label = ttk.Label(result_frame, text=status, 
-                                       foreground="green" if is_reachable else "red",
-                                       font=('Arial', 10, 'bold'))
-                status_label.pack(side=tk.LEFT)
+                status = "可访问" if is_reachable else "不可访问"
+                ttk.Label(result_frame, text=status, 
+                         foreground="green" if is_reachable else "red",
+                         font=('Arial', 10, 'bold')).pack(side=tk.LEFT)
+        
+        def show_error(error):
+            if diag_window.winfo_exists():
+                status_label.config(text=f"网络诊断失败: {str(error)}")
+        
+        def do_diagnosis(job):
+            # 测试网络连通性
+            results = []
+            for index, target in enumerate(targets):
+                job.check()
+                job.progress(index, target)
+                results.append((target, netprobe.ping(target)))
+            return results
+        
+        job = self.jobs.submit("网络诊断", do_diagnosis, key='network_diagnosis', timeout=NETWORK_JOB_TIMEOUT,
+                               on_done=show_results, on_error=show_error, on_progress=show_progress)
+    
+    def get_managed_domains(self):
+        """获取当前管理的域名列表（GitHub与Steam配置中的域名）"""
+        content = self.current_hosts + "\n" + getattr(self, 'steam_current_hosts', "")
+        return hosts_core.managed_domains(content) or list(netprobe.DEFAULT_DOMAINS)
+    
+    def on_dns_choice_change(self):
+        """记录DNS配置助手中的选择"""
+        self.dns_choice = self.selected_dns.get()
+        self.custom_dns_value = self.custom_dns.get().strip()
+        self.save_config()
+    
+    def on_steam_source_change(self):
+        """切换Steam hosts源"""
+        self.steam_source = self.steam_url_var.get()
+        self.save_config()
+    
+    def get_selected_dns_server(self):
+        """获取DNS配置助手中选择的DNS服务器（已保存到配置），未选择时使用列表第一个"""
+        dns_server = self.dns_choice
+        if dns_server == "custom":
+            dns_server = self.custom_dns_value
+        return dns_server or self.dns_servers[0]
+    
+    def phase_diagnosis(self):
+        """分阶段连接耗时分析（解析/TCP/TLS/首字节）"""
+        if self.jobs.is_running('phase_diagnosis'):
+            return
+        domains = self.get_managed_domains()
+        dns_server = self.get_selected_dns_server()
+        
+        try:
+            hosts_map = hosts_mapping(read_hosts_file())
+        except Exception as e:
+            logging.warning(f"读取hosts文件失败: {str(e)}")
+            hosts_map = {}
+        
+        # 创建结果窗口
+        diag_window = tk.Toplevel(self.root)
+        diag_window.title("连接耗时分析")
+        diag_window.geometry("1000x500")
+        diag_window.transient(self.root)
+        
+        main_frame = ttk.Frame(diag_window, padding="15")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        status_label = ttk.Label(main_frame, 
+                                text=f"正在测量 {len(domains)} 个域名，请稍候... (对比DNS: {dns_server})")
+        status_label.pack(anchor=tk.W, pady=(0, 10))
+        
+        # 结果表格
+        table_frame = ttk.Frame(main_frame)
+        table_frame.pack(fill=tk.BOTH, expand=True)
+        
+        columns = ("域名", "解析来源", "IP", "DNS查询IP", "解析(ms)", "TCP(ms)", "TLS(ms)", "首字节(ms)", "结果")
+        result_tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=15)
+        for column in columns:
+            result_tree.heading(column, text=column)
+            result_tree.column(column, width=90, anchor=tk.CENTER)
+        result_tree.column("域名", width=220, anchor=tk.W)
+        result_tree.column("IP", width=110)
+        result_tree.column("DNS查询IP", width=110)
+        result_tree.column("结果", width=180, anchor=tk.W)
+        
+        result_tree.tag_configure('green', foreground="green")
+        result_tree.tag_configure('yellow', foreground="#b8860b")
+        result_tree.tag_configure('red', foreground="red")
+        
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=result_tree.yview)
+        result_tree.configure(yscrollcommand=scrollbar.set)
+        result_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        # 阈值说明
+        threshold_text = "  ".join(f"{phase[:-3]}: 🟢≤{green} 🟡≤{yellow} 🔴>{yellow}"
+                                   for phase, (green, yellow) in netprobe.PHASE_THRESHOLDS.items())
+        ttk.Label(main_frame, text=f"阈值(ms)  {threshold_text}", 
+                 font=('Arial', 8), foreground="gray").pack(anchor=tk.W, pady=(5, 0))
+        
+        # 按钮区域
+        button_frame = ttk.Frame(main_frame)
+        button_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        export_btn = ttk.Button(button_frame, text="导出JSON", state="disabled",
+                               command=lambda: self.export_phase_results(diag_window.phase_results))
+        export_btn.pack(side=tk.LEFT)
+        
+        ttk.Button(button_frame, text="关闭", command=diag_window.destroy).pack(side=tk.RIGHT)
+        
+        def show_results(results):
+            if not diag_window.winfo_exists():
+                return
+            diag_window.phase_results = results
+            for result in results:
+                result_tree.insert("", tk.END, values=self.format_phase_row(result), 
+                                   tags=(result['level'],))
+            failed = len([r for r in results if r['error']])
+            status_label.config(text=f"测量完成: {len(results)} 个域名，{failed} 个失败 (对比DNS: {dns_server})")
+            export_btn.config(state="normal")
+        
+        def do_measure(job):
+            results = netprobe.diagnose_domains(domains, hosts_map, dns_server)
+            self.record_timeseries('record_phase_results', results)
+            metrics.observe_phase_results(results)
+            return results
+        
+        self.jobs.submit("连接耗时分析", do_measure, key='phase_diagnosis',
+                         on_done=show_results, on_error=lambda error: show_results([]))
+    
+    def format_phase_row(self, result):
+        """将单个域名的测量结果格式化为表格行"""
+        icons = {'green': "🟢", 'yellow': "🟡", 'red': "🔴"}
+        
+        def cell(phase):
+            value = result.get(phase)
+            if value is None:
+                return "-"
+            return f"{icons[netprobe.phase_level(phase, value)]} {value:.0f}"
+        
+        if result['error']:
+            outcome = f"🔴 {result['failed_phase']}失败: {result['error']}"
+        else:
+            outcome = icons[result['level']]
+        
+        return (result['domain'], result['source'], result['ip'] or "-", result['dns_ip'] or "-",
+                cell('resolve_ms'), cell('tcp_ms'), cell('tls_ms'), cell('ttfb_ms'), outcome)
+    
+    def export_phase_results(self, results):
+        """导出连接耗时分析结果"""
+        from tkinter import filedialog
+        
+        path = filedialog.asksaveasfilename(
+            title="导出诊断结果",
+            defaultextension=".json",
+            initialfile=f"diagnosis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            filetypes=[("JSON文件", "*.json")])
+        if not path:
+            return
+        
+        try:
+            netprobe.export_results(results, path)
+            logging.info(f"诊断结果已导出: {path}")
+            messagebox.showinfo("成功", f"诊断结果已导出到:\n{path}")
+        except Exception as e:
+            messagebox.showerror("错误", f"导出失败: {str(e)}")
+    
+    def show_trend_view(self):
+        """显示探测结果趋势（每个域名/IP一条迷你折线）"""
+        if self.timeseries is None:
+            messagebox.showerror("错误", "时序数据库不可用，请查看日志")
+            return
+        
+        trend_window = tk.Toplevel(self.root)
+        trend_window.title("趋势记录")
+        trend_window.geometry("900x550")
+        trend_window.transient(self.root)
+        
+        main_frame = ttk.Frame(trend_window, padding="15")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # 筛选栏
+        filter_frame = ttk.Frame(main_frame)
+        filter_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        metric_options = {
+            "TCP连接(ms)": 'tcp_ms',
+            "TLS握手(ms)": 'tls_ms',
+            "首字节(ms)": 'ttfb_ms',
+            "解析(ms)": 'resolve_ms',
+            "下载速度(KB/s)": 'throughput_kbps',
+        }
+        windows = {"最近24小时": 86400, "最近7天": 7 * 86400, "最近30天": 30 * 86400}
+        
+        metric_var = tk.StringVar(value="TCP连接(ms)")
+        window_var = tk.StringVar(value="最近24小时")
+        
+        ttk.Label(filter_frame, text="指标:").pack(side=tk.LEFT)
+        ttk.Combobox(filter_frame, textvariable=metric_var, values=list(metric_options.keys()),
+                     width=15, state="readonly").pack(side=tk.LEFT, padx=(5, 15))
+        
+        ttk.Label(filter_frame, text="时间范围:").pack(side=tk.LEFT)
+        ttk.Combobox(filter_frame, textvariable=window_var, values=list(windows.keys()),
+                     width=12, state="readonly").pack(side=tk.LEFT, padx=(5, 15))
+        
+        ttk.Label(filter_frame, text="蓝线: 每小时p50  灰线: 每小时p95  橙色竖线: hosts更新/恢复", 
+                 font=('Arial', 8), foreground="gray").pack(side=tk.RIGHT)
+        
+        # 迷你折线画布
+        canvas_frame = ttk.Frame(main_frame)
+        canvas_frame.pack(fill=tk.BOTH, expand=True)
+        
+        canvas = tk.Canvas(canvas_frame, background="white")
+        scrollbar = ttk.Scrollbar(canvas_frame, orient=tk.VERTICAL, command=canvas.yview)
+        canvas.configure(yscrollcommand=scrollbar.set)
+        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        def redraw(event=None):
+            metric = metric_options[metric_var.get()]
+            until = time.time()
+            since = until - windows[window_var.get()]
+            self.draw_sparklines(canvas, metric, since, until)
+        
+        for combobox in filter_frame.winfo_children():
+            if isinstance(combobox, ttk.Combobox):
+                combobox.bind("<<ComboboxSelected>>", redraw)
+        
+        button_frame = ttk.Frame(main_frame)
+        button_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        ttk.Button(button_frame, text="刷新", command=redraw).pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="关闭", command=trend_window.destroy).pack(side=tk.RIGHT)
+        
+        redraw()
+    
+    def draw_sparklines(self, canvas, metric, since, until):
+        """在画布上为每个 域名/IP 绘制每小时p50/p95迷你折线"""
+        canvas.delete("all")
+        
+        row_height = 36
+        label_width, line_width, line_height = 300, 380, 24
+        line_left = label_width + 10
+        
+        try:
+            series_keys = self.timeseries.series_keys(metric, since)
+            events = self.timeseries.events(since)
+        except Exception as e:
+            canvas.create_text(10, 10, anchor=tk.NW, text=f"读取时序数据失败: {str(e)}", fill="red")
+            return
+        
+        if not series_keys:
+            canvas.create_text(10, 10, anchor=tk.NW, 
+                               text="该时间范围内暂无数据，请先运行连接耗时分析或更新测速", fill="gray")
+            canvas.configure(scrollregion=(0, 0, 0, 0))
+            return
+        
+        def x_of(ts):
+            return line_left + (ts - since) / (until - since) * line_width
+        
+        for row, (domain, ip) in enumerate(series_keys):
+            top = row * row_height + 6
+            aggregates = self.timeseries.aggregate(domain, metric, ip or '', since, until)
             
-            # 关闭按钮
-            button_frame = ttk.Frame(main_frame)
-            button_frame.pack(fill=tk.X, pady=(20, 0))
+            canvas.create_text(10, top + line_height / 2, anchor=tk.W, 
+                               text=f"{domain}  {ip or ''}", font=('Consolas', 9))
+            canvas.create_rectangle(line_left, top, line_left + line_width, top + line_height, 
+                                    outline="#e0e0e0")
             
-            close_button = ttk.Button(button_frame, text="关闭", command=diag_window.destroy)
-            close_button.pack(side=tk.RIGHT)
+            # hosts更新事件标记，便于对照IP何时开始变差
+            for ts, _, _ in events:
+                canvas.create_line(x_of(ts), top, x_of(ts), top + line_height, fill="orange")
             
-        except Exception as e:
-            messagebox.showerror("错误", f"网络诊断失败: {str(e)}")
+            if not aggregates:
+                continue
+            
+            values = [a['p50'] for a in aggregates] + [a['p95'] for a in aggregates]
+            low, high = min(values), max(values)
+            span = (high - low) or 1
+            
+            def y_of(value):
+                return top + line_height - 2 - (value - low) / span * (line_height - 4)
+            
+            for key, color in (('p95', "#bbbbbb"), ('p50', "#1e88e5")):
+                points = []
+                for aggregate in aggregates:
+                    points.extend((x_of(aggregate['bucket'] + 1800), y_of(aggregate[key])))
+                if len(points) >= 4:
+                    canvas.create_line(*points, fill=color, width=1.5)
+                else:
+                    canvas.create_oval(points[0] - 2, points[1] - 2, points[0] + 2, points[1] + 2, 
+                                       fill=color, outline=color)
+            
+            latest = aggregates[-1]
+            samples = sum(a['count'] for a in aggregates)
+            canvas.create_text(line_left + line_width + 10, top + line_height / 2, anchor=tk.W, 
+                               text=f"p50 {latest['p50']:.0f}  p95 {latest['p95']:.0f}  ({samples}次)",
+                               font=('Arial', 9))
+        
+        canvas.configure(scrollregion=(0, 0, line_left + line_width + 200, 
+                                       len(series_keys) * row_height + 10))
     
     def show_backup_manager(self):
         """显示备份管理器窗口"""
@@ -1977,21 +2605,47 @@ class GitHub520App:
         ttk.Button(list_control_frame, text="打开备份目录", 
                   command=lambda: self.open_backup_directory(self.backup_dir)).pack(side=tk.LEFT, padx=(10, 0))
         
+        # 筛选条件：类型和日期范围（YYYY-MM-DD，留空表示不限）
+        filter_frame = ttk.Frame(list_frame)
+        filter_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        self.backup_query = {
+            'reason': tk.StringVar(value="全部"),
+            'since': tk.StringVar(),
+            'until': tk.StringVar(),
+            'page': 0,
+            'page_label': None,
+        }
+        
+        ttk.Label(filter_frame, text="类型:").pack(side=tk.LEFT)
+        reason_combo = ttk.Combobox(filter_frame, textvariable=self.backup_query['reason'], 
+                                    values=list(BACKUP_REASON_FILTERS), state="readonly", width=10)
+        reason_combo.pack(side=tk.LEFT, padx=(5, 15))
+        
+        ttk.Label(filter_frame, text="日期从:").pack(side=tk.LEFT)
+        ttk.Entry(filter_frame, textvariable=self.backup_query['since'], width=12).pack(side=tk.LEFT, padx=(5, 5))
+        ttk.Label(filter_frame, text="到:").pack(side=tk.LEFT)
+        ttk.Entry(filter_frame, textvariable=self.backup_query['until'], width=12).pack(side=tk.LEFT, padx=(5, 15))
+        
+        ttk.Button(filter_frame, text="筛选", 
+                  command=lambda: self.change_backup_page(backup_list, None)).pack(side=tk.LEFT)
+        
         # 备份文件列表
         backup_list_frame = ttk.Frame(list_frame)
         backup_list_frame.pack(fill=tk.BOTH, expand=True)
         
         # 创建列表和滚动条
-        columns = ("文件名", "大小", "修改时间")
+        columns = ("文件名", "类型", "大小", "条目数", "修改时间")
         backup_list = ttk.Treeview(backup_list_frame, columns=columns, show="headings", height=12)
         
         # 设置列
-        backup_list.heading("文件名", text="文件名")
-        backup_list.heading("大小", text="大小")
-        backup_list.heading("修改时间", text="修改时间")
+        for column in columns:
+            backup_list.heading(column, text=column)
         
-        backup_list.column("文件名", width=300)
-        backup_list.column("大小", width=100)
+        backup_list.column("文件名", width=260)
+        backup_list.column("类型", width=90)
+        backup_list.column("大小", width=80)
+        backup_list.column("条目数", width=70)
         backup_list.column("修改时间", width=150)
         
         # 滚动条
@@ -2001,6 +2655,17 @@ class GitHub520App:
         backup_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
+        # 分页
+        page_frame = ttk.Frame(list_frame)
+        page_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        ttk.Button(page_frame, text="上一页", 
+                  command=lambda: self.change_backup_page(backup_list, -1)).pack(side=tk.LEFT)
+        ttk.Button(page_frame, text="下一页", 
+                  command=lambda: self.change_backup_page(backup_list, 1)).pack(side=tk.LEFT, padx=(10, 0))
+        self.backup_query['page_label'] = ttk.Label(page_frame, text="", foreground="gray")
+        self.backup_query['page_label'].pack(side=tk.LEFT, padx=(15, 0))
+        
         # 操作按钮框架
         action_frame = ttk.Frame(main_frame)
         action_frame.pack(fill=tk.X)
@@ -2008,9 +2673,15 @@ class GitHub520App:
         ttk.Button(action_frame, text="查看选中备份", 
                   command=lambda: self.view_selected_backup(backup_list)).pack(side=tk.LEFT, padx=(0, 10))
         
+        ttk.Button(action_frame, text="与当前hosts比较", 
+                  command=lambda: self.compare_selected_backup(backup_list)).pack(side=tk.LEFT, padx=(0, 10))
+        
         ttk.Button(action_frame, text="恢复选中备份", 
                   command=lambda: self.restore_selected_backup(backup_list, backup_window)).pack(side=tk.LEFT, padx=(0, 10))
         
+        ttk.Button(action_frame, text="部分恢复", 
+                  command=lambda: self.restore_selected_section(backup_list)).pack(side=tk.LEFT, padx=(0, 10))
+        
         ttk.Button(action_frame, text="删除选中备份", 
                   command=lambda: self.delete_selected_backup(backup_list)).pack(side=tk.LEFT, padx=(0, 10))
         
@@ -2023,34 +2694,61 @@ class GitHub520App:
         # 绑定双击事件
         backup_list.bind('<Double-1>', lambda e: self.view_selected_backup(backup_list))
     
+    def change_backup_page(self, backup_list, step):
+        """翻页（step为None时表示重新筛选并回到第一页）"""
+        query = self.backup_query
+        query['page'] = 0 if step is None else max(0, query['page'] + step)
+        self.refresh_backup_list(backup_list)
+    
+    def backup_query_range(self):
+        """把筛选框中的日期转换为时间戳范围，格式错误时抛出ValueError"""
+        since = self.backup_query['since'].get().strip()
+        until = self.backup_query['until'].get().strip()
+        since_time = datetime.strptime(since, "%Y-%m-%d").timestamp() if since else None
+        # 结束日期包含当天
+        until_time = datetime.strptime(until, "%Y-%m-%d").timestamp() + 86400 - 0.001 if until else None
+        return since_time, until_time
+    
     def refresh_backup_list(self, backup_list):
-        """刷新备份文件列表"""
+        """刷新备份文件列表（只显示当前页，数据来自备份清单索引）"""
         # 清空列表
-        for item in backup_list.get_children():
-            backup_list.delete(item)
+        backup_list.delete(*backup_list.get_children())
         
+        query = getattr(self, 'backup_query', None)
         try:
-            if os.path.exists(self.backup_dir):
-                # 查找所有备份文件
-                backup_files = []
-                for filename in os.listdir(self.backup_dir):
-                    if filename.startswith('hosts.'):
-                        filepath = os.path.join(self.backup_dir, filename)
-                        if os.path.isfile(filepath):
-                            # 获取文件信息
-                            stat = os.stat(filepath)
-                            size = self.format_file_size(stat.st_size)
-                            mtime = datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M:%S")
-                            
-                            backup_files.append((filename, size, mtime, filepath))
-                
-                # 按修改时间排序（最新的在前面）
-                backup_files.sort(key=lambda x: x[2], reverse=True)
-                
-                # 添加到列表
-                for filename, size, mtime, filepath in backup_files:
-                    backup_list.insert("", tk.END, values=(filename, size, mtime), tags=(filepath,))
-            
+            reasons = None
+            since_time = until_time = None
+            page = 0
+            if query:
+                reasons = BACKUP_REASON_FILTERS.get(query['reason'].get())
+                since_time, until_time = self.backup_query_range()
+                page = query['page']
+            
+            store = hosts_core.backup_store(self.backup_dir)
+            records, total = store.query(reasons, since_time, until_time, 
+                                         offset=page * BACKUP_PAGE_SIZE, limit=BACKUP_PAGE_SIZE)
+            # 翻过最后一页时回到最后一页
+            if not records and total and page:
+                page = (total - 1) // BACKUP_PAGE_SIZE
+                records, total = store.query(reasons, since_time, until_time, 
+                                             offset=page * BACKUP_PAGE_SIZE, limit=BACKUP_PAGE_SIZE)
+            
+            # 备份清单已按时间排序（最新的在前面），原始备份在最后
+            for record in records:
+                size = self.format_file_size(record['size'])
+                mtime = datetime.fromtimestamp(record['time']).strftime("%Y-%m-%d %H:%M:%S")
+                reason = BACKUP_REASON_NAMES.get(record['reason'], record['reason'])
+                entries = record.get('entries')
+                backup_list.insert("", tk.END, values=(record['name'], reason, size, 
+                                                       "-" if entries is None else entries, mtime))
+            
+            if query:
+                query['page'] = page
+                pages = max(1, (total + BACKUP_PAGE_SIZE - 1) // BACKUP_PAGE_SIZE)
+                query['page_label'].config(text=f"第 {page + 1}/{pages} 页，共 {total} 个备份")
+            
+        except ValueError:
+            messagebox.showerror("错误", "日期格式应为 YYYY-MM-DD")
         except Exception as e:
             messagebox.showerror("错误", f"无法读取备份目录: {str(e)}")
     
@@ -2075,10 +2773,26 @@ class GitHub520App:
             return
         
         item = selection[0]
-        filename = backup_list.item(item)['values'][0]
-        filepath = os.path.join(self.backup_dir, filename)
+        backup_name = backup_list.item(item)['values'][0]
+        
+        self.view_backup_file(backup_name)
+    
+    def compare_selected_backup(self, backup_list):
+        """按条目比较选中的备份与当前hosts文件"""
+        selection = backup_list.selection()
+        if not selection:
+            messagebox.showwarning("警告", "请先选择一个备份文件")
+            return
+        
+        backup_name = backup_list.item(selection[0])['values'][0]
+        store = hosts_core.backup_store(self.backup_dir)
         
-        self.view_backup_file(filepath)
+        def build_report():
+            # 在查看器的后台线程中执行，大文件不会阻塞界面
+            diff = hosts_diff.diff_hosts(store.read(backup_name), read_hosts_file())
+            return hosts_diff.format_diff(diff, backup_name, "当前hosts").encode('utf-8')
+        
+        self.show_text_viewer("备份差异", f"比较: {backup_name} → 当前hosts", build_report)
     
     def restore_selected_backup(self, backup_list, window):
         """恢复选中的备份文件"""
@@ -2088,12 +2802,109 @@ class GitHub520App:
             return
         
         item = selection[0]
-        filename = backup_list.item(item)['values'][0]
-        filepath = os.path.join(self.backup_dir, filename)
+        backup_name = backup_list.item(item)['values'][0]
         
-        self.restore_backup(filepath)
+        self.restore_backup(backup_name)
         window.destroy()
     
+    def restore_selected_section(self, backup_list):
+        """只恢复选中备份中的一个区域"""
+        selection = backup_list.selection()
+        if not selection:
+            messagebox.showwarning("警告", "请先选择一个备份文件")
+            return
+        
+        self.show_section_restore_dialog(backup_list.item(selection[0])['values'][0])
+    
+    def show_section_restore_dialog(self, backup_name):
+        """选择要从备份中恢复的区域（GitHub配置、Steam配置或指定域名）"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("部分恢复")
+        dialog.geometry("460x300")
+        dialog.resizable(False, False)
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        main_frame = ttk.Frame(dialog, padding="15")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(main_frame, text=f"备份: {backup_name}", 
+                 font=('Arial', 11, 'bold')).pack(anchor=tk.W)
+        ttk.Label(main_frame, text="只把所选内容恢复为备份中的状态，hosts中的其他内容保持不变", 
+                 font=('Arial', 9), foreground="gray").pack(anchor=tk.W, pady=(0, 10))
+        
+        section_var = tk.StringVar(value="github")
+        hosts_var = tk.StringVar()
+        
+        ttk.Radiobutton(main_frame, text="GitHub加速配置", variable=section_var, 
+                       value="github").pack(anchor=tk.W, pady=2)
+        ttk.Radiobutton(main_frame, text="Steam加速配置", variable=section_var, 
+                       value="steam").pack(anchor=tk.W, pady=2)
+        ttk.Radiobutton(main_frame, text="指定域名（逗号或空格分隔）:", variable=section_var, 
+                       value="hosts").pack(anchor=tk.W, pady=2)
+        ttk.Entry(main_frame, textvariable=hosts_var).pack(fill=tk.X, padx=(20, 0), pady=(0, 10))
+        
+        button_frame = ttk.Frame(main_frame)
+        button_frame.pack(fill=tk.X, side=tk.BOTTOM)
+        
+        ttk.Button(button_frame, text="恢复", 
+                  command=lambda: self.restore_backup_section(
+                      backup_name, section_var.get(), 
+                      hosts_var.get().replace(',', ' ').split(), dialog)).pack(side=tk.RIGHT)
+        ttk.Button(button_frame, text="取消", 
+                  command=dialog.destroy).pack(side=tk.RIGHT, padx=(0, 10))
+    
+    def restore_backup_section(self, backup_name, section, hostnames, dialog=None):
+        """把备份中的一个区域合并到当前hosts文件（持有hosts锁一次写入）"""
+        if self.hosts_write_running():
+            return
+        if section == 'hosts' and not hostnames:
+            messagebox.showwarning("警告", "请输入要恢复的域名")
+            return
+        
+        label = {'github': "GitHub加速配置", 'steam': "Steam加速配置"}.get(section, ', '.join(hostnames))
+        backup_dir = self.backup_dir
+        
+        def do_restore(job):
+            backup_content = hosts_core.backup_store(backup_dir).read(backup_name)
+            return hosts_core.update_hosts_file(
+                lambda current: hosts_core.restore_section(current, backup_content, section, hostnames),
+                backup_prefix="hosts.before_restore_", backup_dir=backup_dir)
+        
+        def on_restored(result):
+            current_backup_name, new_content, changed = result
+            if dialog and dialog.winfo_exists():
+                dialog.destroy()
+            
+            if not changed:
+                messagebox.showinfo("无需恢复", f"{label} 与备份中一致，hosts文件未修改")
+                return
+            
+            # 记录恢复历史
+            self.history.append('restore_section', restored=backup_name, backup=current_backup_name, 
+                                note=label)
+            self.record_timeseries('record_event', 'restore_section', f"{backup_name} {section}")
+            metrics.record_hosts_apply('restore_section', len(parse_hosts_entries(new_content)))
+            
+            # 更新UI
+            self.check_hosts_status()
+            self.update_history_display()
+            
+            messagebox.showinfo("恢复成功", 
+                f"已从备份恢复{label}！\n\n"
+                f"恢复的备份: {backup_name}\n"
+                f"当前状态已备份为: {current_backup_name or ''}")
+        
+        def on_failed(error):
+            if isinstance(error, PermissionError):
+                messagebox.showerror("权限错误", 
+                    "需要管理员权限来恢复hosts文件。\n\n"
+                    "请以管理员身份运行此程序。")
+            else:
+                messagebox.showerror("错误", f"部分恢复失败: {str(error)}")
+        
+        self.submit_hosts_write("部分恢复", do_restore, on_restored, on_failed)
+    
     def delete_selected_backup(self, backup_list):
         """删除选中的备份文件"""
         selection = backup_list.selection()
@@ -2102,67 +2913,76 @@ class GitHub520App:
             return
         
         item = selection[0]
-        filename = backup_list.item(item)['values'][0]
-        filepath = os.path.join(self.backup_dir, filename)
+        backup_name = backup_list.item(item)['values'][0]
         
         # 不允许删除原始备份
-        if filename == "hosts.original_backup":
+        if backup_name == "hosts.original_backup":
             messagebox.showwarning("警告", "不能删除原始备份文件")
             return
         
-        result = messagebox.askyesno("确认删除", f"确定要删除备份文件吗？\n\n{filename}")
+        result = messagebox.askyesno("确认删除", f"确定要删除备份吗？\n\n{backup_name}")
         if result:
             try:
-                os.remove(filepath)
+                hosts_core.backup_store(self.backup_dir).delete(backup_name)
                 self.refresh_backup_list(backup_list)
                 messagebox.showinfo("成功", "备份文件已删除")
             except Exception as e:
                 messagebox.showerror("错误", f"删除文件失败: {str(e)}")
     
-    def restore_backup(self, backup_path):
-        """从备份恢复hosts文件"""
-        try:
-            if not os.path.exists(backup_path):
-                messagebox.showerror("错误", "备份文件不存在")
-                return
-            
-            # 确认对话框
-            result = messagebox.askyesno("确认恢复", 
-                f"确定要从备份恢复hosts文件吗？\n\n"
-                f"备份文件: {os.path.basename(backup_path)}\n"
-                f"这将覆盖当前的hosts文件。")
-            
-            if not result:
-                return
-            
-            # 读取备份文件内容
-            with open(backup_path, 'r', encoding='utf-8') as f:
-                backup_content = f.read()
-            
-            # 确定hosts文件路径
-            if os.name == 'nt':  # Windows
-                hosts_path = r'C:\Windows\System32\drivers\etc\hosts'
-            else:  # Linux/Mac
-                hosts_path = '/etc/hosts'
-            
-            # 创建当前状态的备份（在恢复前备份当前状态）
-            current_backup_path = os.path.join(self.backup_dir, f"hosts.before_restore_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
-            if os.path.exists(hosts_path):
-                shutil.copy2(hosts_path, current_backup_path)
+    def hosts_write_running(self):
+        """已有写入hosts的任务（更新或恢复）在执行时提示用户并返回True（在确认之前检查）"""
+        if self.jobs.is_running('write_hosts'):
+            messagebox.showinfo("提示", "正在写入hosts文件，请等待完成后再操作")
+            return True
+        return False
+    
+    def submit_hosts_write(self, name, fn, on_done, on_error):
+        """提交写入hosts文件的任务（更新、恢复共用），同时只执行一个；已有任务在执行时提示并返回None"""
+        job = self.jobs.submit(name, fn, key='write_hosts', on_done=on_done, on_error=on_error)
+        if job is None:
+            messagebox.showinfo("提示", "正在写入hosts文件，请等待完成后再操作")
+        return job
+    
+    def restore_backup(self, backup_name, dialog=None):
+        """从备份恢复hosts文件（确认后在后台写入）"""
+        if self.hosts_write_running():
+            return
+        store = hosts_core.backup_store(self.backup_dir)
+        if not store.get(backup_name):
+            messagebox.showerror("错误", "备份不存在")
+            return
+        
+        # 确认对话框
+        result = messagebox.askyesno("确认恢复", 
+            f"确定要从备份恢复hosts文件吗？\n\n"
+            f"备份: {backup_name}\n"
+            f"这将覆盖当前的hosts文件。")
+        
+        if not result:
+            return
+        
+        if dialog:
+            dialog.destroy()
+        
+        backup_dir = self.backup_dir
+        
+        def do_restore(job):
+            # 读取备份内容
+            backup_content = store.read(backup_name)
             
-            # 写入备份内容
-            with open(hosts_path, 'w', encoding='utf-8') as f:
-                f.write(backup_content)
+            # 备份当前状态并写入备份内容（同一次加锁完成）
+            current_backup_name, _, _ = hosts_core.update_hosts_file(
+                lambda current: backup_content, "hosts.before_restore_", backup_dir=backup_dir)
+            return backup_content, current_backup_name or ""
+        
+        def on_restored(result):
+            backup_content, current_backup_name = result
             
             # 记录恢复历史
-            restore_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self.update_history.append({
-                'time': restore_time,
-                'count': '恢复备份',
-                'type': 'restore',
-                'backup_file': os.path.basename(backup_path)
-            })
-            self.save_config()
+            restore_time = self.history.append('restore', restored=backup_name, 
+                                               backup=current_backup_name or None)['time']
+            self.record_timeseries('record_event', 'restore', backup_name)
+            metrics.record_hosts_apply('restore', len(parse_hosts_entries(backup_content)))
             
             # 更新UI
             self.check_hosts_status()
@@ -2170,18 +2990,21 @@ class GitHub520App:
             
             # 显示成功消息
             success_msg = (f"hosts文件已从备份恢复！\n\n"
-                          f"恢复的备份: {os.path.basename(backup_path)}\n"
+                          f"恢复的备份: {backup_name}\n"
                           f"恢复时间: {restore_time}\n"
-                          f"当前状态已备份为: {os.path.basename(current_backup_path)}")
+                          f"当前状态已备份为: {current_backup_name}")
             
             messagebox.showinfo("恢复成功", success_msg)
-            
-        except PermissionError:
-            messagebox.showerror("权限错误", 
-                "需要管理员权限来恢复hosts文件。\n\n"
-                "请以管理员身份运行此程序。")
-        except Exception as e:
-            messagebox.showerror("错误", f"恢复备份失败: {str(e)}")
+        
+        def on_failed(error):
+            if isinstance(error, PermissionError):
+                messagebox.showerror("权限错误", 
+                    "需要管理员权限来恢复hosts文件。\n\n"
+                    "请以管理员身份运行此程序。")
+            else:
+                messagebox.showerror("错误", f"恢复备份失败: {str(error)}")
+        
+        self.submit_hosts_write("从备份恢复", do_restore, on_restored, on_failed)
 
 def main():
     # 添加完整的异常处理
@@ -2207,10 +3030,20 @@ def main():
                 except Exception as e:
                     print(f"权限检查失败: {e}")
         
+        # --trace <文件>: 记录各步骤耗时，退出时写入（.json为Chrome追踪格式，其他为JSON Lines）
+        trace_path = tracing.trace_path_from_argv(sys.argv[1:])
+        if trace_path:
+            tracing.enable(trace_path)
+        
         # 启动应用程序
         root = tk.Tk()
         app = GitHub520App(root)
+        # --startup-benchmark: 输出首次绘制和可交互耗时(JSON)后退出
+        app.startup_benchmark = '--startup-benchmark' in sys.argv
         root.mainloop()
+        # 取消未完成的后台任务（下载会保留已下载的部分），写入尚未保存的配置
+        app.jobs.shutdown()
+        app.config_store.close()
     except Exception as e:
         print(f"程序启动失败: {e}")
         import traceback
@@ -0,0 +1,460 @@
+# backup_store.py
+"""按内容哈希存储的hosts备份：相同内容只保存一份，清单(manifest.json)记录时间、类型、大小、条目数和内容哈希，
+同时作为备份管理器的索引：每次备份时追加一条记录，列出备份不需要扫描目录或读取内容。
+
+相邻备份通常只差几行，因此内容对象以"完整快照 + 行级增量"的链式方式保存：
+每个增量都基于上一次备份，链长度超过 snapshot_interval 时重新保存完整快照，
+还原任意版本最多需要应用 snapshot_interval 个增量，还原后用SHA-256校验。
+
+目录结构:
+    backup/manifest.json            备份清单和内容对象表
+    backup/objects/ab/abcdef...     zlib压缩的快照或增量，文件名为还原后内容的SHA-256
+    backup/hosts.original_backup    原始hosts（普通文件，永久保留）
+"""
+import difflib
+import hashlib
+import json
+import logging
+import os
+import time
+import zlib
+from datetime import datetime
+
+from locking import FileLock
+
+ORIGINAL_NAME = "hosts.original_backup"
+
+# 备份名前缀 -> 类型
+REASONS = {
+    "hosts.backup_": 'update',
+    "hosts.steam_backup_": 'steam_update',
+    "hosts.before_restore_": 'before_restore',
+}
+
+# 默认保留策略：增量存储占用很小，默认保留最近100个版本、180天内，总大小不超过10MB
+DEFAULT_RETENTION = {
+    'keep': 100,
+    'max_age_days': 180,
+    'max_bytes': 10 * 1024 * 1024,
+}
+
+# 每条增量链最多包含的增量个数
+SNAPSHOT_INTERVAL = 10
+
+# 对象文件头：快照为 "GFB1 F\n"+内容，增量为 "GFB1 D <基准哈希>\n"+增量数据；
+# 没有文件头的对象是旧版本保存的完整内容
+MAGIC = b"GFB1 "
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def reason_of(name):
+    """根据备份名判断备份类型"""
+    if name == ORIGINAL_NAME:
+        return 'original'
+    for prefix, reason in REASONS.items():
+        if name.startswith(prefix):
+            return reason
+    return 'other'
+
+
+def count_entries(data):
+    """统计非注释行数（与hosts_core.count_entries一致）"""
+    return len([line for line in data.split(b'\n') if line.strip() and not line.startswith(b'#')])
+
+
+def encode_delta(base, data):
+    """计算行级增量，返回JSON：[起, 止] 表示复制基准版本的行，字符串列表表示插入的新行"""
+    base_lines = base.splitlines(keepends=True)
+    new_lines = data.splitlines(keepends=True)
+
+    # 先去掉相同的开头和结尾，只对中间变化的部分做比较
+    prefix = 0
+    limit = min(len(base_lines), len(new_lines))
+    while prefix < limit and base_lines[prefix] == new_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    while (suffix < limit - prefix
+           and base_lines[-1 - suffix] == new_lines[-1 - suffix]):
+        suffix += 1
+
+    ops = [[0, prefix]] if prefix else []
+    matcher = difflib.SequenceMatcher(None, base_lines[prefix:len(base_lines) - suffix],
+                                      new_lines[prefix:len(new_lines) - suffix])
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([prefix + i1, prefix + i2])
+        elif j2 > j1:
+            # latin-1可以无损表示任意字节
+            ops.append([line.decode('latin-1') for line in new_lines[prefix + j1:prefix + j2]])
+    if suffix:
+        ops.append([len(base_lines) - suffix, len(base_lines)])
+    return json.dumps(ops, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def apply_delta(base, delta):
+    """把encode_delta生成的增量应用到基准内容上"""
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for op in json.loads(delta.decode('utf-8')):
+        if isinstance(op[0], int):
+            parts.extend(base_lines[op[0]:op[1]])
+        else:
+            parts.extend(line.encode('latin-1') for line in op)
+    return b''.join(parts)
+
+
+class BackupStore:
+    """备份仓库，可被多个进程同时使用（修改清单时持有文件锁）"""
+
+    def __init__(self, root, retention=None, snapshot_interval=SNAPSHOT_INTERVAL):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self.original_path = os.path.join(root, ORIGINAL_NAME)
+        self.retention = dict(DEFAULT_RETENTION, **(retention or {}))
+        self.snapshot_interval = snapshot_interval
+        self.lock = FileLock(os.path.join(root, "manifest.lock"), timeout=30)
+        self._cache = None          # (清单文件的修改时间和大小, 备份记录, 对象表)
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.import_legacy_files()
+
+    # ---------- 清单 ----------
+
+    def _load(self):
+        """读取清单，返回 (备份记录列表, 内容对象表 哈希 -> {'base', 'depth', 'stored'})
+
+        清单文件没有变化时直接使用上次解析的结果（返回副本，调用方可以修改）。
+        """
+        try:
+            stat = os.stat(self.manifest_path)
+            key = (stat.st_mtime_ns, stat.st_size)
+            if self._cache and self._cache[0] == key:
+                return [dict(r) for r in self._cache[1]], {d: dict(o) for d, o in self._cache[2].items()}
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return [], {}
+        except (OSError, ValueError) as e:
+            logging.error(f"读取备份清单失败: {str(e)}")
+            return [], {}
+
+        records = manifest.get('backups', [])
+        objects = manifest.get('objects')
+        if objects is None:
+            # 版本1的清单没有对象表，所有对象都是完整内容
+            objects = {r['hash']: {'base': None, 'depth': 0, 'stored': r['stored']} for r in records}
+        self._cache = (key, records, objects)
+        return [dict(r) for r in records], {d: dict(o) for d, o in objects.items()}
+
+    def _save(self, records, objects):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 2, 'backups': records, 'objects': objects},
+                      f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    # ---------- 内容对象 ----------
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _write_object(self, digest, data, objects, base_digest=None):
+        """写入内容对象（已存在时跳过）；基准链未满时保存为相对base_digest的增量"""
+        if digest in objects and os.path.exists(self._object_path(digest)):
+            return objects[digest]
+
+        payload = zlib.compress(MAGIC + b"F\n" + data, 9)
+        entry = {'base': None, 'depth': 0}
+
+        base = objects.get(base_digest) if base_digest else None
+        if base is not None and base['depth'] < self.snapshot_interval:
+            try:
+                delta = zlib.compress(MAGIC + b"D " + base_digest.encode('ascii') + b"\n"
+                                      + encode_delta(self._read_object(base_digest), data), 9)
+                # 增量不够小时直接保存快照
+                if len(delta) < len(payload) // 2:
+                    payload = delta
+                    entry = {'base': base_digest, 'depth': base['depth'] + 1}
+            except (OSError, ValueError) as e:
+                logging.warning(f"基准备份不可用，保存完整快照: {str(e)}")
+
+        self._store_payload(digest, payload)
+        entry['stored'] = len(payload)
+        objects[digest] = entry
+        return entry
+
+    def _store_payload(self, digest, payload):
+        path = self._object_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+    def _read_object(self, digest):
+        """沿增量链找到快照后依次应用增量，还原后校验哈希"""
+        deltas = []
+        current = digest
+        while True:
+            with open(self._object_path(current), 'rb') as f:
+                payload = zlib.decompress(f.read())
+            if payload.startswith(MAGIC + b"D "):
+                header, _, delta = payload.partition(b"\n")
+                deltas.append(delta)
+                current = header[len(MAGIC) + 2:].decode('ascii')
+                if len(deltas) > max(self.snapshot_interval, SNAPSHOT_INTERVAL) * 2:
+                    raise ValueError(f"备份增量链过长: {digest}")
+            elif payload.startswith(MAGIC + b"F\n"):
+                data = payload[len(MAGIC) + 2:]
+                break
+            else:
+                data = payload
+                break
+
+        for delta in reversed(deltas):
+            data = apply_delta(data, delta)
+        if content_hash(data) != digest:
+            raise ValueError(f"备份内容校验失败: {digest}")
+        return data
+
+    def _live_objects(self, records, objects):
+        """备份记录引用的对象及其增量链上的所有基准对象"""
+        live = set()
+        for record in records:
+            digest = record['hash']
+            while digest and digest not in live:
+                live.add(digest)
+                digest = objects.get(digest, {}).get('base')
+        return live
+
+    def _stored_bytes(self, records, objects):
+        return sum(objects[digest]['stored'] for digest in self._live_objects(records, objects)
+                   if digest in objects)
+
+    def _rebase(self, records, objects):
+        """把基准不再被records引用的增量改为快照，使被删除备份的增量链可以释放
+
+        不修改objects，返回 (新的对象表, 需要写入的 哈希 -> 快照数据)
+        """
+        kept = {r['hash'] for r in records}
+        trial = {digest: dict(entry) for digest, entry in objects.items()}
+        payloads = {}
+        for digest in kept:
+            entry = trial.get(digest)
+            if entry and entry.get('base') and entry['base'] not in kept:
+                try:
+                    payloads[digest] = zlib.compress(MAGIC + b"F\n" + self._read_object(digest), 9)
+                except (OSError, ValueError, zlib.error) as e:
+                    logging.warning(f"无法把备份改存为快照: {digest} {str(e)}")
+                    continue
+                entry.update(base=None, depth=0, stored=len(payloads[digest]))
+        if payloads:
+            # 链变短后重新计算各对象到快照的增量个数
+            for digest, entry in trial.items():
+                depth = 0
+                base = entry.get('base')
+                while base in trial and depth <= len(trial):
+                    depth += 1
+                    base = trial[base].get('base')
+                entry['depth'] = depth
+        return trial, payloads
+
+    # ---------- 对外接口 ----------
+
+    def save(self, content, prefix="hosts.backup_"):
+        """保存一份备份，返回清单记录；与同类型最近一次备份内容相同时直接返回该记录"""
+        data = content.encode('utf-8') if isinstance(content, str) else content
+        digest = content_hash(data)
+        reason = REASONS.get(prefix, 'other')
+
+        with self.lock:
+            records, objects = self._load()
+            latest = next((r for r in reversed(records) if r['reason'] == reason), None)
+            if latest and latest['hash'] == digest:
+                logging.info(f"内容与上次备份相同，无需重复备份: {latest['name']}")
+                return latest
+
+            # 以时间上最近的一次备份为增量基准
+            previous = max(records, key=lambda r: r['time'], default=None)
+            entry = self._write_object(digest, data, objects, previous['hash'] if previous else None)
+
+            now = time.time()
+            name = f"{prefix}{datetime.fromtimestamp(now).strftime('%Y%m%d_%H%M%S')}"
+            existing = {r['name'] for r in records}
+            suffix = 2
+            unique_name = name
+            while unique_name in existing:
+                unique_name = f"{name}_{suffix}"
+                suffix += 1
+
+            record = {
+                'name': unique_name,
+                'time': now,
+                'reason': reason,
+                'hash': digest,
+                'size': len(data),
+                'entries': count_entries(data),
+                'stored': entry['stored'],
+            }
+            records.append(record)
+            records = self._apply_retention(records, objects)
+            self._collect_garbage(records, objects)
+            self._save(records, objects)
+
+        logging.info(f"成功创建备份: {unique_name}")
+        return record
+
+    def list(self):
+        """返回所有备份记录（最新的在前），原始备份固定在最后"""
+        records = sorted(self._load()[0], key=lambda r: r['time'], reverse=True)
+        if os.path.exists(self.original_path):
+            stat = os.stat(self.original_path)
+            records.append({'name': ORIGINAL_NAME, 'time': stat.st_mtime, 'reason': 'original',
+                            'hash': None, 'size': stat.st_size, 'entries': None, 'stored': stat.st_size})
+        return records
+
+    def query(self, reasons=None, since=None, until=None, offset=0, limit=None):
+        """按类型和时间范围筛选备份，返回 (当前页记录, 符合条件的总数)
+
+        reasons为类型列表（None表示全部），since/until为时间戳（包含边界），
+        只使用清单中的索引信息，不读取备份内容。
+        """
+        records = [r for r in self.list()
+                   if (reasons is None or r['reason'] in reasons)
+                   and (since is None or r['time'] >= since)
+                   and (until is None or r['time'] <= until)]
+        end = None if limit is None else offset + limit
+        return records[offset:end], len(records)
+
+    def get(self, name):
+        return next((r for r in self.list() if r['name'] == name), None)
+
+    def read_bytes(self, name):
+        """读取备份的原始字节"""
+        if name == ORIGINAL_NAME:
+            with open(self.original_path, 'rb') as f:
+                return f.read()
+        record = next((r for r in self._load()[0] if r['name'] == name), None)
+        if record is None:
+            raise FileNotFoundError(f"备份不存在: {name}")
+        return self._read_object(record['hash'])
+
+    def read(self, name):
+        """读取备份内容（文本）"""
+        return self.read_bytes(name).decode('utf-8', errors='replace')
+
+    def delete(self, name):
+        """删除一条备份记录（原始备份不能删除）"""
+        if name == ORIGINAL_NAME:
+            raise ValueError("不能删除原始备份")
+        with self.lock:
+            records, objects = self._load()
+            records = [r for r in records if r['name'] != name]
+            self._collect_garbage(records, objects)
+            self._save(records, objects)
+
+    def verify(self):
+        """还原并校验所有备份，返回 [(备份名, 错误信息)]，全部正常时为空列表"""
+        problems = []
+        for record in self._load()[0]:
+            try:
+                self._read_object(record['hash'])
+            except Exception as e:
+                problems.append((record['name'], str(e) or type(e).__name__))
+        return problems
+
+    def total_size(self):
+        """备份实际占用的字节数（去重和增量压缩后）"""
+        records, objects = self._load()
+        return self._stored_bytes(records, objects)
+
+    # ---------- 保留策略 ----------
+
+    def _apply_retention(self, records, objects):
+        """按数量、时间和总大小清理旧备份，至少保留最新的一个"""
+        records = sorted(records, key=lambda r: r['time'])
+        keep = self.retention.get('keep')
+        if keep:
+            records = records[-keep:]
+
+        max_age_days = self.retention.get('max_age_days')
+        if max_age_days:
+            cutoff = time.time() - max_age_days * 86400
+            records = [r for r in records if r['time'] >= cutoff] or records[-1:]
+
+        max_bytes = self.retention.get('max_bytes')
+        if max_bytes:
+            # 删除的备份仍是后面增量的基准时不会减少占用，因此把新的最旧备份改存为快照，
+            # 并且只在确实减少占用时才删除
+            current = self._stored_bytes(records, objects)
+            while len(records) > 1 and current > max_bytes:
+                for drop in range(1, len(records)):
+                    trial, payloads = self._rebase(records[drop:], objects)
+                    remaining = self._stored_bytes(records[drop:], trial)
+                    if remaining < current:
+                        break
+                else:
+                    break
+                for digest, payload in payloads.items():
+                    self._store_payload(digest, payload)
+                objects.clear()
+                objects.update(trial)
+                records = records[drop:]
+                for record in records:
+                    if record['hash'] in payloads:
+                        record['stored'] = objects[record['hash']]['stored']
+                current = remaining
+        return records
+
+    def _collect_garbage(self, records, objects):
+        """删除不再被引用的内容对象（仍被增量引用的基准对象会保留）"""
+        live = self._live_objects(records, objects)
+        for digest in [digest for digest in objects if digest not in live]:
+            del objects[digest]
+        for dirpath, _, filenames in os.walk(self.objects_dir):
+            for filename in filenames:
+                if filename not in live:
+                    try:
+                        os.remove(os.path.join(dirpath, filename))
+                    except OSError:
+                        pass
+
+    # ---------- 旧格式迁移 ----------
+
+    def import_legacy_files(self):
+        """把旧版本按时间戳命名的备份文件导入仓库，导入成功后删除原文件"""
+        try:
+            names = [name for name in os.listdir(self.root)
+                     if name.startswith(tuple(REASONS)) and os.path.isfile(os.path.join(self.root, name))]
+        except OSError:
+            return
+        if not names:
+            return
+
+        # 按时间顺序导入，使增量链与时间顺序一致
+        names.sort(key=lambda name: os.path.getmtime(os.path.join(self.root, name)))
+        with self.lock:
+            records, objects = self._load()
+            existing = {r['name'] for r in records}
+            for name in names:
+                path = os.path.join(self.root, name)
+                try:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                    digest = content_hash(data)
+                    previous = max(records, key=lambda r: r['time'], default=None)
+                    entry = self._write_object(digest, data, objects, previous['hash'] if previous else None)
+                    if name not in existing:
+                        records.append({'name': name, 'time': os.path.getmtime(path), 'reason': reason_of(name),
+                                        'hash': digest, 'size': len(data), 'entries': count_entries(data),
+                                        'stored': entry['stored']})
+                    os.remove(path)
+                except OSError as e:
+                    logging.warning(f"导入旧备份失败: {name} {str(e)}")
+            records = self._apply_retention(records, objects)
+            self._collect_garbage(records, objects)
+            self._save(records, objects)
+        logging.info(f"已导入 {len(names)} 个旧格式备份")
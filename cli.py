@@ -0,0 +1,687 @@
+# cli.py
+"""命令行模式，不依赖tkinter，适用于服务器、容器和定时任务
+
+用法示例:
+    python cli.py fetch --profile github
+    python cli.py probe --json diagnosis.json
+    python cli.py apply --profile github,steam --flush-dns
+    python cli.py status
+    python cli.py restore --original
+    python cli.py restore --latest --section github
+    python cli.py diff hosts.backup_20250101_120000 current
+    python cli.py diagnose
+    python cli.py daemon --interval 3600
+    python cli.py cache-node --port 9466
+    python cli.py download https://github.com/OWNER/REPO/releases/download/v1.0/app.exe -c 8
+    python cli.py make-patch dist/old/GithubFaster.exe dist/GithubFaster.exe --from 2.0.0 --to 2.0.1
+    python cli.py --trace trace.json apply --profile github
+
+退出码:
+    0 成功  1 其他错误  2 参数错误  3 网络错误  4 内容校验失败
+    5 权限不足  6 检测到异常（诊断失败/未应用配置）
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import urllib.parse
+
+import backup_store
+import history_log
+import hosts_core
+import hosts_diff
+import metrics
+import tracing
+from locking import LockError
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2
+EXIT_NETWORK = 3
+EXIT_INVALID = 4
+EXIT_PERMISSION = 5
+EXIT_DEGRADED = 6
+
+PROFILES = ('github', 'steam')
+
+# 最近一次获取的来源、耗时和字节数，写入历史记录时使用
+last_fetch = {}
+
+
+class CliError(Exception):
+    """带退出码的命令行错误"""
+
+    def __init__(self, message, exit_code=EXIT_ERROR):
+        super().__init__(message)
+        self.exit_code = exit_code
+
+
+def setup_logging(verbose=False):
+    """日志写入github520.log，终端只显示警告以上（-v时显示全部）"""
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setLevel(logging.INFO if verbose else logging.WARNING)
+    stream_handler.setFormatter(formatter)
+    root.addHandler(stream_handler)
+
+    try:
+        os.makedirs(hosts_core.DATA_DIR, exist_ok=True)
+        file_handler = logging.FileHandler(os.path.join(hosts_core.DATA_DIR, 'github520.log'),
+                                           encoding='utf-8')
+        file_handler.setFormatter(formatter)
+        root.addHandler(file_handler)
+    except OSError:
+        pass
+
+
+def parse_profiles(value):
+    """解析 --profile github,steam"""
+    profiles = [p.strip().lower() for p in value.split(',') if p.strip()]
+    unknown = [p for p in profiles if p not in PROFILES]
+    if unknown or not profiles:
+        raise argparse.ArgumentTypeError(f"未知的配置: {','.join(unknown) or value}（可选: {','.join(PROFILES)}）")
+    return profiles
+
+
+def record_event(event_type, detail=''):
+    """写入时序数据库的事件记录，失败只记录日志"""
+    try:
+        from timeseries import TimeSeriesStore
+        store = TimeSeriesStore(hosts_core.PROBE_DB)
+        try:
+            store.record_event(event_type, detail)
+        finally:
+            store.close()
+    except Exception as e:
+        logging.warning(f"写入时序数据失败: {str(e)}")
+
+
+def fetch_profiles(profiles, source, steam_source, use_lan=True):
+    """按配置获取hosts内容，返回 {'github': 内容, 'steam': 内容}；配置了局域网缓存节点时优先使用"""
+    lan_urls = hosts_core.lan_sources() if use_lan else ()
+    payloads = {}
+    try:
+        if 'github' in profiles:
+            started = time.perf_counter()
+            payloads['github'] = hosts_core.fetch_github_hosts(source, lan_urls)
+            last_fetch['github'] = {'source': source, 'duration': round(time.perf_counter() - started, 3),
+                                    'bytes': len(payloads['github'].encode('utf-8'))}
+        if 'steam' in profiles:
+            started = time.perf_counter()
+            payloads['steam'], _ = hosts_core.fetch_steam_hosts(steam_source, lan_urls)
+            last_fetch['steam'] = {'source': steam_source, 'duration': round(time.perf_counter() - started, 3),
+                                   'bytes': len(payloads['steam'].encode('utf-8'))}
+    except Exception as e:
+        raise CliError(f"获取hosts失败: {str(e)}", EXIT_NETWORK)
+    return payloads
+
+
+def cmd_fetch(args):
+    """获取并校验hosts内容，不修改系统"""
+    payloads = fetch_profiles(args.profile, args.source, args.steam_source)
+
+    exit_code = EXIT_OK
+    for profile, content in payloads.items():
+        valid = hosts_core.validate_hosts_content(content) if profile == 'github' else \
+            hosts_core.count_entries(content) > 0
+        if not valid:
+            exit_code = EXIT_INVALID
+        print(f"{profile}: {hosts_core.count_entries(content)}条 {'校验通过' if valid else '内容不完整'}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write("\n\n".join(payloads.values()))
+        print(f"已保存到: {args.output}")
+    return exit_code
+
+
+def cmd_apply(args):
+    """获取hosts并写入系统hosts文件（写入前自动备份）"""
+    payloads = fetch_profiles(args.profile, args.source, args.steam_source)
+
+    if 'github' in payloads and not hosts_core.validate_hosts_content(payloads['github']) and not args.force:
+        raise CliError("获取的hosts内容不完整，已取消（使用 --force 强制应用）", EXIT_INVALID)
+
+    hosts_path = hosts_core.get_hosts_path()
+    current_content = hosts_core.read_hosts_file(hosts_path)
+
+    new_content = hosts_core.build_hosts_content(current_content, payloads)
+
+    if hosts_core.same_entries(new_content, current_content):
+        print("hosts内容无变化，无需写入")
+        return EXIT_OK
+
+    if args.dry_run:
+        print(f"将写入 {hosts_core.count_entries(new_content)} 条记录到 {hosts_path}（--dry-run 未写入）")
+        return EXIT_OK
+
+    backup_path, changed = write_payloads(payloads, hosts_path)
+    if not changed:
+        print("hosts内容无变化，无需写入")
+        return EXIT_OK
+
+    print(f"hosts已更新: {hosts_path}")
+    if backup_path:
+        print(f"原文件已备份为: {backup_path}")
+
+    if args.flush_dns and not hosts_core.flush_dns():
+        print("DNS缓存刷新失败", file=sys.stderr)
+    return EXIT_OK
+
+
+def write_payloads(payloads, hosts_path=None):
+    """把获取的内容合并到hosts文件（读取、备份、写入在同一次加锁中完成），记录历史、指标和事件
+
+    返回 (备份名, 是否写入)；加锁后发现条目已经一致（如其他实例刚刚写入）时不备份也不写入
+    """
+    def transform(current_content):
+        new_content = hosts_core.build_hosts_content(current_content, payloads)
+        if hosts_core.same_entries(new_content, current_content):
+            return current_content
+        return new_content
+
+    try:
+        hosts_core.backup_original_hosts(hosts_path=hosts_path)
+        backup_path, _, changed = hosts_core.update_hosts_file(
+            transform, backup_prefix="hosts.backup_" if 'github' in payloads else "hosts.steam_backup_",
+            hosts_path=hosts_path)
+    except PermissionError:
+        raise CliError("需要管理员权限来修改hosts文件，请使用管理员/root权限运行", EXIT_PERMISSION)
+    except LockError as e:
+        raise CliError(f"其他实例正在写入hosts文件: {str(e)}")
+    if not changed:
+        return None, False
+
+    history = history_log.open_history()
+    if 'github' in payloads:
+        count = hosts_core.count_entries(payloads['github'])
+        history.append('update', entries=count, backup=backup_path, **last_fetch.get('github', {}))
+        metrics.record_hosts_apply('update', count)
+        record_event('update', f"{count}条")
+    if 'steam' in payloads:
+        count = hosts_core.count_entries(payloads['steam'])
+        history.append('steam_update', entries=count, backup=backup_path, **last_fetch.get('steam', {}))
+        metrics.record_hosts_apply('steam_update', count)
+        record_event('steam_update', f"{count}条")
+    return backup_path, True
+
+
+def cmd_probe(args):
+    """分阶段测量各域名的连接耗时"""
+    import netprobe
+
+    hosts_content = hosts_core.read_hosts_file()
+    domains = args.domains or hosts_core.managed_domains(hosts_content) or list(netprobe.DEFAULT_DOMAINS)
+    results = netprobe.diagnose_domains(domains, hosts_core.hosts_mapping(hosts_content),
+                                        args.dns, timeout=args.timeout)
+
+    if not args.no_record:
+        try:
+            from timeseries import TimeSeriesStore
+            store = TimeSeriesStore(hosts_core.PROBE_DB)
+            try:
+                store.record_phase_results(results)
+            finally:
+                store.close()
+        except Exception as e:
+            logging.warning(f"写入时序数据失败: {str(e)}")
+
+    if args.json:
+        netprobe.export_results(results, args.json)
+
+    def cell(result, phase):
+        value = result.get(phase)
+        return "-" if value is None else f"{value:.0f}"
+
+    print(f"{'域名':<36}{'来源':<7}{'IP':<17}{'解析':>7}{'TCP':>7}{'TLS':>7}{'首字节':>7}  结果")
+    for result in results:
+        outcome = result['level'] if not result['error'] else f"{result['failed_phase']}失败: {result['error']}"
+        print(f"{result['domain']:<38}{result['source']:<8}{result['ip'] or '-':<17}"
+              f"{cell(result, 'resolve_ms'):>8}{cell(result, 'tcp_ms'):>8}{cell(result, 'tls_ms'):>8}"
+              f"{cell(result, 'ttfb_ms'):>8}  {outcome}")
+
+    return EXIT_DEGRADED if any(r['level'] == 'red' for r in results) else EXIT_OK
+
+
+def cmd_diagnose(args):
+    """ping连通性诊断（与GUI的网络诊断一致）"""
+    import netprobe
+
+    all_reachable = True
+    for target in netprobe.DIAGNOSIS_TARGETS:
+        reachable = netprobe.ping(target)
+        all_reachable = all_reachable and reachable
+        print(f"{target}: {'可访问' if reachable else '不可访问'}")
+    return EXIT_OK if all_reachable else EXIT_DEGRADED
+
+
+def cmd_status(args):
+    """显示hosts文件状态、最近更新和备份数量"""
+    hosts_path = hosts_core.get_hosts_path()
+    try:
+        content = hosts_core.read_hosts_file(hosts_path)
+    except PermissionError:
+        raise CliError("无权限读取hosts文件", EXIT_PERMISSION)
+
+    history = history_log.open_history()
+    last_github_update = history.last('update')
+    last_steam_update = history.last('steam_update')
+    store = hosts_core.backup_store()
+    backups = store.list()
+
+    status = {
+        'hosts_path': hosts_path,
+        'hosts_exists': os.path.exists(hosts_path),
+        'github': 'github.com' in content and 'raw.githubusercontent.com' in content,
+        'steam': 'steamcommunity.com' in content and 'store.steampowered.com' in content,
+        'last_github_update': last_github_update['time'] if last_github_update else None,
+        'last_steam_update': last_steam_update['time'] if last_steam_update else None,
+        'backups': len(backups),
+        'admin': hosts_core.is_admin(),
+    }
+    if args.verify:
+        status['backup_errors'] = [{'name': name, 'error': error} for name, error in store.verify()]
+
+    if args.json:
+        print(json.dumps(status, ensure_ascii=False, indent=2))
+    else:
+        print(f"hosts文件: {hosts_path}{'' if status['hosts_exists'] else ' (不存在)'}")
+        print(f"GitHub加速配置: {'已包含' if status['github'] else '未包含'}"
+              f"  上次更新: {status['last_github_update'] or '从未更新'}")
+        print(f"Steam加速配置: {'已包含' if status['steam'] else '未包含'}"
+              f"  上次更新: {status['last_steam_update'] or '从未更新'}")
+        print(f"备份数量: {status['backups']}  管理员权限: {'是' if status['admin'] else '否'}")
+        if args.verify:
+            for problem in status['backup_errors']:
+                print(f"备份损坏: {problem['name']} ({problem['error']})")
+            if not status['backup_errors']:
+                print("所有备份校验通过")
+
+    applied = all(status[profile] for profile in args.profile)
+    if args.verify and status['backup_errors']:
+        applied = False
+    return EXIT_OK if applied else EXIT_DEGRADED
+
+
+def cmd_restore(args):
+    """从原始备份或指定备份恢复hosts文件"""
+    store = hosts_core.backup_store()
+    if args.backup:
+        backup_name = args.backup
+    elif args.latest:
+        candidates = [r for r in store.list() if r['reason'] != 'original']
+        if not candidates:
+            raise CliError("没有可用的备份")
+        backup_name = candidates[0]['name']
+    else:
+        backup_name = backup_store.ORIGINAL_NAME
+
+    if not store.get(backup_name):
+        raise CliError(f"备份不存在: {backup_name}")
+
+    backup_content = store.read(backup_name)
+    if args.section or args.hosts:
+        return restore_section(backup_name, backup_content, args.section or 'hosts', args.hosts or ())
+
+    try:
+        current_backup, _, changed = hosts_core.update_hosts_file(
+            lambda current: backup_content, backup_prefix="hosts.before_restore_")
+    except PermissionError:
+        raise CliError("需要管理员权限来恢复hosts文件", EXIT_PERMISSION)
+    except LockError as e:
+        raise CliError(f"其他实例正在写入hosts文件: {str(e)}")
+    if not changed:
+        print(f"当前hosts与备份一致，无需恢复: {backup_name}")
+        return EXIT_OK
+
+    if backup_name == backup_store.ORIGINAL_NAME:
+        history_log.open_history().append('restore_original', backup=current_backup)
+        record_event('restore_original')
+    else:
+        history_log.open_history().append('restore', restored=backup_name, backup=current_backup)
+        record_event('restore', backup_name)
+
+    print(f"已从备份恢复: {backup_name}")
+    if current_backup:
+        print(f"当前状态已备份为: {current_backup}")
+    return EXIT_OK
+
+
+def restore_section(backup_name, backup_content, section, hostnames):
+    """只把备份中的一个区域合并到当前hosts（一次加锁写入）"""
+    try:
+        current_backup, new_content, changed = hosts_core.update_hosts_file(
+            lambda current: hosts_core.restore_section(current, backup_content, section, hostnames),
+            backup_prefix="hosts.before_restore_")
+    except PermissionError:
+        raise CliError("需要管理员权限来恢复hosts文件", EXIT_PERMISSION)
+    except LockError as e:
+        raise CliError(f"其他实例正在写入hosts文件: {str(e)}")
+
+    label = ','.join(hostnames) if section == 'hosts' else section
+    if not changed:
+        print(f"{label} 与备份一致，无需恢复")
+        return EXIT_OK
+
+    history_log.open_history().append('restore_section', restored=backup_name, backup=current_backup,
+                                      note=label)
+    record_event('restore_section', f"{backup_name} {label}")
+    print(f"已从备份恢复 {label}: {backup_name}")
+    if current_backup:
+        print(f"当前状态已备份为: {current_backup}")
+    return EXIT_OK
+
+
+def parse_hostnames(value):
+    """解析 --hosts a.com,b.com"""
+    hostnames = [name.strip().lower() for name in value.split(',') if name.strip()]
+    if not hostnames:
+        raise argparse.ArgumentTypeError("请指定至少一个域名")
+    return hostnames
+
+
+def read_diff_target(store, name):
+    """读取比较对象：current表示当前hosts文件，其次是备份名，最后是文件路径"""
+    try:
+        if name == 'current':
+            return hosts_core.read_hosts_file()
+        if store.get(name):
+            return store.read(name)
+        if os.path.isfile(name):
+            return hosts_core.read_hosts_file(name)
+    except PermissionError:
+        raise CliError(f"无权限读取: {name}", EXIT_PERMISSION)
+    raise CliError(f"找不到备份或文件: {name}", EXIT_USAGE)
+
+
+def cmd_diff(args):
+    """按条目比较两个备份（或备份与当前hosts）；--all 依次比较每两个相邻的备份"""
+    store = hosts_core.backup_store()
+    if args.all:
+        names = [r['name'] for r in reversed(store.list()) if r['reason'] != 'original']
+        pairs = list(zip(names, names[1:]))[::-1]
+    elif args.old:
+        pairs = [(args.old, args.new)]
+    else:
+        raise CliError("请指定要比较的备份，或使用 --all", EXIT_USAGE)
+
+    results = []
+    contents = {}
+    for old_name, new_name in pairs:
+        for name in (old_name, new_name):
+            if name not in contents:
+                contents[name] = read_diff_target(store, name)
+        results.append((old_name, new_name, hosts_diff.diff_hosts(contents[old_name], contents[new_name])))
+        # 相邻比较时旧版本不会再用到
+        if args.all:
+            contents.pop(old_name, None)
+
+    if args.json:
+        print(json.dumps([dict(hosts_diff.diff_json(diff), old=old_name, new=new_name)
+                          for old_name, new_name, diff in results], ensure_ascii=False, indent=2))
+    elif args.all:
+        for old_name, new_name, diff in results:
+            print(f"{old_name} → {new_name}: {hosts_diff.summary(diff)}")
+    else:
+        old_name, new_name, diff = results[0]
+        print(hosts_diff.format_diff(diff, old_name, new_name))
+    return EXIT_OK
+
+
+def cmd_daemon(args):
+    """后台服务模式，按间隔自动刷新hosts"""
+    import daemon
+
+    settings = daemon.load_settings()
+    for key in ('interval', 'jitter', 'port', 'profile', 'source', 'steam_source'):
+        if getattr(args, key) is not None:
+            settings[key] = getattr(args, key)
+    if args.no_probe:
+        settings['probe'] = False
+    if isinstance(settings['profile'], str):
+        try:
+            settings['profile'] = parse_profiles(settings['profile'])
+        except argparse.ArgumentTypeError as e:
+            raise CliError(str(e), EXIT_USAGE)
+
+    try:
+        result = daemon.run_daemon(settings, fetch_profiles, write_payloads, once=args.once)
+    except LockError as e:
+        raise CliError(f"后台服务已在运行: {str(e)}")
+    if args.once and result not in ('updated', 'unchanged'):
+        return EXIT_NETWORK if result in ('offline', 'error') else EXIT_DEGRADED
+    return EXIT_OK
+
+
+def cmd_cache_node(args):
+    """局域网缓存节点，为其他机器提供hosts内容"""
+    import signal
+    import threading
+    from lan_cache import CacheNode
+
+    # 节点自己必须访问上游，不能再使用局域网缓存
+    node = CacheNode(lambda profiles, source, steam_source: fetch_profiles(profiles, source, steam_source,
+                                                                           use_lan=False),
+                     args.profile, args.source, args.steam_source,
+                     interval=args.interval, probe=args.probe)
+    try:
+        node.start(args.bind, args.port)
+    except OSError as e:
+        raise CliError(f"无法监听 {args.bind}:{args.port}: {str(e)}")
+
+    print(f"局域网缓存节点已启动: http://{args.bind}:{node.address[1]}/hosts  /steam  /status")
+    stopped = threading.Event()
+    signal.signal(signal.SIGINT, lambda *a: stopped.set())
+    signal.signal(signal.SIGTERM, lambda *a: stopped.set())
+    stopped.wait()
+    node.stop()
+    return EXIT_OK
+
+
+def cmd_download(args):
+    """多连接分段下载文件，中断后再次运行同一命令继续下载"""
+    import downloader
+
+    url = args.url
+    output = args.output or os.path.basename(urllib.parse.urlparse(url).path) or "download"
+    last_report = [0.0]
+
+    def report(downloaded, total):
+        now = time.monotonic()
+        if now - last_report[0] < 0.5 and downloaded != total:
+            return
+        last_report[0] = now
+        if total:
+            print(f"\r{downloaded * 100 // total:3d}%  {downloaded}/{total}字节", end='', file=sys.stderr)
+        else:
+            print(f"\r{downloaded}字节", end='', file=sys.stderr)
+
+    started = time.perf_counter()
+    try:
+        downloader.download_segmented(url, output, size=args.size, sha256=args.sha256,
+                                      connections=args.connections,
+                                      ips=args.ip if args.ip else ([] if args.system_dns else None),
+                                      progress=report)
+    except downloader.ChecksumError as e:
+        raise CliError(str(e), EXIT_INVALID)
+    except downloader.DownloadError as e:
+        raise CliError(str(e), EXIT_NETWORK)
+    finally:
+        print(file=sys.stderr)
+
+    seconds = time.perf_counter() - started
+    size = os.path.getsize(output)
+    print(f"已保存到: {output} ({size}字节, {seconds:.1f}秒, {size / 1024 / max(seconds, 0.001):.0f}KB/s)")
+    return EXIT_OK
+
+
+def cmd_make_patch(args):
+    """为发布生成增量更新补丁"""
+    import delta_update
+
+    with open(args.old, 'rb') as f:
+        old = f.read()
+    with open(args.new, 'rb') as f:
+        new = f.read()
+    output = args.output or delta_update.patch_asset_name(os.path.basename(args.new), args.from_version,
+                                                          args.to_version)
+    started = time.perf_counter()
+    patch = delta_update.make_patch(old, new)
+    with open(output, 'wb') as f:
+        f.write(patch)
+    print(f"已生成补丁: {output} ({len(patch)}字节，完整文件{len(new)}字节，"
+          f"{time.perf_counter() - started:.1f}秒)")
+    return EXIT_OK
+
+
+def cmd_apply_patch(args):
+    """用补丁从旧文件生成新文件（校验旧文件和生成的文件）"""
+    import delta_update
+
+    try:
+        delta_update.apply_patch(args.old, args.patch, args.output, args.sha256)
+    except delta_update.PatchError as e:
+        raise CliError(str(e), EXIT_INVALID)
+    print(f"已生成: {args.output}")
+    return EXIT_OK
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="GithubFaster", description="GitHub加速助手 命令行模式")
+    parser.add_argument('-v', '--verbose', action='store_true', help="显示详细日志")
+    parser.add_argument('--trace', metavar='FILE',
+                        help="记录各步骤耗时，退出时写入FILE（.json为Chrome追踪格式，其他为JSON Lines）")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_source_options(sub, default_profile):
+        sub.add_argument('--profile', type=parse_profiles, default=parse_profiles(default_profile),
+                         help="要处理的配置，逗号分隔: github,steam")
+        sub.add_argument('--source', choices=list(hosts_core.HOSTS_SOURCES), default="GitHub520",
+                         help="GitHub hosts源")
+        sub.add_argument('--steam-source', choices=list(hosts_core.STEAM_HOSTS_SOURCES),
+                         default="GitMirror国内镜像", help="Steam hosts源")
+
+    sub = subparsers.add_parser('fetch', help="获取并校验hosts，不修改系统")
+    add_source_options(sub, 'github')
+    sub.add_argument('-o', '--output', help="保存获取的内容到文件")
+    sub.set_defaults(func=cmd_fetch)
+
+    sub = subparsers.add_parser('probe', help="分阶段测量连接耗时（解析/TCP/TLS/首字节）")
+    sub.add_argument('domains', nargs='*', help="要测量的域名，默认为hosts中的加速域名")
+    sub.add_argument('--dns', default="223.5.5.5", help="用于对比的DNS服务器")
+    sub.add_argument('--timeout', type=float, default=5, help="每个阶段的超时时间(秒)")
+    sub.add_argument('--json', help="导出结果为JSON文件")
+    sub.add_argument('--no-record', action='store_true', help="不写入趋势记录")
+    sub.set_defaults(func=cmd_probe)
+
+    sub = subparsers.add_parser('apply', help="获取hosts并写入系统（自动备份）")
+    add_source_options(sub, 'github')
+    sub.add_argument('--dry-run', action='store_true', help="只显示将要执行的操作")
+    sub.add_argument('--force', action='store_true', help="内容校验失败时仍然应用")
+    sub.add_argument('--flush-dns', action='store_true', help="写入后刷新DNS缓存")
+    sub.set_defaults(func=cmd_apply)
+
+    sub = subparsers.add_parser('status', help="显示当前hosts状态")
+    sub.add_argument('--profile', type=parse_profiles, default=parse_profiles('github'),
+                     help="检查哪些配置已应用，未应用时退出码为6")
+    sub.add_argument('--json', action='store_true', help="以JSON格式输出")
+    sub.add_argument('--verify', action='store_true', help="还原并校验所有备份，有损坏时退出码为6")
+    sub.set_defaults(func=cmd_status)
+
+    sub = subparsers.add_parser('restore', help="从备份恢复hosts")
+    group = sub.add_mutually_exclusive_group()
+    group.add_argument('--original', action='store_true', help="恢复原始备份（默认）")
+    group.add_argument('--latest', action='store_true', help="恢复最近的一个备份")
+    group.add_argument('--backup', help="恢复指定的备份（备份名，如 hosts.backup_20250101_120000）")
+    section_group = sub.add_mutually_exclusive_group()
+    section_group.add_argument('--section', choices=list(hosts_core.SECTIONS),
+                               help="只恢复备份中的GitHub或Steam区域，其他内容保持不变")
+    section_group.add_argument('--hosts', type=parse_hostnames, help="只恢复指定的域名，逗号分隔")
+    sub.set_defaults(func=cmd_restore)
+
+    sub = subparsers.add_parser('diff', help="按条目比较备份与当前hosts（或两个备份）")
+    sub.add_argument('old', nargs='?', help="备份名或文件路径")
+    sub.add_argument('new', nargs='?', default='current', help="备份名或文件路径，默认为当前hosts(current)")
+    sub.add_argument('--all', action='store_true', help="依次比较每两个相邻的备份，只显示统计")
+    sub.add_argument('--json', action='store_true', help="以JSON格式输出")
+    sub.set_defaults(func=cmd_diff)
+
+    sub = subparsers.add_parser('daemon', help="后台服务模式，定时自动刷新hosts")
+    sub.add_argument('--profile', type=parse_profiles, help="要处理的配置，逗号分隔: github,steam")
+    sub.add_argument('--source', choices=list(hosts_core.HOSTS_SOURCES), help="GitHub hosts源")
+    sub.add_argument('--steam-source', choices=list(hosts_core.STEAM_HOSTS_SOURCES), help="Steam hosts源")
+    sub.add_argument('--interval', type=float, help="刷新间隔(秒)，默认3600")
+    sub.add_argument('--jitter', type=float, help="随机抖动比例，默认0.1")
+    sub.add_argument('--port', type=int, help="状态端点端口，默认9465，0表示不启动")
+    sub.add_argument('--no-probe', action='store_true', help="应用前不测试新IP的连通性")
+    sub.add_argument('--once', action='store_true', help="只运行一次后退出")
+    sub.set_defaults(func=cmd_daemon)
+
+    sub = subparsers.add_parser('cache-node', help="局域网缓存节点，为其他机器提供hosts内容")
+    add_source_options(sub, 'github,steam')
+    sub.add_argument('--bind', default='0.0.0.0', help="监听地址")
+    sub.add_argument('--port', type=int, default=9466, help="监听端口")
+    sub.add_argument('--interval', type=float, default=1800, help="从上游刷新的间隔(秒)")
+    sub.add_argument('--probe', action='store_true', help="只缓存IP可以连接的内容")
+    sub.set_defaults(func=cmd_cache_node)
+
+    sub = subparsers.add_parser('download', help="多连接分段下载文件（如GitHub Release中的文件），支持断点续传")
+    sub.add_argument('url', help="下载地址")
+    sub.add_argument('-o', '--output', help="保存路径，默认为当前目录下的同名文件")
+    sub.add_argument('-c', '--connections', type=int, default=4, help="同时使用的连接数，默认4")
+    sub.add_argument('--sha256', help="下载完成后校验的SHA-256")
+    sub.add_argument('--size', type=int, help="文件大小(字节)，与服务器不符时不下载")
+    ip_group = sub.add_mutually_exclusive_group()
+    ip_group.add_argument('--ip', action='append', help="连接使用的IP（可多次指定），默认自动选择连接最快的IP")
+    ip_group.add_argument('--system-dns', action='store_true', help="使用系统解析的地址，不自动选择IP")
+    sub.set_defaults(func=cmd_download)
+
+    sub = subparsers.add_parser('make-patch', help="生成打包程序的增量更新补丁（发布新版本时使用）")
+    sub.add_argument('old', help="上一个版本的程序")
+    sub.add_argument('new', help="新版本的程序")
+    sub.add_argument('--from', dest='from_version', required=True, help="上一个版本号，如 2.0.0")
+    sub.add_argument('--to', dest='to_version', required=True, help="新版本号，如 2.0.1")
+    sub.add_argument('-o', '--output', help="补丁文件名，默认为 <程序名>-<旧版本>-to-<新版本>.gfpatch")
+    sub.set_defaults(func=cmd_make_patch)
+
+    sub = subparsers.add_parser('apply-patch', help="用增量更新补丁从旧版本程序生成新版本")
+    sub.add_argument('old', help="旧版本的程序")
+    sub.add_argument('patch', help="补丁文件")
+    sub.add_argument('-o', '--output', required=True, help="生成的新版本程序")
+    sub.add_argument('--sha256', help="新版本程序公布的SHA-256")
+    sub.set_defaults(func=cmd_apply_patch)
+
+    sub = subparsers.add_parser('diagnose', help="ping连通性诊断")
+    sub.set_defaults(func=cmd_diagnose)
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    setup_logging(args.verbose)
+    if args.trace:
+        tracing.enable(args.trace)
+
+    try:
+        with tracing.span('command', command=args.command):
+            return args.func(args)
+    except CliError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return e.exit_code
+    except KeyboardInterrupt:
+        return EXIT_ERROR
+    except Exception as e:
+        logging.exception("命令执行失败")
+        print(f"错误: {str(e)}", file=sys.stderr)
+        return EXIT_ERROR
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+# config_store.py
+"""配置文件存储：位置固定（不依赖当前工作目录），短时间内的多次修改合并为一次写入，
+写入时先写临时文件再替换，程序崩溃或断电不会留下写了一半的配置
+
+配置文件位置（按顺序）:
+    1. 环境变量 GITHUB520_CONFIG 指定的路径
+    2. 程序目录下已有的 github520_config.json（便携模式，兼容旧版本）
+    3. 用户配置目录: Windows为 %APPDATA%\\GithubFaster，其他系统为 ~/.config/githubfaster
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+
+CONFIG_NAME = "github520_config.json"
+
+# 配置格式版本，格式变化时在 _migrate 中升级旧配置
+SCHEMA_VERSION = 1
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def user_config_dir():
+    """当前用户的配置目录"""
+    if os.name == 'nt':
+        base = os.environ.get('APPDATA') or os.path.expanduser('~')
+        return os.path.join(base, "GithubFaster")
+    base = os.environ.get('XDG_CONFIG_HOME') or os.path.join(os.path.expanduser('~'), ".config")
+    return os.path.join(base, "githubfaster")
+
+
+def resolve_config_path():
+    """确定配置文件路径；旧版本在其他工作目录下生成的配置会复制到用户配置目录"""
+    env_path = os.environ.get('GITHUB520_CONFIG')
+    if env_path:
+        return os.path.abspath(env_path)
+
+    portable_path = os.path.join(APP_DIR, CONFIG_NAME)
+    if os.path.exists(portable_path):
+        return portable_path
+
+    user_path = os.path.join(user_config_dir(), CONFIG_NAME)
+    legacy_path = os.path.abspath(CONFIG_NAME)
+    if not os.path.exists(user_path) and os.path.exists(legacy_path):
+        try:
+            os.makedirs(os.path.dirname(user_path), exist_ok=True)
+            shutil.copy2(legacy_path, user_path)
+            logging.info(f"已迁移配置文件: {legacy_path} -> {user_path}")
+        except OSError as e:
+            logging.warning(f"迁移配置文件失败: {str(e)}")
+            return legacy_path
+    return user_path
+
+
+CONFIG_FILE = resolve_config_path()
+
+
+def read_config(path):
+    """读取配置文件，不存在时返回空配置；内容损坏时改名保留并返回空配置"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except ValueError as e:
+        logging.error(f"配置文件已损坏，将使用默认配置: {path} {str(e)}")
+        try:
+            os.replace(path, path + ".corrupt")
+        except OSError:
+            pass
+        return {}
+    except OSError as e:
+        logging.error(f"读取配置文件失败: {path} {str(e)}")
+        return {}
+    return config if isinstance(config, dict) else {}
+
+
+def write_config(path, config):
+    """原子写入：写临时文件并刷到磁盘后替换原文件"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _migrate(config):
+    """把旧格式的配置升级到当前版本"""
+    version = config.get('schema_version', 0)
+    if version < 1:
+        # 版本0：没有版本号，历史记录保存在 update_history 中（由history_log导入后删除）
+        config['schema_version'] = 1
+    return config
+
+
+class ConfigStore:
+    """在内存中保存配置，修改后延迟delay秒写入；只写回本进程修改过的项，
+    其他程序（命令行、手动编辑）对其他项的修改不会被覆盖"""
+
+    def __init__(self, path=None, delay=1.0):
+        self.path = path or CONFIG_FILE
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.timer = None
+        self.changed = set()
+        self.data = _migrate(read_config(self.path))
+
+    def get(self, key, default=None):
+        with self.lock:
+            return self.data.get(key, default)
+
+    def update(self, values):
+        """修改多个配置项，稍后写入"""
+        with self.lock:
+            for key, value in values.items():
+                if self.data.get(key) != value:
+                    self.data[key] = value
+                    self.changed.add(key)
+            if self.changed and self.timer is None:
+                self.timer = threading.Timer(self.delay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def set(self, key, value):
+        self.update({key: value})
+
+    def remove(self, key):
+        """删除配置项，稍后写入"""
+        with self.lock:
+            if key in self.data:
+                del self.data[key]
+                self.changed.add(key)
+        self.update({})
+
+    def flush(self):
+        """立即写入未保存的修改，写入失败返回False"""
+        with self.write_lock:
+            with self.lock:
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+                if not self.changed:
+                    return True
+                changed = self.changed
+                self.changed = set()
+                values = {key: self.data[key] for key in changed if key in self.data}
+
+            config = _migrate(read_config(self.path))
+            for key in changed:
+                if key in values:
+                    config[key] = values[key]
+                else:
+                    config.pop(key, None)
+            config['schema_version'] = SCHEMA_VERSION
+            try:
+                write_config(self.path, config)
+                return True
+            except Exception as e:
+                logging.error(f"保存配置失败: {self.path} {str(e)}")
+                # 保留修改，下次写入时重试
+                with self.lock:
+                    self.changed |= changed
+                return False
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,184 @@
+# daemon.py
+"""后台服务模式：按间隔（带随机抖动）自动执行 获取 → 校验 → 探测 → 应用
+
+同一时间只允许一个服务实例运行（PID锁文件），状态通过本地HTTP端点 /status 查询。
+"""
+import collections
+import json
+import logging
+import os
+import random
+import signal
+import threading
+import time
+from datetime import datetime
+
+import config_store
+import hosts_core
+import metrics
+import netprobe
+from locking import FileLock
+
+PID_FILE = os.path.join(hosts_core.DATA_DIR, "github520_daemon.pid")
+
+# 默认配置，可在配置文件的 "daemon" 项中覆盖
+DEFAULT_SETTINGS = {
+    'interval': 3600,        # 两次刷新的间隔(秒)
+    'jitter': 0.1,           # 随机抖动比例，避免多台机器同时请求上游
+    'offline_retry': 300,    # 网络不可用时的重试间隔(秒)
+    'profile': ['github'],
+    'source': "GitHub520",
+    'steam_source': "GitMirror国内镜像",
+    'probe': True,           # 应用前测试新IP是否可以连接
+    'port': 9465,            # 状态端点端口，0表示不启动
+}
+
+def load_settings(config_file=hosts_core.CONFIG_FILE):
+    """读取配置文件中的后台服务设置"""
+    settings = dict(DEFAULT_SETTINGS)
+    daemon_config = config_store.read_config(config_file).get('daemon', {})
+    if isinstance(daemon_config, dict):
+        settings.update({key: value for key, value in daemon_config.items() if key in DEFAULT_SETTINGS})
+    return settings
+
+
+def jittered(interval, jitter):
+    """在interval上加减 jitter 比例的随机时间"""
+    return max(1.0, interval * (1 + random.uniform(-jitter, jitter)))
+
+
+class HostsDaemon:
+    """定时刷新hosts的后台服务，所有状态都是固定大小，长时间运行内存不会增长"""
+
+    def __init__(self, settings, fetch, write):
+        self.settings = settings
+        self.fetch = fetch          # fetch(profiles, source, steam_source) -> payloads
+        self.write = write          # write(payloads) -> (备份名, 是否写入)，在hosts锁内合并
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.status = {
+            'pid': os.getpid(),
+            'started': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'state': 'starting',
+            'runs': 0,
+            'writes': 0,
+            'last_run': None,
+            'last_result': None,
+            'last_write': None,
+            'next_run': None,
+        }
+        self.recent = collections.deque(maxlen=20)  # 最近的运行记录
+
+    def set_status(self, **values):
+        with self.lock:
+            self.status.update(values)
+
+    def status_json(self):
+        """供 /status 端点使用"""
+        with self.lock:
+            report = dict(self.status, settings=self.settings, recent=list(self.recent))
+        return 'application/json; charset=utf-8', json.dumps(report, ensure_ascii=False, indent=2).encode('utf-8')
+
+    def run_once(self):
+        """执行一次刷新，返回结果: offline/unchanged/updated/invalid/probe_failed/error"""
+        settings = self.settings
+        if not netprobe.network_available():
+            logging.warning("网络不可用，跳过本次刷新")
+            return 'offline'
+
+        try:
+            payloads = self.fetch(settings['profile'], settings['source'], settings['steam_source'])
+        except Exception as e:
+            logging.error(f"本次刷新失败: {str(e)}")
+            return 'error'
+
+        if 'github' in payloads and not hosts_core.validate_hosts_content(payloads['github']):
+            logging.warning("获取的hosts内容不完整，跳过本次刷新")
+            return 'invalid'
+
+        # 预先比较和探测不持有锁（探测可能需要几秒），写入时在锁内基于最新内容重新合并
+        current_content = hosts_core.read_hosts_file()
+        new_content = hosts_core.build_hosts_content(current_content, payloads)
+        if hosts_core.same_entries(new_content, current_content):
+            logging.info("hosts内容无变化，无需写入")
+            return 'unchanged'
+
+        if settings['probe']:
+            reachable, tested = netprobe.probe_mapping(hosts_core.hosts_mapping(new_content))
+            if tested and not reachable:
+                logging.warning(f"新hosts中的IP均无法连接（测试{tested}个），跳过本次写入")
+                return 'probe_failed'
+
+        try:
+            _, changed = self.write(payloads)
+        except Exception as e:
+            logging.error(f"写入hosts失败: {str(e)}")
+            return 'error'
+        if not changed:
+            logging.info("hosts内容无变化，无需写入")
+            return 'unchanged'
+        return 'updated'
+
+    def next_delay(self, result):
+        """根据本次结果计算下次运行前的等待时间"""
+        interval = float(self.settings['interval'])
+        if result in ('offline', 'error'):
+            interval = min(interval, float(self.settings['offline_retry']))
+        return jittered(interval, float(self.settings['jitter']))
+
+    def serve(self, once=False):
+        """循环运行直到stop()被调用"""
+        while not self.stop_event.is_set():
+            self.set_status(state='running')
+            started = time.time()
+            result = self.run_once()
+
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            with self.lock:
+                self.status['runs'] += 1
+                self.status['last_run'] = now
+                self.status['last_result'] = result
+                if result == 'updated':
+                    self.status['writes'] += 1
+                    self.status['last_write'] = now
+                self.recent.append({'time': now, 'result': result,
+                                    'seconds': round(time.time() - started, 1)})
+            logging.info(f"本次刷新结果: {result}")
+
+            if once:
+                return result
+
+            delay = self.next_delay(result)
+            self.set_status(state='sleeping',
+                            next_run=datetime.fromtimestamp(time.time() + delay).strftime("%Y-%m-%d %H:%M:%S"))
+            self.stop_event.wait(delay)
+
+        self.set_status(state='stopped', next_run=None)
+        return None
+
+    def stop(self, *args):
+        self.stop_event.set()
+
+
+def run_daemon(settings, fetch, write, once=False):
+    """持有PID锁运行服务，已有实例在运行时抛出LockError"""
+    pid_lock = FileLock(PID_FILE).acquire()
+    status_server = None
+    try:
+        daemon = HostsDaemon(settings, fetch, write)
+        if settings['port']:
+            try:
+                status_server = metrics.MetricsServer(
+                    port=int(settings['port']), routes={'/status': daemon.status_json}).start()
+                logging.info(f"状态端点已启动: http://127.0.0.1:{status_server.address[1]}/status")
+            except Exception as e:
+                logging.error(f"启动状态端点失败: {str(e)}")
+
+        signal.signal(signal.SIGINT, daemon.stop)
+        signal.signal(signal.SIGTERM, daemon.stop)
+        logging.info(f"后台服务已启动，间隔{settings['interval']}秒，抖动±{settings['jitter']:.0%}")
+        return daemon.serve(once=once)
+    finally:
+        if status_server:
+            status_server.stop()
+        pid_lock.release()
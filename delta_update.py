@@ -0,0 +1,226 @@
+# delta_update.py
+"""打包程序的增量更新：只下载新旧版本之间的差异，在本地由旧程序生成新程序
+
+发布新版本时为上一个版本生成补丁（python cli.py make-patch 旧.exe 新.exe），
+以 <程序名>-<旧版本>-to-<新版本>.gfpatch 的文件名附加到Release中。
+只改动了少量代码时，PyInstaller打包的程序中绝大部分内容不变，只是位置可能移动，
+补丁只记录"从旧文件某处复制多少字节"和新增的数据，通常只有几十KB。
+
+补丁格式（整体用lzma压缩）:
+    头部  MAGIC + 旧文件大小 + 旧文件SHA-256 + 新文件大小 + 新文件SHA-256
+    操作  b'C' + 旧文件偏移 + 长度     从旧文件复制
+          b'D' + 长度 + 数据           新数据
+应用补丁前校验旧文件，生成后校验新文件，任何一步不符都应改为下载完整文件。
+"""
+import hashlib
+import lzma
+import os
+import re
+import struct
+import sys
+
+MAGIC = b"GFP1"
+PATCH_SUFFIX = ".gfpatch"
+
+# 匹配块大小：旧文件按块建立索引，新文件中与某块相同的内容（任意偏移）都能找到
+BLOCK = 64
+
+# 滚动校验和的模数
+_MOD = 1 << 16
+
+_HEADER = struct.Struct('>Q32sQ32s')
+_COPY = struct.Struct('>QQ')
+_LENGTH = struct.Struct('>Q')
+
+# 应用补丁时每次复制的字节数
+_COPY_CHUNK = 1024 * 1024
+
+
+class PatchError(Exception):
+    pass
+
+
+def current_executable():
+    """正在运行的打包程序路径；从源码运行时返回None（无法增量更新）"""
+    if getattr(sys, 'frozen', False):
+        return sys.executable
+    return None
+
+
+def patch_asset_name(program_name, from_version, to_version):
+    """补丁在Release中的文件名，如 GithubFaster-2.0.0-to-2.0.1.gfpatch"""
+    stem = os.path.splitext(program_name)[0]
+    return f"{stem}-{from_version}-to-{to_version}{PATCH_SUFFIX}"
+
+
+def find_patch(release, from_version):
+    """在Release的文件中查找从from_version升级的补丁，返回与downloader.release_asset相同格式的信息"""
+    from downloader import parse_digest
+
+    pattern = re.compile(r'-v?' + re.escape(from_version.lstrip('v')) + r'-to-[^/]+'
+                         + re.escape(PATCH_SUFFIX) + '$')
+    for asset in release.get('assets') or []:
+        if pattern.search(asset.get('name', '')):
+            return {
+                'name': asset.get('name'),
+                'url': asset.get('browser_download_url'),
+                'size': asset.get('size'),
+                'sha256': parse_digest(asset.get('digest')),
+                'checksum_url': None,
+            }
+    return None
+
+
+def _weak_hash(block):
+    """块的弱校验和（rsync的滚动校验和）"""
+    a = sum(block) % _MOD
+    b = sum((len(block) - i) * byte for i, byte in enumerate(block)) % _MOD
+    return a, b
+
+
+def make_patch(old, new, block=BLOCK):
+    """生成从old到new的补丁（bytes）
+
+    旧文件每block字节一块，按弱校验和建立索引；在新文件上逐字节滚动计算校验和，
+    命中后确认内容相同，再向前后尽量延长匹配，匹配不上的部分作为新数据。
+    """
+    index = {}
+    for offset in range(0, len(old) - block + 1, block):
+        index.setdefault(_weak_hash(old[offset:offset + block]), offset)
+
+    ops = []
+    literal_start = 0
+    position = 0
+    size = len(new)
+
+    def add_literal(end):
+        if end > literal_start:
+            ops.append(b'D' + _LENGTH.pack(end - literal_start) + new[literal_start:end])
+
+    a = b = None
+    while position + block <= size:
+        if a is None:
+            a, b = _weak_hash(new[position:position + block])
+        old_offset = index.get((a, b))
+        if old_offset is not None and old[old_offset:old_offset + block] == new[position:position + block]:
+            # 向前延长（只延长到未输出的新数据为止）
+            start_new, start_old = position, old_offset
+            while start_new > literal_start and start_old > 0 and new[start_new - 1] == old[start_old - 1]:
+                start_new -= 1
+                start_old -= 1
+            # 向后延长：先按大块比较，再逐字节
+            end_new, end_old = position + block, old_offset + block
+            step = 64 * 1024
+            while step:
+                while end_new + step <= size and end_old + step <= len(old) and \
+                        new[end_new:end_new + step] == old[end_old:end_old + step]:
+                    end_new += step
+                    end_old += step
+                step //= 8
+            while end_new < size and end_old < len(old) and new[end_new] == old[end_old]:
+                end_new += 1
+                end_old += 1
+
+            add_literal(start_new)
+            ops.append(b'C' + _COPY.pack(start_old, end_new - start_new))
+            position = literal_start = end_new
+            a = None
+            continue
+
+        # 滚动一个字节
+        if position + block < size:
+            out_byte = new[position]
+            in_byte = new[position + block]
+            a = (a - out_byte + in_byte) % _MOD
+            b = (b - block * out_byte + a) % _MOD
+        position += 1
+
+    add_literal(size)
+
+    header = MAGIC + _HEADER.pack(len(old), hashlib.sha256(old).digest(),
+                                  len(new), hashlib.sha256(new).digest())
+    return lzma.compress(header + b''.join(ops))
+
+
+def read_patch_header(patch):
+    """返回 (旧大小, 旧SHA-256, 新大小, 新SHA-256, 操作数据)，摘要为十六进制"""
+    try:
+        data = lzma.decompress(patch)
+    except lzma.LZMAError as e:
+        raise PatchError(f"补丁文件无法解压: {str(e)}")
+    if not data.startswith(MAGIC) or len(data) < len(MAGIC) + _HEADER.size:
+        raise PatchError("不是有效的补丁文件")
+    old_size, old_hash, new_size, new_hash = _HEADER.unpack_from(data, len(MAGIC))
+    return old_size, old_hash.hex(), new_size, new_hash.hex(), memoryview(data)[len(MAGIC) + _HEADER.size:]
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_COPY_CHUNK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def apply_patch(old_path, patch_path, out_path, expected_sha256=None):
+    """用补丁从旧文件生成新文件，校验旧文件、补丁记录的新文件摘要和发布时公布的摘要
+
+    先写入临时文件，全部校验通过后才替换out_path；不符时抛出PatchError
+    """
+    with open(patch_path, 'rb') as f:
+        old_size, old_hash, new_size, new_hash, ops = read_patch_header(f.read())
+    if expected_sha256 and expected_sha256.lower() != new_hash:
+        raise PatchError("补丁的目标版本与发布的文件不符")
+    if os.path.getsize(old_path) != old_size or _file_sha256(old_path) != old_hash:
+        raise PatchError("当前程序与补丁对应的旧版本不符")
+
+    tmp_path = out_path + ".patching"
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        with open(old_path, 'rb') as old, open(tmp_path, 'wb') as out:
+            position = 0
+            while position < len(ops):
+                op = bytes(ops[position:position + 1])
+                position += 1
+                if op == b'C':
+                    if position + _COPY.size > len(ops):
+                        raise PatchError("补丁内容不完整")
+                    offset, length = _COPY.unpack_from(ops, position)
+                    position += _COPY.size
+                    if offset + length > old_size:
+                        raise PatchError("补丁内容无效（复制范围超出旧文件）")
+                    old.seek(offset)
+                    while length:
+                        data = old.read(min(length, _COPY_CHUNK))
+                        if not data:
+                            raise PatchError("旧文件在应用补丁时被修改")
+                        out.write(data)
+                        digest.update(data)
+                        length -= len(data)
+                        written += len(data)
+                elif op == b'D':
+                    if position + _LENGTH.size > len(ops):
+                        raise PatchError("补丁内容不完整")
+                    (length,) = _LENGTH.unpack_from(ops, position)
+                    position += _LENGTH.size
+                    data = ops[position:position + length]
+                    if len(data) != length:
+                        raise PatchError("补丁内容不完整")
+                    position += length
+                    out.write(data)
+                    digest.update(data)
+                    written += length
+                else:
+                    raise PatchError("补丁内容无效（未知操作）")
+
+        if written != new_size or digest.hexdigest() != new_hash:
+            raise PatchError("生成的文件校验失败")
+        os.replace(tmp_path, out_path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return out_path
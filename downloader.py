@@ -0,0 +1,547 @@
+# downloader.py
+"""可断点续传、校验大小和SHA-256的文件下载（用于下载程序更新）
+
+下载内容先写入 <目标文件>.part，旁边的 .part.json 记录下载地址、大小、摘要和ETag；
+连接中断后用 HTTP Range 请求从已下载的位置继续，重启程序后也能续传。
+全部下载完成并校验通过后才改名为目标文件，校验失败时删除重新下载。
+每次读取的块大小根据实测吞吐量调整：网络快时加大以减少开销，慢时减小以便及时响应取消。
+
+跨境访问时单个连接的速度受限，download_segmented 把文件分成多段，
+通过多个连接（分散到连接耗时最短的几个IP）同时下载，直接写入预先分配好大小的 .part 文件。
+"""
+import hashlib
+import http.client
+import json
+import logging
+import os
+import queue
+import re
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+import tracing
+
+# 读取块大小的范围和初始值
+MIN_CHUNK = 16 * 1024
+MAX_CHUNK = 1024 * 1024
+START_CHUNK = 64 * 1024
+
+# 每次读取的目标耗时(秒)：比目标快时加大块，慢时减小
+TARGET_READ_SECONDS = 0.25
+
+# 失败重试次数和退避时间(秒)：1, 2, 4, 8... 最多BACKOFF_MAX
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+
+# 这些HTTP状态码重试无意义
+FATAL_STATUS = (400, 401, 403, 404, 410)
+
+USER_AGENT = 'GithubFaster'
+
+# 分段下载：默认连接数、每段最小字节数；段数为连接数的SEGMENTS_PER_CONNECTION倍，快的连接会多下载几段
+DEFAULT_CONNECTIONS = 4
+MIN_SEGMENT = 1024 * 1024
+SEGMENTS_PER_CONNECTION = 4
+
+# 分段下载时保存进度和报告进度的间隔(秒)
+SAVE_INTERVAL = 1.0
+PROGRESS_INTERVAL = 0.2
+
+
+class DownloadError(Exception):
+    pass
+
+
+class DownloadCancelled(DownloadError):
+    pass
+
+
+class ChecksumError(DownloadError):
+    pass
+
+
+def parse_digest(value):
+    """解析摘要："sha256:<hex>" 或 64位十六进制，返回小写十六进制，无法识别时返回None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.lower().startswith('sha256:'):
+        value = value[7:]
+    match = re.match(r'([0-9a-fA-F]{64})\b', value)
+    return match.group(1).lower() if match else None
+
+
+def release_asset(release):
+    """从GitHub Release API返回的数据中取出第一个可下载文件的信息
+
+    返回 {'name', 'url', 'size', 'sha256', 'checksum_url'}，没有文件时返回None；
+    新版API在asset的digest字段中给出SHA-256，旧版本发布可能单独附带 <文件名>.sha256
+    """
+    # 校验文件和增量更新补丁（见delta_update）不是程序本身
+    assets = [asset for asset in release.get('assets') or []
+              if not asset.get('name', '').lower().endswith(('.sha256', '.sha256sum', '.gfpatch'))]
+    if not assets:
+        return None
+    asset = assets[0]
+    checksum_url = None
+    for other in release.get('assets') or []:
+        if other.get('name', '').lower() in (asset['name'].lower() + '.sha256', asset['name'].lower() + '.sha256sum'):
+            checksum_url = other.get('browser_download_url')
+    return {
+        'name': asset.get('name'),
+        'url': asset.get('browser_download_url'),
+        'size': asset.get('size'),
+        'sha256': parse_digest(asset.get('digest')),
+        'checksum_url': checksum_url,
+    }
+
+
+def fetch_checksum(url, timeout=15):
+    """下载单独发布的 .sha256 文件并解析其中的摘要"""
+    request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return parse_digest(response.read(4096).decode('utf-8', errors='replace'))
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(MAX_CHUNK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def adapt_chunk(chunk, seconds):
+    """根据上一次读取的耗时调整块大小"""
+    if seconds < TARGET_READ_SECONDS / 2:
+        chunk *= 2
+    elif seconds > TARGET_READ_SECONDS * 2:
+        chunk //= 2
+    return max(MIN_CHUNK, min(MAX_CHUNK, chunk))
+
+
+def backoff_delay(attempt):
+    return min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt))
+
+
+def _read_meta(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        return meta if isinstance(meta, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(path, meta):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+
+def _remove(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _content_range_start(value):
+    """解析 Content-Range: bytes START-END/TOTAL 中的START"""
+    match = re.match(r'bytes\s+(\d+)-', value or '')
+    return int(match.group(1)) if match else None
+
+
+@tracing.traced('download', 'url')
+def download(url, dest, size=None, sha256=None, progress=None, cancel=None,
+             retries=MAX_RETRIES, timeout=30, sleep=time.sleep):
+    """下载url到dest并返回dest
+
+    size/sha256为发布时公布的大小和摘要（可为None，不校验）；
+    progress(已下载字节数, 总字节数或None) 在每次读取后调用；
+    cancel为threading.Event，置位后尽快停止并抛出DownloadCancelled（保留已下载部分）。
+    """
+    sha256 = parse_digest(sha256)
+    part_path = dest + ".part"
+    meta_path = part_path + ".json"
+
+    # 已下载部分对应的不是同一个文件时丢弃
+    meta = _read_meta(meta_path)
+    identity = {'url': url, 'size': size, 'sha256': sha256}
+    # 分段下载留下的 .part 已预分配为完整大小，不能按文件大小续传
+    if 'segments' in meta or any(meta.get(key) != value for key, value in identity.items()):
+        _remove(part_path, meta_path)
+        meta = dict(identity)
+    _write_meta(meta_path, meta)
+
+    attempt = 0
+    checksum_failed = False
+    chunk = START_CHUNK
+    while True:
+        if cancel is not None and cancel.is_set():
+            raise DownloadCancelled("下载已取消")
+        try:
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            if size and offset > size:
+                _remove(part_path)
+                offset = 0
+            if not (size and offset == size):
+                with tracing.span('download.attempt', url=url, attempt=attempt + 1, offset=offset):
+                    chunk = _fetch(url, part_path, meta_path, meta, offset, size, chunk,
+                                   progress, cancel, timeout)
+            total = os.path.getsize(part_path)
+            if size is not None and total != size:
+                raise DownloadError(f"文件大小不符: 应为{size}字节，实际{total}字节")
+            if sha256:
+                with tracing.span('validate', bytes=total):
+                    actual = sha256_file(part_path)
+                if actual != sha256:
+                    # 已下载的内容有误，续传无法修复，只能从头下载
+                    _remove(part_path)
+                    raise ChecksumError(f"SHA-256校验失败: 应为{sha256}，实际{actual}")
+            os.replace(part_path, dest)
+            _remove(meta_path)
+            return dest
+        except DownloadCancelled:
+            raise
+        except Exception as e:
+            if isinstance(e, urllib.error.HTTPError) and e.code in FATAL_STATUS:
+                raise DownloadError(f"下载失败: HTTP {e.code}") from e
+            if isinstance(e, ChecksumError) and checksum_failed:
+                # 连续两次下载的内容都不符，说明公布的摘要或服务器上的文件有误，重试无意义
+                raise
+            if attempt >= retries:
+                error_type = ChecksumError if isinstance(e, ChecksumError) else DownloadError
+                raise error_type(f"下载失败（已重试{retries}次）: {str(e)}") from e
+            checksum_failed = checksum_failed or isinstance(e, ChecksumError)
+            delay = backoff_delay(attempt)
+            attempt += 1
+            logging.warning(f"下载中断，{delay:.0f}秒后第{attempt}次重试: {str(e)}")
+            _wait(delay, cancel, sleep)
+
+
+def _wait(delay, cancel, sleep):
+    if cancel is None:
+        sleep(delay)
+    elif cancel.wait(delay):
+        raise DownloadCancelled("下载已取消")
+
+
+def _fetch(url, part_path, meta_path, meta, offset, size, chunk, progress, cancel, timeout):
+    """发起一次请求，从offset处续写part文件，返回调整后的块大小"""
+    headers = {'User-Agent': USER_AGENT}
+    if offset:
+        headers['Range'] = f"bytes={offset}-"
+        if meta.get('etag'):
+            # 服务器上的文件已变化时返回完整内容而不是片段
+            headers['If-Range'] = meta['etag']
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code == 416 and offset:
+            # 请求的范围超出文件末尾：已下载部分有误，从头下载
+            _remove(part_path)
+        raise
+
+    with response:
+        if offset and response.status == 206:
+            if _content_range_start(response.headers.get('Content-Range')) != offset:
+                _remove(part_path)
+                raise DownloadError("服务器返回的范围与请求不符")
+            mode = 'ab'
+        else:
+            # 服务器不支持续传（或文件已变化），从头写入
+            offset = 0
+            mode = 'wb'
+
+        etag = response.headers.get('ETag')
+        if etag != meta.get('etag'):
+            meta['etag'] = etag
+            _write_meta(meta_path, meta)
+
+        total = size
+        length = response.headers.get('Content-Length')
+        if total is None and length and length.isdigit():
+            total = offset + int(length)
+
+        downloaded = offset
+        with open(part_path, mode) as f:
+            if progress:
+                progress(downloaded, total)
+            while True:
+                if cancel is not None and cancel.is_set():
+                    raise DownloadCancelled("下载已取消")
+                start = time.perf_counter()
+                data = response.read(chunk)
+                if not data:
+                    break
+                f.write(data)
+                downloaded += len(data)
+                chunk = adapt_chunk(chunk, time.perf_counter() - start)
+                if progress:
+                    progress(downloaded, total)
+        if total is not None and downloaded < total:
+            # 连接提前关闭，已写入的部分保留，重试时续传
+            raise DownloadError(f"连接中断: 已下载{downloaded}/{total}字节")
+    return chunk
+
+
+def resolve_download(url, timeout=15):
+    """跟随跳转得到最终下载地址，并用 Range: bytes=0-0 探测文件大小和服务器是否支持分段
+
+    返回 (最终地址, 文件大小或None, 是否支持Range)
+    """
+    request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT, 'Range': 'bytes=0-0'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        final_url = response.geturl()
+        if response.status == 206:
+            match = re.match(r'bytes\s+0-0/(\d+)', response.headers.get('Content-Range') or '')
+            if match:
+                return final_url, int(match.group(1)), True
+        length = response.headers.get('Content-Length')
+        return final_url, int(length) if length and length.isdigit() else None, False
+
+
+def split_segments(start, end, count):
+    """把[start, end)分成最多count段，每段不小于MIN_SEGMENT；每段为 [起点, 终点, 已下载字节数]"""
+    length = end - start
+    count = max(1, min(count, length // MIN_SEGMENT))
+    bounds = [start + length * i // count for i in range(count + 1)]
+    return [[bounds[i], bounds[i + 1], 0] for i in range(count)]
+
+
+class PinnedHTTPConnection(http.client.HTTPConnection):
+    """连接指定的IP而不是解析域名，Host头仍使用原域名；ip为None时与HTTPConnection相同"""
+
+    def __init__(self, host, port=None, ip=None, **kwargs):
+        super().__init__(host, port, **kwargs)
+        self.ip = ip
+
+    def connect(self):
+        if not self.ip:
+            return super().connect()
+        self.sock = socket.create_connection((self.ip, self.port), self.timeout, self.source_address)
+
+
+class PinnedHTTPSConnection(http.client.HTTPSConnection):
+    """连接指定的IP，TLS的SNI和证书校验仍使用原域名；ip为None时与HTTPSConnection相同"""
+
+    def __init__(self, host, port=None, ip=None, **kwargs):
+        super().__init__(host, port, **kwargs)
+        self.ip = ip
+
+    def connect(self):
+        if not self.ip:
+            return super().connect()
+        sock = socket.create_connection((self.ip, self.port), self.timeout, self.source_address)
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+
+
+def _open_connection(target, ip, timeout):
+    """建立到target所在服务器的连接；指定ip时连接该IP"""
+    connection_type = PinnedHTTPSConnection if target.scheme == 'https' else PinnedHTTPConnection
+    return connection_type(target.hostname, target.port, ip=ip, timeout=timeout)
+
+
+def _fetch_segment(target, ip, segment, part_path, lock, stop, timeout):
+    """用一个连接下载一段中尚未下载的部分，写入part文件的对应位置"""
+    start = segment[0] + segment[2]
+    connection = _open_connection(target, ip, timeout)
+    try:
+        path = target.path + ('?' + target.query if target.query else '')
+        connection.request('GET', path, headers={'User-Agent': USER_AGENT,
+                                                 'Range': f"bytes={start}-{segment[1] - 1}"})
+        response = connection.getresponse()
+        if response.status != 206:
+            raise DownloadError(f"分段请求返回 HTTP {response.status}")
+        if _content_range_start(response.headers.get('Content-Range')) != start:
+            raise DownloadError("服务器返回的范围与请求不符")
+
+        chunk = START_CHUNK
+        # 不使用缓冲：保存的进度不会超过实际写入文件的内容
+        with open(part_path, 'r+b', buffering=0) as f:
+            f.seek(start)
+            while segment[2] < segment[1] - segment[0]:
+                if stop.is_set():
+                    return
+                began = time.perf_counter()
+                data = response.read(min(chunk, segment[1] - segment[0] - segment[2]))
+                if not data:
+                    raise DownloadError("连接中断")
+                f.write(data)
+                with lock:
+                    segment[2] += len(data)
+                chunk = adapt_chunk(chunk, time.perf_counter() - began)
+    finally:
+        connection.close()
+
+
+@tracing.traced('download.segmented', 'url')
+def download_segmented(url, dest, size=None, sha256=None, connections=DEFAULT_CONNECTIONS, ips=None,
+                       progress=None, cancel=None, retries=MAX_RETRIES, timeout=30, sleep=time.sleep):
+    """多连接分段下载url到dest并返回dest，参数与download相同
+
+    ips为各连接使用的IP，None时自动选择连接耗时最短的几个IP，空列表表示使用系统解析；
+    progress在调用线程中调用（可以直接更新界面）；中断后再次调用从各段已下载的位置继续。
+    服务器不支持Range、文件太小或只使用一个连接时改用download单连接下载。
+    """
+    sha256 = parse_digest(sha256)
+
+    def single():
+        return download(url, dest, size=size, sha256=sha256, progress=progress, cancel=cancel,
+                        retries=retries, timeout=timeout, sleep=sleep)
+
+    if connections <= 1:
+        return single()
+    try:
+        final_url, total, ranges = resolve_download(url, timeout)
+    except Exception as e:
+        logging.warning(f"探测下载地址失败，改用单连接下载: {str(e)}")
+        return single()
+    if size is not None and total is not None and total != size:
+        raise DownloadError(f"文件大小不符: 应为{size}字节，服务器上为{total}字节")
+    if not ranges or not total or total < 2 * MIN_SEGMENT:
+        return single()
+
+    part_path = dest + ".part"
+    meta_path = part_path + ".json"
+    identity = {'url': url, 'size': size, 'sha256': sha256}
+    meta = _read_meta(meta_path)
+    segments = None
+    if os.path.exists(part_path) and all(meta.get(key) == value for key, value in identity.items()):
+        saved = meta.get('segments')
+        if saved and saved[-1][1] == total:
+            segments = saved
+        elif not saved and os.path.getsize(part_path) < total:
+            # 单连接下载留下的部分作为已完成的第一段，其余部分分段下载
+            offset = os.path.getsize(part_path)
+            segments = ([[0, offset, offset]] if offset else []) + \
+                split_segments(offset, total, connections * SEGMENTS_PER_CONNECTION)
+    if segments is None:
+        _remove(part_path)
+        segments = split_segments(0, total, connections * SEGMENTS_PER_CONNECTION)
+    meta = dict(identity, segments=segments)
+
+    # 预分配完整大小，各连接直接写入自己负责的位置
+    with open(part_path, 'r+b' if os.path.exists(part_path) else 'w+b') as f:
+        f.truncate(total)
+    _write_meta(meta_path, meta)
+
+    if ips is None:
+        ips = _rank_ips(urlparse(final_url).hostname, connections)
+    pending = queue.Queue()
+    for index, segment in enumerate(segments):
+        if segment[2] < segment[1] - segment[0]:
+            pending.put(index)
+
+    lock = threading.Lock()
+    stop = threading.Event()
+    target = {'url': urlparse(final_url)}
+
+    def refresh_target():
+        # GitHub的下载地址带有时效签名，过期后重新跟随跳转获取；请求期间不持有锁，其他连接可以继续写入进度
+        try:
+            refreshed = urlparse(resolve_download(url, timeout)[0])
+        except Exception as e:
+            logging.warning(f"重新获取下载地址失败: {str(e)}")
+            return
+        with lock:
+            target['url'] = refreshed
+
+    def worker(slot):
+        attempt = 0
+        ip_index = slot
+        while not stop.is_set():
+            try:
+                index = pending.get_nowait()
+            except queue.Empty:
+                return
+            while not stop.is_set():
+                ip = ips[ip_index % len(ips)] if ips else None
+                segment = segments[index]
+                start = segment[2]
+                try:
+                    with tracing.span('download.segment', ip=ip, segment=index,
+                                      attempt=attempt + 1) as segment_span:
+                        try:
+                            _fetch_segment(target['url'], ip, segment, part_path, lock, stop, timeout)
+                        finally:
+                            segment_span.set(bytes=segment[2] - start)
+                    attempt = 0
+                    break
+                except Exception as e:
+                    if attempt >= retries:
+                        raise DownloadError(f"分段下载失败（已重试{retries}次）: {str(e)}") from e
+                    delay = backoff_delay(attempt)
+                    attempt += 1
+                    # 换一个IP重试
+                    ip_index += 1
+                    logging.warning(f"分段下载中断（{ip or '系统解析'}），{delay:.0f}秒后第{attempt}次重试: {str(e)}")
+                    if 'HTTP 403' in str(e) or 'HTTP 410' in str(e):
+                        refresh_target()
+                    if stop.wait(delay):
+                        return
+
+    def save():
+        with lock:
+            _write_meta(meta_path, meta)
+
+    def downloaded():
+        with lock:
+            return sum(segment[2] for segment in segments)
+
+    workers = min(connections, pending.qsize())
+    logging.info(f"分段下载 {final_url}: {total}字节，{len(segments)}段，{workers}个连接，IP: {ips or '系统解析'}")
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    futures = [executor.submit(worker, slot) for slot in range(workers)]
+    last_save = time.monotonic()
+    try:
+        if progress:
+            progress(downloaded(), total)
+        running = futures
+        while running:
+            finished, running = wait(running, timeout=PROGRESS_INTERVAL)
+            for future in finished:
+                future.result()
+            if cancel is not None and cancel.is_set():
+                raise DownloadCancelled("下载已取消")
+            if progress:
+                progress(downloaded(), total)
+            if time.monotonic() - last_save >= SAVE_INTERVAL:
+                save()
+                last_save = time.monotonic()
+    finally:
+        stop.set()
+        executor.shutdown(wait=True)
+        save()
+
+    if downloaded() != total:
+        raise DownloadError(f"下载不完整: {downloaded()}/{total}字节")
+    if sha256:
+        with tracing.span('validate', bytes=total):
+            actual = sha256_file(part_path)
+        if actual != sha256:
+            # 分段内容有误，从头用单连接重新下载
+            logging.warning(f"SHA-256校验失败，重新下载: 应为{sha256}，实际{actual}")
+            _remove(part_path, meta_path)
+            return single()
+    os.replace(part_path, dest)
+    _remove(meta_path)
+    return dest
+
+
+def _rank_ips(hostname, limit):
+    """按连接耗时选择下载使用的IP，失败时使用系统解析"""
+    import netprobe
+    try:
+        return netprobe.rank_ips(hostname, limit=limit)
+    except Exception as e:
+        logging.warning(f"选择下载IP失败: {str(e)}")
+        return []
@@ -0,0 +1,213 @@
+# history_log.py
+"""更新历史日志：每个事件追加一行JSON(JSONL)，不重写整个文件，完整保留所有历史
+
+打开时扫描一次文件，在内存中建立按类型和时间的索引，
+"最近一次Steam更新"之类的查询不需要再遍历全部记录。
+
+事件字段:
+    ts        时间戳
+    time      可读时间 "YYYY-mm-dd HH:MM:SS"
+    type      update / steam_update / restore / restore_original / restore_section
+    source    hosts源（更新事件）
+    duration  获取耗时(秒)
+    bytes     获取的字节数
+    entries   写入的条目数
+    backup    写入前创建的备份名
+    restored  恢复事件使用的备份名
+    note      附加说明（如部分恢复的区域）
+    benchmark 更新前后的测速对比
+"""
+import bisect
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import config_store
+import hosts_core
+
+HISTORY_NAME = "github520_history.jsonl"
+
+
+def history_path(config_file=hosts_core.CONFIG_FILE):
+    """历史日志保存在配置文件旁边（打包的单文件程序运行时APP_DIR是退出时删除的临时目录）"""
+    return os.path.join(os.path.dirname(os.path.abspath(config_file)), HISTORY_NAME)
+
+
+HISTORY_FILE = history_path()
+# 旧版本保存在程序目录中
+LEGACY_HISTORY_FILE = os.path.join(hosts_core.APP_DIR, HISTORY_NAME)
+
+EVENT_TYPES = ('update', 'steam_update', 'restore', 'restore_original', 'restore_section')
+
+
+class HistoryLog:
+    """追加写入的事件日志，可在多个线程中使用"""
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.events = []        # 按追加顺序（即时间顺序）排列
+        self.times = []         # 与events对应的时间戳，用于按时间范围二分查找
+        self.by_type = {}       # 类型 -> events中的下标
+        self.needs_newline = False
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                line = ''
+                for lineno, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        # 写入过程中断电只会损坏最后一行，跳过即可
+                        logging.warning(f"跳过损坏的历史记录: {self.path} 第{lineno}行")
+                        continue
+                    if isinstance(event, dict) and 'type' in event and 'ts' in event:
+                        self._index(event)
+                # 最后一行不完整时，下一次追加先换行，避免与损坏的内容连在一起
+                self.needs_newline = bool(line) and not line.endswith('\n')
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.error(f"读取历史记录失败: {str(e)}")
+
+    def _index(self, event):
+        self.by_type.setdefault(event['type'], []).append(len(self.events))
+        self.events.append(event)
+        self.times.append(event['ts'])
+
+    def append(self, event_type, **fields):
+        """追加一个事件并返回它，值为None的字段不写入"""
+        now = fields.pop('ts', None) or time.time()
+        event = {
+            'ts': now,
+            'time': datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S"),
+            'type': event_type,
+        }
+        event.update({key: value for key, value in fields.items() if value is not None})
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+
+        with self.lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                if self.needs_newline:
+                    f.write("\n")
+                    self.needs_newline = False
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._index(event)
+        return event
+
+    def last(self, event_type=None):
+        """最近一次事件（可指定类型），没有时返回None"""
+        with self.lock:
+            if event_type is None:
+                return self.events[-1] if self.events else None
+            positions = self.by_type.get(event_type)
+            return self.events[positions[-1]] if positions else None
+
+    def query(self, types=None, since=None, until=None, limit=None):
+        """按类型和时间范围查询，最新的在前，limit限制返回数量"""
+        with self.lock:
+            start = bisect.bisect_left(self.times, since) if since is not None else 0
+            end = bisect.bisect_right(self.times, until) if until is not None else len(self.events)
+            if types is None:
+                positions = range(end - 1, start - 1, -1)
+            else:
+                positions = sorted((i for t in types for i in self.by_type.get(t, ()) if start <= i < end),
+                                   reverse=True)
+            result = []
+            for i in positions:
+                if limit is not None and len(result) >= limit:
+                    break
+                result.append(self.events[i])
+            return result
+
+    def recent(self, limit=5):
+        return self.query(limit=limit)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.events)
+
+    def clear(self):
+        """清空历史（用户在界面上手动清空时使用）"""
+        with self.lock:
+            tmp_path = self.path + ".tmp"
+            open(tmp_path, 'w', encoding='utf-8').close()
+            os.replace(tmp_path, self.path)
+            self.events = []
+            self.times = []
+            self.by_type = {}
+
+    def import_legacy(self, records):
+        """导入旧版本保存在配置文件 update_history 中的记录（只在日志为空时导入），返回导入数量"""
+        if len(self):
+            return 0
+        imported = 0
+        for record in records:
+            if not isinstance(record, dict) or 'time' not in record:
+                continue
+            try:
+                ts = datetime.strptime(record['time'], "%Y-%m-%d %H:%M:%S").timestamp()
+            except (TypeError, ValueError):
+                continue
+            count = record.get('count')
+            self.append(record.get('type') or 'update', ts=ts,
+                        entries=count if isinstance(count, int) else None,
+                        note=count if isinstance(count, str) else None,
+                        restored=record.get('backup_file'),
+                        benchmark=record.get('benchmark'))
+            imported += 1
+        if imported:
+            logging.info(f"已导入 {imported} 条旧版历史记录")
+        return imported
+
+
+def open_history(path=None, config_file=hosts_core.CONFIG_FILE):
+    """打开历史日志（默认在config_file旁边），并导入程序目录中的旧日志和配置文件中旧格式的历史记录"""
+    path = path or history_path(config_file)
+    if not os.path.exists(path) and os.path.exists(LEGACY_HISTORY_FILE) and \
+            os.path.abspath(LEGACY_HISTORY_FILE) != os.path.abspath(path):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.copy2(LEGACY_HISTORY_FILE, path)
+            logging.info(f"已迁移历史记录: {LEGACY_HISTORY_FILE} -> {path}")
+        except OSError as e:
+            logging.warning(f"迁移历史记录失败: {str(e)}")
+    log = HistoryLog(path)
+    log.import_legacy(config_store.read_config(config_file).get('update_history', []))
+    return log
+
+
+def describe(event):
+    """生成一行可读的历史描述"""
+    event_type = event.get('type')
+    if event_type == 'update':
+        text = f"更新了 {event.get('entries', '?')} 条记录"
+        if event.get('source'):
+            text += f"（{event['source']}）"
+    elif event_type == 'steam_update':
+        text = f"Steam {event.get('entries', '?')}条"
+    elif event_type == 'restore_original':
+        text = "恢复原始备份"
+    elif event_type == 'restore_section':
+        text = f"部分恢复({event.get('note', '')}) ({event.get('restored', '')})"
+    elif event_type == 'restore':
+        text = f"恢复备份 ({event.get('restored', '')})"
+    else:
+        text = event.get('note') or event_type
+    # 旧版本导入的记录
+    if event.get('note') and event_type in ('update', 'steam_update') and 'entries' not in event:
+        text = event['note']
+    return f"{event['time']} - {text}"
@@ -0,0 +1,595 @@
+# hosts_core.py
+"""hosts文件相关的通用逻辑，不依赖tkinter，供GUI和命令行共用"""
+import hashlib
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+
+import config_store
+import metrics
+import tracing
+from backup_store import BackupStore
+from locking import FileLock
+
+# 配置文件路径（用户配置目录或便携模式下的程序目录，见config_store）
+CONFIG_FILE = config_store.CONFIG_FILE
+# 配置文件所在目录：打包的单文件程序运行时APP_DIR是每个进程各自的临时目录（退出时删除），
+# 需要在进程之间共享或长期保存的文件放在这里
+DATA_DIR = os.path.dirname(os.path.abspath(CONFIG_FILE))
+
+# 程序目录、备份目录
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKUP_DIR = os.path.join(APP_DIR, "backup")
+ORIGINAL_BACKUP = os.path.join(BACKUP_DIR, "hosts.original_backup")
+# 探测和测速的时间序列，长期保存才能看出某个IP从什么时候开始变慢
+PROBE_DB = os.path.join(DATA_DIR, "probe_history.db")
+# 写hosts时持有的锁，避免GUI、命令行和后台服务同时写入（各进程必须使用同一个文件）
+HOSTS_LOCK = os.path.join(DATA_DIR, "hosts.lock")
+
+# GitHub520 hosts内容的起止标记
+GITHUB_START = "# GitHub520 Host Start"
+GITHUB_END = "# GitHub520 Host End"
+
+# 可以从备份中单独恢复的区域
+SECTIONS = ('github', 'steam')
+
+# hosts源配置
+HOSTS_SOURCES = {
+    "GitHub520": "https://raw.hellogithub.com/hosts",
+    "TinsFox": "https://github-hosts.tinsfox.com/hosts"
+}
+
+# Steam hosts源配置，获取失败时按顺序尝试其他源
+STEAM_HOSTS_SOURCES = {
+    "GitMirror国内镜像": "https://hub.gitmirror.com/raw.githubusercontent.com/Clov614/SteamHostSync/main/Hosts_steam",
+    "GitHub": "https://raw.githubusercontent.com/Clov614/SteamHostSync/main/Hosts_steam",
+    "GitHubUser源": "https://raw.githubusercontent.com/Clov614/SteamHostSync/main/Hosts_steam"
+}
+
+# 指向本机或用于屏蔽的地址，不属于加速条目
+LOCAL_IPS = ('127.0.0.1', '0.0.0.0', '::1', '255.255.255.255')
+
+STEAM_DOMAINS = [
+    'steamcommunity.com',
+    'store.steampowered.com',
+    'api.steampowered.com',
+    'media.steampowered.com',
+    'cloud-ops.steamstatic.com',
+    'client-download.steamstatic.com',
+    'cm.steampowered.com',
+    'content.steampowered.com',
+    'content1.steampowered.com',
+    'content2.steampowered.com',
+    'content3.steampowered.com',
+    'content4.steampowered.com',
+    'content5.steampowered.com',
+    'content6.steampowered.com',
+    'content7.steampowered.com',
+    'content8.steampowered.com',
+    'edge.steam-dns.top.comcast.net'
+]
+
+
+def get_hosts_path():
+    """获取系统hosts文件路径"""
+    if os.name == 'nt':  # Windows
+        return r'C:\Windows\System32\drivers\etc\hosts'
+    else:  # Linux/Mac
+        return '/etc/hosts'
+
+
+def read_hosts_file(hosts_path=None):
+    """读取系统hosts文件内容，文件不存在时返回空字符串"""
+    hosts_path = hosts_path or get_hosts_path()
+    if not os.path.exists(hosts_path):
+        return ""
+    with open(hosts_path, 'r', encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+
+def parse_hosts_entries(content):
+    """解析hosts内容，返回 (行号, IP, 域名) 列表"""
+    entries = []
+    for lineno, line in enumerate(content.splitlines(), 1):
+        # 去掉行内注释
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+
+        parts = line.split()
+        if len(parts) < 2:
+            continue
+
+        ip = parts[0]
+        for hostname in parts[1:]:
+            entries.append((lineno, ip, hostname.lower()))
+    return entries
+
+
+def hosts_mapping(content):
+    """生成 域名 -> IP 映射，与系统解析器一致，同名时以第一次出现的为准"""
+    mapping = {}
+    for _, ip, hostname in parse_hosts_entries(content):
+        mapping.setdefault(hostname, ip)
+    return mapping
+
+
+def managed_domains(content):
+    """列出hosts内容中的加速域名（排除本机和屏蔽用的地址），保持出现顺序"""
+    domains = []
+    seen = set()
+    for _, ip, hostname in parse_hosts_entries(content):
+        if ip in LOCAL_IPS or hostname == 'localhost' or hostname in seen:
+            continue
+        seen.add(hostname)
+        domains.append(hostname)
+    return domains
+
+
+def same_entries(content_a, content_b):
+    """比较两份hosts的有效条目是否一致（忽略注释、空行和更新时间等变化）"""
+    entries_a = [(ip, hostname) for _, ip, hostname in parse_hosts_entries(content_a)]
+    entries_b = [(ip, hostname) for _, ip, hostname in parse_hosts_entries(content_b)]
+    return entries_a == entries_b
+
+
+def count_entries(content):
+    """统计非注释行数（与历史记录中的"更新了N条记录"一致）"""
+    return len([line for line in content.split('\n')
+                if line.strip() and not line.startswith('#')])
+
+
+def fetch_with_retry(url, retries=3):
+    """带重试机制的网络请求"""
+    import urllib.request  # 延迟导入，加快程序启动
+
+    source = metrics.source_of(url)
+    start = time.perf_counter()
+    for i in range(retries):
+        try:
+            logging.info(f"第{i+1}/{retries}次尝试获取: {url}")
+            with tracing.span('fetch.attempt', url=url, attempt=i + 1):
+                response = urllib.request.urlopen(url, timeout=10)
+            logging.info(f"成功获取数据: {url}")
+            metrics.FETCH_DURATION.observe(time.perf_counter() - start, source=source)
+            return response
+        except Exception as e:
+            logging.warning(f"第{i+1}次获取失败: {str(e)}")
+            if i == retries - 1:
+                logging.error(f"所有重试失败: {url}")
+                metrics.FETCH_FAILURES.inc(source=source)
+                raise
+            metrics.FETCH_RETRIES.inc(source=source)
+            with tracing.span('fetch.retry_wait', url=url, attempt=i + 1):
+                time.sleep(2)
+
+
+def fetch_text(url, retries=3):
+    """获取URL内容并解码为文本"""
+    with tracing.span('fetch', url=url) as fetch_span:
+        with fetch_with_retry(url, retries) as response:
+            data = response.read()
+        fetch_span.set(bytes=len(data))
+    with tracing.span('decode', bytes=len(data)):
+        return data.decode('utf-8')
+
+
+def validate_hosts_content(content):
+    """验证hosts内容格式"""
+    required_domains = ['github.com', 'raw.githubusercontent.com']
+    with tracing.span('validate', chars=len(content)) as validate_span:
+        is_valid = all(domain in content for domain in required_domains)
+        validate_span.set(valid=is_valid)
+    logging.info(f"Hosts内容验证结果: {is_valid}")
+    return is_valid
+
+
+def content_etag(content):
+    """根据内容生成ETag（带引号）"""
+    return '"' + hashlib.sha256(content.encode('utf-8')).hexdigest()[:32] + '"'
+
+
+def lan_sources(config_file=CONFIG_FILE):
+    """配置文件中的局域网缓存节点地址列表，如 ["http://192.168.1.10:9466"]"""
+    sources = config_store.read_config(config_file).get('lan_sources', [])
+    if isinstance(sources, str):
+        sources = [sources]
+    return [source.rstrip('/') for source in sources if isinstance(source, str) and source.strip()]
+
+
+# 局域网节点返回内容的缓存 URL -> (ETag, 内容)，用于条件请求
+_lan_cache = {}
+
+
+def fetch_from_lan(base_url, name='hosts', timeout=3):
+    """从局域网缓存节点获取内容（不重试），内容未变化时节点返回304，直接使用本地缓存"""
+    import urllib.error
+    import urllib.request
+
+    url = f"{base_url.rstrip('/')}/{name}"
+    headers = {'User-Agent': 'GithubFaster'}
+    cached = _lan_cache.get(url)
+    if cached:
+        headers['If-None-Match'] = cached[0]
+
+    try:
+        with tracing.span('fetch', url=url, source='lan') as fetch_span, \
+                urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout) as response:
+            data = response.read()
+            fetch_span.set(bytes=len(data))
+            etag = response.headers.get('ETag')
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and cached:
+            logging.info(f"局域网缓存内容未变化: {url}")
+            return cached[1]
+        raise
+    with tracing.span('decode', bytes=len(data)):
+        content = data.decode('utf-8')
+
+    if etag:
+        _lan_cache[url] = (etag, content)
+    logging.info(f"成功从局域网缓存获取: {url}")
+    return content
+
+
+def fetch_github_hosts(source="GitHub520", lan_urls=()):
+    """获取GitHub hosts，优先使用局域网缓存节点，全部不可用时使用指定的上游源"""
+    for base_url in lan_urls:
+        try:
+            content = fetch_from_lan(base_url, 'hosts')
+            if validate_hosts_content(content):
+                return content
+        except Exception as e:
+            logging.warning(f"局域网缓存不可用: {base_url} {str(e)}")
+    return fetch_text(HOSTS_SOURCES[source])
+
+
+def fetch_steam_hosts(preferred="GitMirror国内镜像", lan_urls=()):
+    """获取Steam hosts并提取Steam相关条目，首选源失败时依次尝试其他源，返回 (内容, 实际使用的URL)
+
+    配置了局域网缓存节点时优先从节点获取
+    """
+    for base_url in lan_urls:
+        try:
+            return extract_steam_hosts(fetch_from_lan(base_url, 'steam')), f"{base_url}/steam"
+        except Exception as e:
+            logging.warning(f"局域网缓存不可用: {base_url} {str(e)}")
+
+    urls = [STEAM_HOSTS_SOURCES[preferred]]
+    urls += [url for url in STEAM_HOSTS_SOURCES.values() if url not in urls]
+
+    last_error = None
+    for url in urls:
+        try:
+            content = fetch_text(url)
+            logging.info(f"获取到的原始内容长度: {len(content)} 字符")
+            return extract_steam_hosts(content), url
+        except Exception as e:
+            logging.warning(f"获取Steam hosts失败: {str(e)}")
+            last_error = e
+    raise last_error
+
+
+@tracing.traced('extract')
+def extract_steam_hosts(content):
+    """从原始hosts中提取Steam相关条目"""
+    # 检查是否包含 #steam Start 标记
+    if '#steam Start' in content and '#steam End' in content:
+        # 提取 #steam Start 和 #steam End 之间的内容
+        start_idx = content.find('#steam Start') + len('#steam Start')
+        end_idx = content.find('#steam End')
+        steam_section = content[start_idx:end_idx]
+        lines = steam_section.split('\n')
+    else:
+        # 按行处理
+        lines = content.split('\n')
+
+    steam_lines = []
+
+    # 遍历所有行，提取Steam相关hosts
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            # 检查是否包含Steam相关域名
+            if any(domain in line for domain in STEAM_DOMAINS):
+                steam_lines.append(line)
+
+    # 添加文件头注释
+    header = """# Steam Hosts 配置
+# 来源: https://github.com/Clov614/SteamHostSync
+# 更新时间: {}\n\n""".format(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+    # 如果没有找到任何Steam相关hosts条目，添加提示信息
+    if not steam_lines:
+        logging.warning("未提取到Steam相关hosts条目，可能源文件格式发生变化")
+        # 添加示例hosts条目作为参考
+        sample_entries = """
+# 示例Steam hosts条目（当前未提取到实际内容）
+# 您可以手动从GitHub仓库复制最新配置
+# 或尝试刷新获取最新数据
+"""
+        return header + sample_entries
+
+    return header + '\n'.join(steam_lines)
+
+
+def is_steam_hostname(hostname):
+    """是否为Steam相关域名（STEAM_DOMAINS中的域名及其子域名）"""
+    hostname = hostname.lower()
+    return any(hostname == domain or hostname.endswith('.' + domain) for domain in STEAM_DOMAINS)
+
+
+def split_steam_hosts(content):
+    """把hosts内容分为 (Steam相关的行, 其他行)"""
+    lines = content.split('\n')
+    steam_lines = []
+    cleaned_lines = []
+    in_steam_section = False
+
+    for line in lines:
+        line_stripped = line.strip()
+
+        # 检查是否进入Steam配置区域
+        if any(keyword in line for keyword in ['Steam Hosts', 'SteamHostSync']):
+            in_steam_section = True
+            steam_lines.append(line)
+            continue
+
+        # 如果在Steam区域，跳过所有行直到空行
+        if in_steam_section:
+            if not line_stripped:  # 遇到空行，结束Steam区域
+                in_steam_section = False
+            else:
+                steam_lines.append(line)
+            continue
+
+        # 移除单独的Steam域名行
+        if line_stripped and not line_stripped.startswith('#'):
+            if any(domain in line for domain in ['steamcommunity.com', 'store.steampowered.com']):
+                steam_lines.append(line)
+                continue
+
+        cleaned_lines.append(line)
+
+    return steam_lines, cleaned_lines
+
+
+def remove_old_steam_hosts(content):
+    """移除旧的Steam相关hosts配置"""
+    return '\n'.join(split_steam_hosts(content)[1])
+
+
+def merge_steam_hosts(current_content, steam_hosts):
+    """移除旧的Steam配置后追加新的Steam配置"""
+    cleaned_content = remove_old_steam_hosts(current_content)
+    return cleaned_content.strip() + "\n\n" + steam_hosts
+
+
+def build_hosts_content(current_content, payloads):
+    """根据获取的内容生成新的hosts：GitHub配置替换整个文件，Steam配置替换旧的Steam区域"""
+    new_content = payloads.get('github', current_content)
+    if 'steam' in payloads:
+        new_content = merge_steam_hosts(new_content, payloads['steam'])
+    return new_content
+
+
+def marker_block(lines, start_marker=GITHUB_START, end_marker=GITHUB_END):
+    """查找标记区域，返回 (起始行, 结束行+1)，没有完整的标记时返回None"""
+    start = next((i for i, line in enumerate(lines) if line.strip() == start_marker), None)
+    if start is None:
+        return None
+    end = next((i for i in range(start + 1, len(lines)) if lines[i].strip() == end_marker), None)
+    if end is None:
+        return None
+    return start, end + 1
+
+
+def restore_hostnames(current_content, backup_content, hostnames):
+    """只把指定域名的条目恢复为备份中的状态，其他行保持不变
+
+    当前文件中这些域名的映射会被移除（同一行的其他域名保留），
+    备份中的映射插入到第一个被移除的位置，没有时追加到末尾。
+    """
+    names = {name.strip().lower() for name in hostnames if name.strip()}
+    restored = []
+    seen = set()
+    for _, ip, hostname in parse_hosts_entries(backup_content):
+        if hostname in names and hostname not in seen:
+            seen.add(hostname)
+            restored.append(f"{ip} {hostname}")
+
+    output = []
+    insert_at = None
+    for line in current_content.split('\n'):
+        entry, hash_mark, comment = line.partition('#')
+        parts = entry.split()
+        if len(parts) < 2 or not any(hostname.lower() in names for hostname in parts[1:]):
+            output.append(line)
+            continue
+
+        if insert_at is None:
+            insert_at = len(output)
+        remaining = [hostname for hostname in parts[1:] if hostname.lower() not in names]
+        if remaining:
+            output.append(' '.join([parts[0]] + remaining) + (f" #{comment}" if hash_mark else ''))
+
+    if insert_at is None:
+        while output and not output[-1].strip():
+            output.pop()
+        insert_at = len(output)
+        output.append('')
+    output[insert_at:insert_at] = restored
+    return '\n'.join(output)
+
+
+def restore_section(current_content, backup_content, section, hostnames=()):
+    """把备份中的一个区域合并到当前hosts，返回新内容
+
+    section: 'github' GitHub520标记区域（没有标记时按包含github的域名）
+             'steam'  Steam配置区域
+             'hosts'  hostnames指定的域名
+    备份中没有该区域时，当前文件中的该区域会被移除（即恢复到备份时的状态）。
+    """
+    if section == 'hosts':
+        return restore_hostnames(current_content, backup_content, hostnames)
+
+    if section == 'steam':
+        # 按域名恢复：Steam配置的文件头之后有空行，按区域截取会漏掉空行之后的条目
+        backup_names = [hostname for hostname in hosts_mapping(backup_content) if is_steam_hostname(hostname)]
+        names = set(backup_names) | {hostname for hostname in hosts_mapping(current_content)
+                                     if is_steam_hostname(hostname)}
+        new_content = restore_hostnames(current_content, backup_content, names) if names else current_content
+        if not backup_names:
+            # 备份中没有Steam配置，连同文件头一起移除
+            new_content = remove_old_steam_hosts(new_content)
+        return new_content
+
+    if section == 'github':
+        current_lines = current_content.split('\n')
+        backup_lines = backup_content.split('\n')
+        current_block = marker_block(current_lines)
+        backup_block = marker_block(backup_lines)
+        if current_block is None and backup_block is None:
+            names = [hostname for hostname in set(hosts_mapping(current_content)) | set(hosts_mapping(backup_content))
+                     if 'github' in hostname]
+            return restore_hostnames(current_content, backup_content, names)
+
+        block = backup_lines[backup_block[0]:backup_block[1]] if backup_block else []
+        if current_block:
+            current_lines[current_block[0]:current_block[1]] = block
+        else:
+            while current_lines and not current_lines[-1].strip():
+                current_lines.pop()
+            current_lines += [''] + block + ['']
+        return '\n'.join(current_lines)
+
+    raise ValueError(f"未知的区域: {section}")
+
+
+def backup_store(backup_dir=BACKUP_DIR, config_file=CONFIG_FILE):
+    """打开备份仓库，保留策略取自配置文件的 backup_retention 项"""
+    retention = config_store.read_config(config_file).get('backup_retention')
+    return BackupStore(backup_dir, retention if isinstance(retention, dict) else None)
+
+
+def create_backup(backup_dir=BACKUP_DIR, prefix="hosts.backup_", hosts_path=None):
+    """备份当前hosts文件，返回备份名；hosts文件不存在时返回None"""
+    hosts_path = hosts_path or get_hosts_path()
+    if not os.path.exists(hosts_path):
+        logging.warning(f"hosts文件不存在: {hosts_path}")
+        return None
+    with tracing.span('backup', prefix=prefix) as backup_span:
+        with open(hosts_path, 'rb') as f:
+            content = f.read()
+        name = backup_store(backup_dir).save(content, prefix)['name']
+        backup_span.set(bytes=len(content), name=name)
+    return name
+
+
+def backup_original_hosts(original_backup=ORIGINAL_BACKUP, hosts_path=None):
+    """首次运行时备份用户原始hosts文件"""
+    hosts_path = hosts_path or get_hosts_path()
+    if not os.path.exists(original_backup) and os.path.exists(hosts_path):
+        with tracing.span('backup', prefix='original'):
+            os.makedirs(os.path.dirname(original_backup), exist_ok=True)
+            shutil.copy2(hosts_path, original_backup)
+        return True
+    return False
+
+
+def replace_hosts_file(content, hosts_path):
+    """原子写入：在同一目录写临时文件并刷到磁盘后替换hosts，中断时不会留下写了一半的文件（调用方需持有hosts锁）"""
+    tmp_path = hosts_path + ".tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(hosts_path):
+            # 保留原文件的权限，否则Linux上其他用户可能无法读取hosts
+            shutil.copymode(hosts_path, tmp_path)
+        os.replace(tmp_path, hosts_path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_hosts_file(content, hosts_path=None):
+    """写入hosts文件，权限不足时抛出PermissionError"""
+    hosts_path = hosts_path or get_hosts_path()
+    with tracing.span('write', path=hosts_path, chars=len(content)):
+        with tracing.span('write.lock'):
+            lock = FileLock(HOSTS_LOCK, timeout=30).acquire()
+        try:
+            replace_hosts_file(content, hosts_path)
+        finally:
+            lock.release()
+    logging.info(f"成功应用新的hosts内容: {hosts_path}")
+
+
+def update_hosts_file(transform, backup_prefix=None, hosts_path=None, backup_dir=BACKUP_DIR):
+    """在持有hosts锁期间读取 → transform(当前内容) → 写入，中间不会被其他实例的写入打断
+
+    内容有变化且指定了backup_prefix时，写入前先备份当前内容。
+    返回 (备份名或None, 新内容, 是否有变化)
+    """
+    hosts_path = hosts_path or get_hosts_path()
+    with tracing.span('write.lock'):
+        lock = FileLock(HOSTS_LOCK, timeout=30).acquire()
+    try:
+        current_content = read_hosts_file(hosts_path)
+        new_content = transform(current_content)
+        if new_content == current_content:
+            return None, new_content, False
+
+        backup_name = None
+        if backup_prefix and os.path.exists(hosts_path):
+            with tracing.span('backup', prefix=backup_prefix), open(hosts_path, 'rb') as f:
+                backup_name = backup_store(backup_dir).save(f.read(), backup_prefix)['name']
+        with tracing.span('write', path=hosts_path, chars=len(new_content)):
+            replace_hosts_file(new_content, hosts_path)
+    finally:
+        lock.release()
+    logging.info(f"成功应用新的hosts内容: {hosts_path}")
+    return backup_name, new_content, True
+
+
+@tracing.traced('flush')
+def flush_dns():
+    """刷新系统DNS缓存，返回是否成功"""
+    import subprocess
+
+    if os.name == 'nt':  # Windows
+        result = subprocess.run(['ipconfig', '/flushdns'],
+                                capture_output=True, text=True)
+    else:  # Linux/Mac
+        result = subprocess.run(['sudo', 'systemd-resolve', '--flush-caches'],
+                                capture_output=True, text=True)
+    return result.returncode == 0
+
+
+def reset_winsock():
+    """重置Winsock（仅Windows，需重启生效），返回是否成功；其他系统返回None"""
+    import subprocess
+
+    if os.name != 'nt':
+        return None
+    result = subprocess.run(['netsh', 'winsock', 'reset'],
+                            capture_output=True, text=True)
+    return result.returncode == 0
+
+
+def is_admin():
+    """检查是否有管理员权限"""
+    try:
+        if os.name == 'nt':  # Windows系统
+            import ctypes
+            return ctypes.windll.shell32.IsUserAnAdmin() != 0
+        else:  # Linux/Mac系统
+            return os.geteuid() == 0
+    except Exception:
+        logging.error("检查管理员权限时出错")
+        return False
@@ -0,0 +1,89 @@
+# hosts_diff.py
+"""按解析后的条目（域名 -> IP）比较两份hosts，忽略注释、空行和行的顺序
+
+两份内容各解析一次生成字典，再用集合运算求差异，文件再大也是线性时间。
+"""
+from hosts_core import parse_hosts_entries
+
+
+def entry_index(content):
+    """生成 域名 -> (IP, 行号)，同名时以第一次出现的为准（与系统解析器一致）"""
+    index = {}
+    for lineno, ip, hostname in parse_hosts_entries(content):
+        if hostname not in index:
+            index[hostname] = (ip, lineno)
+    return index
+
+
+def diff_hosts(old_content, new_content):
+    """比较两份hosts内容
+
+    返回 {'added': [(域名, IP, 新行号)],
+          'removed': [(域名, IP, 旧行号)],
+          'changed': [(域名, 旧IP, 新IP, 旧行号, 新行号)],
+          'unchanged': 数量}
+    """
+    old = entry_index(old_content)
+    new = entry_index(new_content)
+    old_names = old.keys()
+    new_names = new.keys()
+
+    added = [(name, new[name][0], new[name][1]) for name in new_names - old_names]
+    removed = [(name, old[name][0], old[name][1]) for name in old_names - new_names]
+    changed = []
+    unchanged = 0
+    for name in old_names & new_names:
+        if old[name][0] == new[name][0]:
+            unchanged += 1
+        else:
+            changed.append((name, old[name][0], new[name][0], old[name][1], new[name][1]))
+
+    # 按行号排序，方便对照原文件
+    added.sort(key=lambda item: item[2])
+    removed.sort(key=lambda item: item[2])
+    changed.sort(key=lambda item: item[4])
+    return {'added': added, 'removed': removed, 'changed': changed, 'unchanged': unchanged}
+
+
+def is_empty(diff):
+    return not (diff['added'] or diff['removed'] or diff['changed'])
+
+
+def summary(diff):
+    return (f"新增 {len(diff['added'])}，删除 {len(diff['removed'])}，"
+            f"IP变化 {len(diff['changed'])}，未变化 {diff['unchanged']}")
+
+
+def format_diff(diff, old_label="旧", new_label="新"):
+    """生成可读的差异文本"""
+    lines = [f"比较: {old_label} → {new_label}", summary(diff), ""]
+    if is_empty(diff):
+        lines.append("两份hosts的条目完全相同")
+        return "\n".join(lines)
+
+    if diff['changed']:
+        lines.append(f"IP变化 ({len(diff['changed'])}):")
+        for name, old_ip, new_ip, old_line, new_line in diff['changed']:
+            lines.append(f"  ~ {name}: {old_ip} → {new_ip}  (第{old_line}行 → 第{new_line}行)")
+        lines.append("")
+    if diff['added']:
+        lines.append(f"新增 ({len(diff['added'])}):")
+        for name, ip, lineno in diff['added']:
+            lines.append(f"  + {ip} {name}  (第{lineno}行)")
+        lines.append("")
+    if diff['removed']:
+        lines.append(f"删除 ({len(diff['removed'])}):")
+        for name, ip, lineno in diff['removed']:
+            lines.append(f"  - {ip} {name}  (第{lineno}行)")
+    return "\n".join(lines).rstrip("\n")
+
+
+def diff_json(diff):
+    """转换为便于JSON输出的结构"""
+    return {
+        'added': [{'host': name, 'ip': ip, 'line': lineno} for name, ip, lineno in diff['added']],
+        'removed': [{'host': name, 'ip': ip, 'line': lineno} for name, ip, lineno in diff['removed']],
+        'changed': [{'host': name, 'old_ip': old_ip, 'new_ip': new_ip, 'old_line': old_line, 'new_line': new_line}
+                    for name, old_ip, new_ip, old_line, new_line in diff['changed']],
+        'unchanged': diff['unchanged'],
+    }
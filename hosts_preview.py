@@ -0,0 +1,178 @@
+# hosts_preview.py
+"""hosts内容预览控件：不自动换行，分批插入，只给可见区域着色，支持按域名筛选
+
+一次插入十万行并按单词换行排版会让Tk卡住几秒。这里把内容分批在空闲时插入，
+关闭自动换行（hosts每行都很短，不需要换行），只在滚动到某处时才给这些行着色。
+筛选时只显示包含关键字的行；在上一次的关键字后继续输入时只在上一次的结果中查找。
+"""
+import re
+import tkinter as tk
+from tkinter import ttk
+
+# 每批插入的行数，两批之间处理界面事件
+BATCH_LINES = 2000
+
+# 可见区域上下额外着色的行数，滚动时不会看到未着色的行
+HIGHLIGHT_MARGIN = 30
+
+# 滚动和输入筛选条件后等待的毫秒数，连续的操作只处理最后一次
+HIGHLIGHT_DELAY_MS = 30
+FILTER_DELAY_MS = 150
+
+TAG_COLORS = {
+    'ip': {'foreground': "#0451a5"},
+    'host': {'foreground': "#267f99"},
+    'comment': {'foreground': "#6a9955"},
+    'match': {'background': "#ffe58f"},
+}
+
+_TOKEN = re.compile(r'\S+')
+
+
+class HostsPreview:
+    """只读的hosts预览，frame可以像普通控件一样pack/grid"""
+
+    def __init__(self, parent, font=('Consolas', 9)):
+        self.frame = ttk.Frame(parent)
+
+        # 筛选栏
+        filter_frame = ttk.Frame(self.frame)
+        filter_frame.pack(fill=tk.X, pady=(0, 5))
+        ttk.Label(filter_frame, text="筛选域名:").pack(side=tk.LEFT)
+        self.filter_var = tk.StringVar()
+        filter_entry = ttk.Entry(filter_frame, textvariable=self.filter_var, width=30)
+        filter_entry.pack(side=tk.LEFT, padx=5)
+        filter_entry.bind('<KeyRelease>', lambda e: self.schedule_filter())
+        ttk.Button(filter_frame, text="清除", width=6,
+                   command=lambda: (self.filter_var.set(""), self.apply_filter())).pack(side=tk.LEFT)
+        self.count_label = ttk.Label(filter_frame, text="", foreground="gray")
+        self.count_label.pack(side=tk.RIGHT)
+
+        # 文本区域（不换行，带横向滚动条）
+        text_frame = ttk.Frame(self.frame)
+        text_frame.pack(fill=tk.BOTH, expand=True)
+        self.text = tk.Text(text_frame, wrap=tk.NONE, font=font, undo=False, state=tk.DISABLED)
+        y_scrollbar = ttk.Scrollbar(text_frame, orient=tk.VERTICAL, command=self.text.yview)
+        x_scrollbar = ttk.Scrollbar(text_frame, orient=tk.HORIZONTAL, command=self.text.xview)
+        self.text.configure(yscrollcommand=lambda *args: (y_scrollbar.set(*args), self.schedule_highlight()),
+                            xscrollcommand=x_scrollbar.set)
+        self.text.grid(row=0, column=0, sticky="nsew")
+        y_scrollbar.grid(row=0, column=1, sticky="ns")
+        x_scrollbar.grid(row=1, column=0, sticky="ew")
+        text_frame.rowconfigure(0, weight=1)
+        text_frame.columnconfigure(0, weight=1)
+        for tag, options in TAG_COLORS.items():
+            self.text.tag_configure(tag, **options)
+        # 筛选关键字的高亮显示在语法颜色之上
+        self.text.tag_raise('match')
+        self.text.bind('<Configure>', lambda e: self.schedule_highlight())
+
+        self.lines = []             # 全部内容
+        self.shown = []             # 当前显示的行（筛选后）
+        self.filter_cache = ("", None)   # (关键字, 匹配的行)，继续输入时在其中查找
+        self.highlighted = set()    # 已着色的显示行号（从1开始）
+        self.query = ""
+        self.insert_job = None
+        self.highlight_job = None
+        self.filter_job = None
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def set_font(self, font):
+        self.text.config(font=font)
+
+    def set_content(self, content):
+        """替换显示的内容，保留当前的筛选条件"""
+        self.lines = content.splitlines()
+        self.filter_cache = ("", None)
+        self.apply_filter()
+
+    def get_content(self):
+        return "\n".join(self.lines)
+
+    def schedule_filter(self):
+        if self.filter_job:
+            self.text.after_cancel(self.filter_job)
+        self.filter_job = self.text.after(FILTER_DELAY_MS, self.apply_filter)
+
+    def apply_filter(self):
+        """按筛选条件重新显示，不区分大小写"""
+        self.filter_job = None
+        query = self.filter_var.get().strip().lower()
+        if not query:
+            self.shown = self.lines
+        else:
+            previous_query, previous = self.filter_cache
+            # 关键字只是在上一次后面继续输入时，结果一定在上一次的结果中
+            source = previous if previous is not None and query.startswith(previous_query) else self.lines
+            self.shown = [line for line in source if query in line.lower()]
+            self.filter_cache = (query, self.shown)
+        self.query = query
+        self.render()
+
+    def render(self):
+        """清空后分批插入当前显示的行"""
+        if self.insert_job:
+            self.text.after_cancel(self.insert_job)
+            self.insert_job = None
+        self.highlighted = set()
+        self.text.config(state=tk.NORMAL)
+        self.text.delete("1.0", tk.END)
+        self.text.config(state=tk.DISABLED)
+        self.insert_batch(0)
+
+    def insert_batch(self, start):
+        end = min(start + BATCH_LINES, len(self.shown))
+        if end > start:
+            self.text.config(state=tk.NORMAL)
+            chunk = "\n".join(self.shown[start:end])
+            self.text.insert(tk.END, chunk if start == 0 else "\n" + chunk)
+            self.text.config(state=tk.DISABLED)
+        if start == 0:
+            self.schedule_highlight()
+
+        total = len(self.lines)
+        if end < len(self.shown):
+            self.count_label.config(text=f"正在显示 {end} / {len(self.shown)} 行...")
+            self.insert_job = self.text.after(1, self.insert_batch, end)
+            return
+        self.insert_job = None
+        if self.query:
+            self.count_label.config(text=f"匹配 {len(self.shown)} / {total} 行")
+        else:
+            self.count_label.config(text=f"共 {total} 行")
+
+    def schedule_highlight(self):
+        if self.highlight_job is None:
+            self.highlight_job = self.text.after(HIGHLIGHT_DELAY_MS, self.highlight_visible)
+
+    def visible_range(self):
+        """当前可见的显示行号范围（含上下余量）"""
+        first = int(self.text.index("@0,0").split('.')[0])
+        last = int(self.text.index(f"@0,{self.text.winfo_height()}").split('.')[0])
+        return max(1, first - HIGHLIGHT_MARGIN), last + HIGHLIGHT_MARGIN
+
+    def highlight_visible(self):
+        """给可见区域中尚未着色的行着色"""
+        self.highlight_job = None
+        first, last = self.visible_range()
+        for lineno in range(first, min(last, len(self.shown)) + 1):
+            if lineno in self.highlighted:
+                continue
+            self.highlighted.add(lineno)
+            self.highlight_line(lineno, self.shown[lineno - 1])
+
+    def highlight_line(self, lineno, line):
+        code, hash_sign, _ = line.partition('#')
+        if hash_sign:
+            self.text.tag_add('comment', f"{lineno}.{len(code)}", f"{lineno}.end")
+        for index, match in enumerate(_TOKEN.finditer(code)):
+            self.text.tag_add('ip' if index == 0 else 'host',
+                              f"{lineno}.{match.start()}", f"{lineno}.{match.end()}")
+        if self.query:
+            lowered = line.lower()
+            position = lowered.find(self.query)
+            while position >= 0:
+                self.text.tag_add('match', f"{lineno}.{position}", f"{lineno}.{position + len(self.query)}")
+                position = lowered.find(self.query, position + len(self.query))
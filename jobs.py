@@ -0,0 +1,251 @@
+# jobs.py
+"""后台任务：耗时操作在工作线程中执行，进度、结果和错误交给主线程处理
+
+界面只能在主线程访问，执行器不直接调用回调，而是通过deliver（GithubFaster中为run_in_ui）
+把回调交给主线程，由root.after定时处理。
+    - 同一个key的任务正在执行时，再次提交会被拒绝（如连续点击"检查更新"）
+    - 任务可以取消：工作函数在适当的位置调用job.check()，或把job.cancel_event交给下载等函数；
+      取消后工作函数仍正常返回时，说明工作已经完成，按完成处理
+    - 超过deadline时立即通知界面超时，工作线程之后返回的结果会被丢弃
+    - 进度在主线程处理之前只保留最新的一次，后台报告再频繁也不会堆积
+工作线程为守护线程，关闭窗口时不会等待未完成的任务。
+"""
+import logging
+import queue
+import threading
+import time
+
+import tracing
+
+# 同时执行的任务数，超过时排队
+MAX_WORKERS = 4
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobTimeout(JobCancelled):
+    pass
+
+
+class Job:
+    """一个后台任务，工作函数以job为参数，返回值作为结果"""
+
+    def __init__(self, name, key=None, timeout=None):
+        self.name = name
+        self.key = key or name
+        self.state = PENDING
+        self.cancel_event = threading.Event()
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.result = None
+        self.error = None
+        self.started = None
+        self.finished = None
+        self.lock = threading.Lock()
+        self.pending_progress = None    # 尚未交给主线程的最新进度
+        self.fn = None
+        self.callbacks = (None, None, None)
+        self.deliver = None
+        self.on_progress = None
+        self.timer = None
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    @property
+    def active(self):
+        return self.state in (PENDING, RUNNING)
+
+    def cancel(self):
+        """请求取消，工作函数在下一次检查时停止"""
+        self.cancel_event.set()
+
+    def remaining(self):
+        """距离deadline的秒数，没有deadline时返回None"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        """在工作函数中调用：已取消或超时时抛出JobCancelled/JobTimeout"""
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise JobTimeout(f"{self.name}超时")
+        if self.cancel_event.is_set():
+            raise JobCancelled(f"{self.name}已取消")
+
+    def progress(self, *values):
+        """报告进度，参数原样传给on_progress；主线程处理之前的多次报告只保留最后一次"""
+        if self.on_progress is None:
+            return
+        with self.lock:
+            scheduled = self.pending_progress is not None
+            self.pending_progress = values
+        if not scheduled:
+            self.deliver(self._flush_progress)
+
+    def _flush_progress(self):
+        with self.lock:
+            values = self.pending_progress
+            self.pending_progress = None
+        # 超时或取消后不再显示进度；正常完成时结果之前的最后一次进度仍然显示
+        if values is not None and self.state not in (FAILED, CANCELLED):
+            self.on_progress(*values)
+
+    def _finish(self, state, result=None, error=None):
+        """记录结果，已经结束（如已超时）时返回False"""
+        with self.lock:
+            if not self.active:
+                return False
+            self.state = state
+            self.result = result
+            self.error = error
+            self.finished = time.monotonic()
+            return True
+
+
+class JobExecutor:
+    """固定数量的工作线程执行提交的任务，回调通过deliver在主线程执行"""
+
+    def __init__(self, deliver, max_workers=MAX_WORKERS):
+        self.deliver = deliver
+        self.max_workers = max_workers
+        self.queue = queue.Queue()
+        self.workers = []
+        self.busy = 0           # 正在执行任务的工作线程数
+        self.active = {}        # key -> 未结束（或工作线程仍未返回）的任务
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def submit(self, name, fn, key=None, timeout=None,
+               on_done=None, on_error=None, on_cancel=None, on_progress=None):
+        """提交任务，返回Job；同一key的任务正在执行时返回None
+
+        fn(job)在工作线程执行；结束后在主线程调用其中一个回调:
+            on_done(结果)  on_error(异常，超时为JobTimeout)  on_cancel()
+        没有on_cancel时取消不通知界面；没有on_error时错误只记录日志
+        """
+        job = Job(name, key, timeout)
+        job.deliver = self.deliver
+        job.on_progress = on_progress
+        job.callbacks = (on_done, on_error, on_cancel)
+        job.fn = fn
+        with self.lock:
+            if self.closed:
+                return None
+            if job.key in self.active:
+                logging.info(f"任务正在执行，忽略重复提交: {job.key}")
+                return None
+            self.active[job.key] = job
+            # 排队的任务会占用所有空闲线程时再增加线程
+            if len(self.workers) < self.max_workers and \
+                    self.queue.qsize() >= len(self.workers) - self.busy:
+                self._start_worker()
+        self.queue.put(job)
+
+        if timeout:
+            # 工作函数可能阻塞在网络请求中，到期时由计时器直接通知界面
+            job.timer = threading.Timer(timeout, self._expire, (job,))
+            job.timer.daemon = True
+            job.timer.start()
+        return job
+
+    def get(self, key):
+        with self.lock:
+            return self.active.get(key)
+
+    def is_running(self, key):
+        return self.get(key) is not None
+
+    def cancel(self, key):
+        """取消指定key的任务，返回是否有这个任务"""
+        job = self.get(key)
+        if job:
+            job.cancel()
+        return job is not None
+
+    def cancel_all(self):
+        with self.lock:
+            jobs = list(self.active.values())
+        for job in jobs:
+            job.cancel()
+
+    def shutdown(self):
+        """取消所有任务并停止工作线程（不等待正在执行的任务）"""
+        with self.lock:
+            self.closed = True
+            workers = len(self.workers)
+        self.cancel_all()
+        for _ in range(workers):
+            self.queue.put(None)
+
+    def _start_worker(self):
+        worker = threading.Thread(target=self._work, name=f"job-worker-{len(self.workers) + 1}", daemon=True)
+        self.workers.append(worker)
+        worker.start()
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            with self.lock:
+                self.busy += 1
+            try:
+                self._run(job)
+            finally:
+                with self.lock:
+                    self.busy -= 1
+                    if self.active.get(job.key) is job:
+                        del self.active[job.key]
+
+    def _run(self, job):
+        with job.lock:
+            if not job.active:
+                return
+            job.state = RUNNING
+            job.started = time.monotonic()
+        try:
+            job.check()
+            with tracing.span('job', job=job.name, key=job.key):
+                result = job.fn(job)
+        except JobTimeout as e:
+            self._complete(job, FAILED, error=e)
+        except Exception as e:
+            # 取消后工作函数抛出的异常（如下载的DownloadCancelled）都视为取消
+            if job.cancelled:
+                self._complete(job, CANCELLED)
+            else:
+                logging.error(f"后台任务失败({job.name}): {str(e)}")
+                self._complete(job, FAILED, error=e)
+        else:
+            # 工作函数正常返回时结果有效（如hosts已写入），即使期间请求过取消也按完成处理
+            self._complete(job, DONE, result=result)
+
+    def _expire(self, job):
+        if job.active:
+            logging.warning(f"后台任务超时: {job.name}")
+            job.cancel()
+            self._complete(job, FAILED, error=JobTimeout(f"{job.name}超时"))
+
+    def _complete(self, job, state, result=None, error=None):
+        if not job._finish(state, result, error):
+            return
+        if job.timer is not None:
+            job.timer.cancel()
+        on_done, on_error, on_cancel = job.callbacks
+        if state == DONE:
+            if on_done:
+                self.deliver(on_done, result)
+        elif state == CANCELLED:
+            if on_cancel:
+                self.deliver(on_cancel)
+        elif on_error:
+            self.deliver(on_error, error)
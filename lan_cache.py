@@ -0,0 +1,191 @@
+# lan_cache.py
+"""局域网缓存节点：只由一台机器访问上游获取并校验hosts，其他机器从该节点获取
+
+客户端在配置文件中设置 "lan_sources": ["http://节点IP:9466"] 后会优先使用节点，
+节点支持ETag，内容未变化时返回304。
+节点的 /release 提供本程序的最新版本信息（GitHub Release API格式），
+局域网内的机器检查更新时只消耗节点的API额度。
+"""
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import hosts_core
+import netprobe
+from daemon import jittered
+
+DEFAULT_PORT = 9466
+
+# URL路径 -> 配置名
+PATHS = {'/hosts': 'github', '/steam': 'steam'}
+
+
+class CacheNode:
+    """定时从上游获取hosts并缓存在内存中，获取失败时继续提供上一次的有效内容"""
+
+    def __init__(self, fetch, profiles, source="GitHub520", steam_source="GitMirror国内镜像",
+                 interval=1800, jitter=0.1, probe=False):
+        self.fetch = fetch          # fetch(profiles, source, steam_source) -> payloads
+        self.profiles = profiles
+        self.source = source
+        self.steam_source = steam_source
+        self.interval = interval
+        self.jitter = jitter
+        self.probe = probe
+        self.lock = threading.Lock()
+        self.entries = {}           # 配置名 -> {'content', 'etag', 'fetched', 'modified'}
+        self.requests = {'200': 0, '304': 0}
+        self.last_error = None
+        self.stop_event = threading.Event()
+        self.httpd = None
+        self.release_client = None
+
+    def refresh(self):
+        """从上游获取一次，只有校验（和可选的连通性探测）通过的内容才会替换缓存"""
+        try:
+            payloads = self.fetch(self.profiles, self.source, self.steam_source)
+        except Exception as e:
+            self.last_error = str(e)
+            logging.error(f"缓存节点获取上游失败: {str(e)}")
+            return False
+
+        if 'github' in payloads:
+            if not hosts_core.validate_hosts_content(payloads['github']):
+                self.last_error = "GitHub hosts内容不完整"
+                logging.warning("缓存节点获取的GitHub hosts内容不完整，继续使用旧内容")
+                payloads.pop('github')
+            elif self.probe:
+                reachable, tested = netprobe.probe_mapping(hosts_core.hosts_mapping(payloads['github']))
+                if tested and not reachable:
+                    self.last_error = "新hosts中的IP均无法连接"
+                    logging.warning("缓存节点获取的GitHub hosts中IP均无法连接，继续使用旧内容")
+                    payloads.pop('github')
+
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self.lock:
+            for name, content in payloads.items():
+                etag = hosts_core.content_etag(content)
+                entry = self.entries.get(name)
+                # 内容不变时保留原来的ETag和修改时间，客户端会得到304
+                if entry and entry['etag'] == etag:
+                    entry['fetched'] = now
+                    continue
+                self.entries[name] = {'content': content, 'etag': etag, 'fetched': now,
+                                      'modified': time.time()}
+        if payloads:
+            self.last_error = None
+        return bool(payloads)
+
+    def get(self, name):
+        with self.lock:
+            return self.entries.get(name)
+
+    def status(self):
+        with self.lock:
+            return {
+                'profiles': self.profiles,
+                'source': self.source,
+                'interval': self.interval,
+                'entries': {name: {'etag': entry['etag'], 'fetched': entry['fetched'],
+                                   'entries': hosts_core.count_entries(entry['content'])}
+                            for name, entry in self.entries.items()},
+                'requests': dict(self.requests),
+                'last_error': self.last_error,
+            }
+
+    def release(self):
+        """最新版本信息，返回 (JSON内容, ETag)；节点自己不再使用局域网缓存"""
+        from release_client import ReleaseClient
+
+        if self.release_client is None:
+            self.release_client = ReleaseClient()
+        release, source = self.release_client.latest()
+        content = json.dumps(release, ensure_ascii=False)
+        return content, hosts_core.content_etag(content)
+
+    def count_request(self, status):
+        with self.lock:
+            self.requests[status] += 1
+
+    def make_handler(self):
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path == '/status':
+                    body = json.dumps(node.status(), ensure_ascii=False, indent=2).encode('utf-8')
+                    self.send_body(body, 'application/json; charset=utf-8')
+                    return
+                if path == '/release':
+                    try:
+                        content, etag = node.release()
+                    except Exception as e:
+                        logging.warning(f"缓存节点获取版本信息失败: {str(e)}")
+                        self.send_error(503, explain="无法获取版本信息")
+                        return
+                    entry = {'content': content, 'etag': etag, 'modified': None}
+                    content_type = 'application/json; charset=utf-8'
+                elif path in PATHS:
+                    entry = node.get(PATHS[path])
+                    if entry is None:
+                        self.send_error(503, explain="尚未获取到内容")
+                        return
+                    content_type = 'text/plain; charset=utf-8'
+                else:
+                    self.send_error(404)
+                    return
+
+                if self.headers.get('If-None-Match') == entry['etag']:
+                    node.count_request('304')
+                    self.send_response(304)
+                    self.send_header('ETag', entry['etag'])
+                    self.end_headers()
+                    return
+
+                node.count_request('200')
+                self.send_body(entry['content'].encode('utf-8'), content_type,
+                               entry['etag'], entry['modified'])
+
+            def send_body(self, body, content_type, etag=None, modified=None):
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'no-cache')
+                if etag:
+                    self.send_header('ETag', etag)
+                if modified:
+                    self.send_header('Last-Modified', self.date_time_string(modified))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.debug("%s - %s" % (self.address_string(), format % args))
+
+        return Handler
+
+    def refresh_loop(self):
+        while not self.stop_event.wait(jittered(self.interval, self.jitter)):
+            self.refresh()
+
+    def start(self, host='0.0.0.0', port=DEFAULT_PORT):
+        """首次获取后启动HTTP服务和后台刷新线程"""
+        self.refresh()
+        self.httpd = ThreadingHTTPServer((host, port), self.make_handler())
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        threading.Thread(target=self.refresh_loop, daemon=True).start()
+        return self
+
+    @property
+    def address(self):
+        return self.httpd.server_address
+
+    def stop(self):
+        self.stop_event.set()
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
@@ -0,0 +1,128 @@
+# line_index.py
+"""大文件按行随机访问：内存映射文件，在后台线程中建立行偏移索引
+
+查看器只需要读取当前可见的几十行，查找和按域名跳转直接在映射的字节上进行，
+不需要把整个文件解码成字符串。
+"""
+import bisect
+import mmap
+import re
+import threading
+from array import array
+
+# 建立索引时每次处理的字节数，处理完一块后更新一次可见的行数
+INDEX_CHUNK = 1024 * 1024
+
+
+class LineIndex:
+    """source为文件路径（内存映射）或已在内存中的bytes"""
+
+    def __init__(self, source):
+        self._file = None
+        if isinstance(source, (bytes, bytearray)):
+            self.data = bytes(source)
+        else:
+            self._file = open(source, 'rb')
+            try:
+                self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # 空文件无法映射
+                self.data = b''
+        self.size = len(self.data)
+        self.offsets = array('Q', [0])   # 每行起始位置
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.cancelled = False
+        self.thread = None
+
+    def build(self):
+        """扫描换行符建立索引，可在后台线程中调用"""
+        newline = re.compile(b'\n')
+        position = 0
+        while position < self.size and not self.cancelled:
+            end = min(self.size, position + INDEX_CHUNK)
+            chunk = array('Q', (match.end() + position
+                                for match in newline.finditer(self.data[position:end])))
+            # 文件以换行结尾时最后一个偏移等于文件大小，不算作新的一行
+            if chunk and chunk[-1] == self.size:
+                chunk.pop()
+            with self.lock:
+                self.offsets.extend(chunk)
+            position = end
+        self.done.set()
+        return self
+
+    def start(self):
+        self.thread = threading.Thread(target=self.build, daemon=True)
+        self.thread.start()
+        return self
+
+    @property
+    def line_count(self):
+        """已建立索引的行数（索引完成前会继续增长）"""
+        with self.lock:
+            return len(self.offsets) if self.size else 0
+
+    def _span(self, lineno):
+        with self.lock:
+            start = self.offsets[lineno]
+            end = self.offsets[lineno + 1] if lineno + 1 < len(self.offsets) else None
+        if end is None:
+            # 最后一行（或索引尚未到达的下一行）
+            end = self.data.find(b'\n', start)
+            end = self.size if end < 0 else end + 1
+        return start, end
+
+    def line(self, lineno):
+        """读取第lineno行（从0开始），不含换行符"""
+        start, end = self._span(lineno)
+        return self.data[start:end].rstrip(b'\r\n').decode('utf-8', errors='replace')
+
+    def lines(self, first, count):
+        """读取从first开始的最多count行"""
+        last = min(first + count, self.line_count)
+        if first >= last:
+            return []
+        start = self._span(first)[0]
+        end = self._span(last - 1)[1]
+        text = self.data[start:end].decode('utf-8', errors='replace')
+        return [line.rstrip('\r') for line in text.split('\n')[:last - first]]
+
+    def line_of(self, offset):
+        """返回字节偏移所在的行号，索引尚未到达时等待索引完成"""
+        with self.lock:
+            indexed = self.offsets[-1]
+        if offset >= indexed and not self.done.is_set():
+            self.done.wait()
+        with self.lock:
+            return bisect.bisect_right(self.offsets, offset) - 1
+
+    def search(self, text, start_line=0):
+        """从start_line开始查找包含text的行（不区分大小写），找不到时从头查找，返回行号或None"""
+        pattern = re.compile(re.escape(text.encode('utf-8')), re.IGNORECASE)
+        return self._find(pattern, start_line)
+
+    def find_domain(self, domain, start_line=0):
+        """查找映射了domain的行（域名作为完整的单词出现，不匹配注释中的内容）"""
+        pattern = re.compile(rb'^[ \t]*[^#\s]+[ \t]+(?:[^#\s]+[ \t]+)*'
+                             + re.escape(domain.strip().lower().encode('utf-8')) + rb'(?=\s|#|$)',
+                             re.IGNORECASE | re.MULTILINE)
+        return self._find(pattern, start_line)
+
+    def _find(self, pattern, start_line):
+        if not self.size:
+            return None
+        start = self._span(min(start_line, self.line_count - 1))[0] if start_line else 0
+        match = pattern.search(self.data, start) or (start and pattern.search(self.data, 0, start))
+        if not match:
+            return None
+        return self.line_of(match.start())
+
+    def close(self):
+        self.cancelled = True
+        if self.thread:
+            self.thread.join()
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        if self._file:
+            self._file.close()
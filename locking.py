@@ -0,0 +1,88 @@
+# locking.py
+"""跨进程文件锁，进程退出时由系统自动释放，不会留下失效的锁"""
+import os
+import time
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+
+class LockError(Exception):
+    """锁已被其他进程持有"""
+
+
+class FileLock:
+    """基于文件的互斥锁，持有期间在文件中写入当前进程的PID"""
+
+    def __init__(self, path, timeout=0):
+        self.path = path
+        self.timeout = timeout
+        self.fd = None
+
+    def _try_lock(self):
+        try:
+            if os.name == 'nt':
+                msvcrt.locking(self.fd, msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self, timeout=None):
+        """获取锁，timeout秒内未获取到时抛出LockError（0表示不等待）"""
+        timeout = self.timeout if timeout is None else timeout
+        if self.fd is not None:
+            return self
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+
+        deadline = time.monotonic() + timeout
+        while not self._try_lock():
+            if time.monotonic() >= deadline:
+                os.close(self.fd)
+                self.fd = None
+                owner = self.owner_pid()
+                raise LockError(f"锁已被进程 {owner or '未知'} 持有: {self.path}")
+            time.sleep(0.1)
+
+        # Windows锁定的是第一个字节，PID写在其后
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        os.ftruncate(self.fd, 0)
+        os.write(self.fd, f" {os.getpid()}\n".encode('ascii'))
+        return self
+
+    def release(self):
+        """释放锁"""
+        if self.fd is None:
+            return
+        try:
+            os.ftruncate(self.fd, 0)
+            if os.name == 'nt':
+                os.lseek(self.fd, 0, os.SEEK_SET)
+                msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+        except OSError:
+            pass
+        finally:
+            os.close(self.fd)
+            self.fd = None
+
+    def owner_pid(self):
+        """读取锁文件中记录的PID，读取失败返回None"""
+        try:
+            with open(self.path, 'r', encoding='ascii') as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
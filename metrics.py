@@ -0,0 +1,288 @@
+# metrics.py
+"""OpenMetrics/Prometheus 指标导出，可选启动本地HTTP端点供监控系统抓取"""
+import math
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# 延迟类直方图的默认分桶(秒)
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    """转义标签值"""
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    """格式化标签，如 {domain="github.com",phase="tcp"}"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    """格式化数值，整数不带小数点"""
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if value.is_integer():
+            return str(int(value))
+        return repr(value)
+    return str(value)
+
+
+class Metric:
+    """指标基类，按标签值保存各时间序列"""
+
+    metric_type = 'unknown'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """返回 (后缀, 标签值, 附加标签, 数值) 列表"""
+        raise NotImplementedError
+
+    def render(self):
+        """生成该指标的OpenMetrics文本"""
+        lines = [f"# TYPE {self.name} {self.metric_type}",
+                 f"# HELP {self.name} {self.documentation}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, values, extra)} "
+                         f"{_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """只增不减的计数器"""
+
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [('_total', key, None, value) for key, value in sorted(self.series.items())]
+
+
+class Gauge(Metric):
+    """可任意设置的数值；也可以设置回调函数在抓取时计算"""
+
+    metric_type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.function = None
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = value
+
+    def set_function(self, function):
+        """抓取时调用function()获取数值（仅限无标签指标）"""
+        self.function = function
+
+    def samples(self):
+        if self.function is not None:
+            try:
+                return [('', (), None, self.function())]
+            except Exception:
+                return []
+        with self.lock:
+            return [('', key, None, value) for key, value in sorted(self.series.items())]
+
+
+class Histogram(Metric):
+    """累积分桶直方图"""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            counts, total = self.series.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.series[key] = (counts, total + value)
+
+    def samples(self):
+        result = []
+        with self.lock:
+            for key, (counts, total) in sorted(self.series.items()):
+                for bound, count in zip(self.buckets, counts):
+                    result.append(('_bucket', key, f'le="{_format_value(float(bound))}"', count))
+                result.append(('_count', key, None, counts[-1]))
+                result.append(('_sum', key, None, total))
+        return result
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """生成完整的OpenMetrics文本（以 # EOF 结尾）"""
+        with self.lock:
+            metrics = list(self.metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+PROBE_LATENCY = REGISTRY.register(Gauge(
+    'githubfaster_probe_latency_seconds', "Latest per-phase connection latency per domain",
+    ('domain', 'phase')))
+PROBE_LATENCY_HISTOGRAM = REGISTRY.register(Histogram(
+    'githubfaster_probe_phase_seconds', "Per-phase connection latency per domain",
+    ('domain', 'phase')))
+PROBE_FAILURES = REGISTRY.register(Counter(
+    'githubfaster_probe_failures', "Connection probes that failed, by phase",
+    ('domain', 'phase')))
+BENCHMARK_THROUGHPUT = REGISTRY.register(Gauge(
+    'githubfaster_benchmark_throughput_bytes_per_second', "Latest download benchmark throughput",
+    ('host',)))
+FETCH_DURATION = REGISTRY.register(Histogram(
+    'githubfaster_fetch_duration_seconds', "Time to fetch a hosts source, including retries",
+    ('source',)))
+FETCH_RETRIES = REGISTRY.register(Counter(
+    'githubfaster_fetch_retries', "Retried fetch attempts in fetch_with_retry",
+    ('source',)))
+FETCH_FAILURES = REGISTRY.register(Counter(
+    'githubfaster_fetch_failures', "Fetches that failed after all retries",
+    ('source',)))
+HOSTS_APPLIES = REGISTRY.register(Counter(
+    'githubfaster_hosts_applies', "Hosts file writes, by operation type",
+    ('type',)))
+HOSTS_APPLY_TIMESTAMP = REGISTRY.register(Gauge(
+    'githubfaster_hosts_last_apply_timestamp_seconds', "Unix time of the last hosts file write",
+    ('type',)))
+HOSTS_APPLY_CHANGES = REGISTRY.register(Gauge(
+    'githubfaster_hosts_last_apply_entries', "Entries written by the last hosts file write",
+    ('type',)))
+BACKUP_DIR_BYTES = REGISTRY.register(Gauge(
+    'githubfaster_backup_directory_bytes', "Total size of the backup directory"))
+
+
+def source_of(url):
+    """用URL的主机名作为source标签"""
+    return urlparse(url).hostname or url
+
+
+def observe_phase_results(results):
+    """记录netprobe分阶段诊断结果"""
+    for result in results:
+        for phase in ('resolve', 'tcp', 'tls', 'ttfb'):
+            value = result.get(f'{phase}_ms')
+            if value is None:
+                continue
+            PROBE_LATENCY.set(value / 1000.0, domain=result['domain'], phase=phase)
+            PROBE_LATENCY_HISTOGRAM.observe(value / 1000.0, domain=result['domain'], phase=phase)
+        if result.get('failed_phase'):
+            PROBE_FAILURES.inc(domain=result['domain'], phase=result['failed_phase'])
+
+
+def observe_benchmark(result):
+    """记录下载测速结果"""
+    if result.get('throughput_kbps') is not None:
+        BENCHMARK_THROUGHPUT.set(result['throughput_kbps'] * 1024, host=source_of(result['url']))
+
+
+def record_hosts_apply(apply_type, entries):
+    """记录一次hosts写入（更新/Steam更新/恢复）"""
+    HOSTS_APPLIES.inc(type=apply_type)
+    HOSTS_APPLY_TIMESTAMP.set(time.time(), type=apply_type)
+    HOSTS_APPLY_CHANGES.set(entries, type=apply_type)
+
+
+def directory_size(path):
+    """计算目录下所有文件的总大小"""
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+
+class MetricsServer:
+    """在本地端口提供 /metrics 的HTTP服务，运行在后台线程
+
+    routes可以添加其他路径，值为返回 (Content-Type, 字节内容) 的函数
+    """
+
+    def __init__(self, host='127.0.0.1', port=9464, registry=REGISTRY, routes=None):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        handlers = {'/metrics': lambda: (CONTENT_TYPE, registry.render().encode('utf-8'))}
+        handlers.update(routes or {})
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                handler = handlers.get(self.path.split('?', 1)[0])
+                if handler is None:
+                    self.send_error(404)
+                    return
+                content_type, body = handler()
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def address(self):
+        """实际监听的 (host, port)，port为0时可用来获取分配的端口"""
+        return self.httpd.server_address
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,346 @@
+# netprobe.py
+"""分阶段连接耗时测量（解析/TCP/TLS/首字节），类似 curl -w 的输出"""
+import json
+import os
+import random
+import socket
+import struct
+import time
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import tracing
+
+# 各阶段的红绿灯阈值(毫秒)：(绿色上限, 黄色上限)，超过黄色上限为红色
+PHASE_THRESHOLDS = {
+    'resolve_ms': (50, 200),
+    'tcp_ms': (100, 300),
+    'tls_ms': (300, 800),
+    'ttfb_ms': (500, 1500),
+}
+
+# 没有hosts数据时默认诊断的域名
+DEFAULT_DOMAINS = [
+    'github.com',
+    'api.github.com',
+    'raw.githubusercontent.com',
+    'objects.githubusercontent.com',
+    'github.githubassets.com',
+]
+
+LEVEL_ORDER = ['green', 'yellow', 'red']
+
+# ping连通性诊断的目标
+DIAGNOSIS_TARGETS = ['github.com', 'raw.githubusercontent.com', '8.8.8.8']
+
+# 判断网络是否可用时尝试连接的地址（公共DNS的TCP 53端口）
+CONNECTIVITY_TARGETS = [('223.5.5.5', 53), ('114.114.114.114', 53), ('8.8.8.8', 53)]
+
+
+def _elapsed_ms(start):
+    """计算从start到现在的毫秒数"""
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+@tracing.traced('probe.dns', 'domain', 'server')
+def query_dns(domain, server, timeout=3):
+    """直接向指定DNS服务器查询A记录（绕过hosts文件），返回 (IP列表, 耗时ms)"""
+    txid = random.randint(0, 0xFFFF)
+    header = struct.pack('>HHHHHH', txid, 0x0100, 1, 0, 0, 0)
+    qname = b''.join(bytes([len(label)]) + label.encode('ascii')
+                     for label in domain.rstrip('.').split('.')) + b'\x00'
+    packet = header + qname + struct.pack('>HH', 1, 1)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(timeout)
+    try:
+        start = time.perf_counter()
+        sock.sendto(packet, (server, 53))
+        data, _ = sock.recvfrom(2048)
+        elapsed = _elapsed_ms(start)
+    finally:
+        sock.close()
+
+    if len(data) < 12 or struct.unpack('>H', data[:2])[0] != txid:
+        raise ValueError("DNS响应无效")
+
+    answer_count = struct.unpack('>H', data[6:8])[0]
+    offset = 12 + len(qname) + 4
+    ips = []
+    for _ in range(answer_count):
+        # 跳过名称字段（可能是压缩指针）
+        if data[offset] & 0xC0 == 0xC0:
+            offset += 2
+        else:
+            while data[offset] != 0:
+                offset += data[offset] + 1
+            offset += 1
+        rtype, _, _, rdlength = struct.unpack('>HHIH', data[offset:offset + 10])
+        offset += 10
+        if rtype == 1 and rdlength == 4:
+            ips.append(socket.inet_ntoa(data[offset:offset + 4]))
+        offset += rdlength
+    return ips, elapsed
+
+
+@tracing.traced('probe.ping', 'target')
+def ping(target, count=3):
+    """使用系统ping命令测试连通性，返回是否可达"""
+    import subprocess
+
+    param = '-n' if os.name == 'nt' else '-c'
+    result = subprocess.run(['ping', param, str(count), target],
+                            capture_output=True, text=True)
+    return result.returncode == 0
+
+
+@tracing.traced('probe.tcp', 'ip', 'port')
+def tcp_connect_ms(ip, port=443, timeout=3):
+    """测量到指定IP的TCP连接耗时(ms)，连接失败返回None"""
+    try:
+        start = time.perf_counter()
+        with socket.create_connection((ip, port), timeout=timeout):
+            return _elapsed_ms(start)
+    except OSError:
+        return None
+
+
+def probe_mapping(mapping, max_domains=5, timeout=3):
+    """测试hosts映射中主要域名的IP能否建立TCP连接，返回 (可用数, 测试数)"""
+    domains = [domain for domain in DEFAULT_DOMAINS if domain in mapping][:max_domains]
+    reachable = sum(1 for domain in domains
+                    if tcp_connect_ms(mapping[domain], 443, timeout) is not None)
+    return reachable, len(domains)
+
+
+@tracing.traced('probe.rank', 'hostname')
+def rank_ips(hostname, hosts_map=None, dns_servers=None, limit=4, port=443, timeout=3):
+    """收集域名的候选IP（系统解析、hosts映射、公共DNS）并按TCP连接耗时排序，返回最快的limit个
+
+    hostname本身是IP时直接返回；所有候选都无法连接时返回空列表
+    """
+    try:
+        socket.inet_aton(hostname)
+        return [hostname]
+    except OSError:
+        pass
+
+    candidates = []
+    if hosts_map and hosts_map.get(hostname):
+        candidates.append(hosts_map[hostname])
+    try:
+        candidates += [info[4][0] for info in socket.getaddrinfo(hostname, port, socket.AF_INET)]
+    except OSError:
+        pass
+    for server in dns_servers or [target for target, _ in CONNECTIVITY_TARGETS]:
+        try:
+            candidates += query_dns(hostname, server, timeout=timeout)[0]
+        except Exception:
+            continue
+    candidates = list(dict.fromkeys(candidates))
+    if not candidates:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(16, len(candidates))) as executor:
+        latencies = list(executor.map(lambda ip: tcp_connect_ms(ip, port, timeout), candidates))
+    ranked = sorted((ms, ip) for ip, ms in zip(candidates, latencies) if ms is not None)
+    return [ip for _, ip in ranked[:limit]]
+
+
+def network_available(targets=None, timeout=3):
+    """任一目标可以建立TCP连接即认为网络可用"""
+    return any(tcp_connect_ms(host, port, timeout) is not None
+               for host, port in (targets or CONNECTIVITY_TARGETS))
+
+
+def phase_level(phase, value):
+    """根据阈值返回单个阶段的红绿灯等级"""
+    if value is None:
+        return None
+    green, yellow = PHASE_THRESHOLDS[phase]
+    if value <= green:
+        return 'green'
+    if value <= yellow:
+        return 'yellow'
+    return 'red'
+
+
+def overall_level(result):
+    """取所有阶段中最差的等级，任一阶段失败即为红色"""
+    if result.get('error'):
+        return 'red'
+    levels = [phase_level(phase, result.get(phase)) for phase in PHASE_THRESHOLDS]
+    levels = [level for level in levels if level]
+    if not levels:
+        return 'red'
+    return max(levels, key=LEVEL_ORDER.index)
+
+
+@tracing.traced('probe.phases', 'domain')
+def measure_phases(domain, hosts_map=None, dns_server=None, port=443, timeout=5):
+    """测量单个域名各阶段耗时，每个阶段记录的是该阶段自身的耗时"""
+    import ssl  # 延迟导入，加快程序启动
+
+    result = {
+        'domain': domain,
+        'source': 'hosts' if hosts_map and domain in hosts_map else 'dns',
+        'ip': None,
+        'dns_ip': None,
+        'dns_query_ms': None,
+        'resolve_ms': None,
+        'tcp_ms': None,
+        'tls_ms': None,
+        'ttfb_ms': None,
+        'failed_phase': None,
+        'error': None,
+    }
+
+    phase = 'resolve'
+    try:
+        # 系统解析（会先查hosts文件）
+        start = time.perf_counter()
+        infos = socket.getaddrinfo(domain, port, socket.AF_INET, socket.SOCK_STREAM)
+        result['resolve_ms'] = _elapsed_ms(start)
+        ip = infos[0][4][0]
+        result['ip'] = ip
+
+        # 对比：直接查询DNS服务器的结果，查询失败不影响后续阶段
+        if dns_server:
+            try:
+                dns_ips, dns_ms = query_dns(domain, dns_server, timeout=min(timeout, 3))
+                result['dns_ip'] = dns_ips[0] if dns_ips else None
+                result['dns_query_ms'] = dns_ms
+            except Exception:
+                pass
+
+        phase = 'tcp'
+        start = time.perf_counter()
+        sock = socket.create_connection((ip, port), timeout=timeout)
+        result['tcp_ms'] = _elapsed_ms(start)
+
+        try:
+            phase = 'tls'
+            context = ssl.create_default_context()
+            start = time.perf_counter()
+            sock = context.wrap_socket(sock, server_hostname=domain)
+            result['tls_ms'] = _elapsed_ms(start)
+
+            phase = 'ttfb'
+            request = (f"GET / HTTP/1.1\r\nHost: {domain}\r\n"
+                       f"User-Agent: GithubFaster\r\nConnection: close\r\n\r\n")
+            start = time.perf_counter()
+            sock.sendall(request.encode('ascii'))
+            if not sock.recv(1):
+                raise ConnectionError("服务器未返回数据")
+            result['ttfb_ms'] = _elapsed_ms(start)
+        finally:
+            sock.close()
+
+    except Exception as e:
+        result['failed_phase'] = phase
+        result['error'] = str(e) or type(e).__name__
+
+    result['level'] = overall_level(result)
+    return result
+
+
+def diagnose_domains(domains, hosts_map=None, dns_server=None, timeout=5, max_workers=8):
+    """并发测量多个域名，结果顺序与输入一致"""
+    if not domains:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(domains))) as executor:
+        return list(executor.map(
+            lambda domain: measure_phases(domain, hosts_map, dns_server, timeout=timeout),
+            domains))
+
+
+def export_results(results, path):
+    """导出诊断结果为JSON文件"""
+    report = {
+        'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'thresholds': PHASE_THRESHOLDS,
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+@tracing.traced('probe.benchmark', 'url')
+def benchmark_download(url, max_bytes=5 * 1024 * 1024, timeout=15):
+    """下载测试对象测量吞吐量和首字节延迟，最多下载max_bytes字节"""
+    import urllib.request
+
+    result = {
+        'url': url,
+        'ip': None,
+        'bytes': 0,
+        'seconds': None,
+        'ttfb_ms': None,
+        'throughput_kbps': None,
+        'error': None,
+    }
+    try:
+        # 记录测速时实际使用的IP，便于按IP统计
+        try:
+            hostname = urlparse(url).hostname
+            result['ip'] = socket.getaddrinfo(hostname, 443, socket.AF_INET)[0][4][0]
+        except Exception:
+            pass
+
+        request = urllib.request.Request(url, headers={'User-Agent': 'GithubFaster',
+                                                       'Cache-Control': 'no-cache'})
+        start = time.perf_counter()
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            chunk = response.read(1)
+            result['ttfb_ms'] = _elapsed_ms(start)
+            received = len(chunk)
+            while chunk and received < max_bytes:
+                chunk = response.read(64 * 1024)
+                received += len(chunk)
+        seconds = time.perf_counter() - start
+        result['bytes'] = received
+        result['seconds'] = round(seconds, 3)
+        if seconds > 0:
+            result['throughput_kbps'] = round(received / 1024 / seconds, 1)
+    except Exception as e:
+        result['error'] = str(e) or type(e).__name__
+    return result
+
+
+def compare_benchmarks(before, after):
+    """计算更新前后的吞吐量与延迟变化"""
+    comparison = {
+        'url': after.get('url') or before.get('url'),
+        'before': before,
+        'after': after,
+        'throughput_change_pct': None,
+        'ttfb_change_ms': None,
+    }
+    if before.get('throughput_kbps') and after.get('throughput_kbps') is not None:
+        comparison['throughput_change_pct'] = round(
+            (after['throughput_kbps'] - before['throughput_kbps']) / before['throughput_kbps'] * 100, 1)
+    if before.get('ttfb_ms') is not None and after.get('ttfb_ms') is not None:
+        comparison['ttfb_change_ms'] = round(after['ttfb_ms'] - before['ttfb_ms'], 1)
+    return comparison
+
+
+def format_comparison(comparison):
+    """将测速对比结果格式化为一行文字"""
+    before, after = comparison['before'], comparison['after']
+
+    def speed(result):
+        if result.get('error'):
+            return "失败"
+        return f"{result['throughput_kbps']:.0f} KB/s"
+
+    def latency(result):
+        return "-" if result.get('ttfb_ms') is None else f"{result['ttfb_ms']:.0f}ms"
+
+    text = f"速度 {speed(before)} → {speed(after)}"
+    if comparison['throughput_change_pct'] is not None:
+        text += f" ({comparison['throughput_change_pct']:+.0f}%)"
+    text += f"，首字节 {latency(before)} → {latency(after)}"
+    if comparison['ttfb_change_ms'] is not None:
+        text += f" ({comparison['ttfb_change_ms']:+.0f}ms)"
+    return text
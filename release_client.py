@@ -0,0 +1,237 @@
+# release_client.py
+"""GitHub Release API客户端：缓存最新版本信息，限制检查频率，遵守API限额
+
+未认证的API请求每个IP每小时只有60次，同一出口IP后面有很多机器时很快就会用完。
+    - 缓存上一次的结果和ETag，再次检查时发送 If-None-Match，未变化时返回304（不计入限额）
+    - 距上次检查不到 MIN_CHECK_INTERVAL 秒时直接使用缓存
+    - 记录 X-RateLimit-* 响应头，额度用完后在重置时间之前不再请求API
+    - 被限流或无法访问API时，依次尝试局域网缓存节点、配置的镜像、本地缓存，
+      最后从 github.com/<仓库>/releases/latest 的跳转中取得最新版本号
+设置环境变量 GITHUB_TOKEN 时使用认证请求（每小时5000次）。
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import hosts_core
+from config_store import read_config, write_config
+
+DEFAULT_REPO = "2489742701/GithubFasterChina"
+
+# 保存在配置文件旁边（打包的单文件程序运行时APP_DIR是退出时删除的临时目录）
+CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(hosts_core.CONFIG_FILE)), "release_cache.json")
+
+API_URL = "https://api.github.com/repos/{repo}/releases/latest"
+LATEST_PAGE_URL = "https://github.com/{repo}/releases/latest"
+
+# 两次访问API的最小间隔(秒)
+MIN_CHECK_INTERVAL = 600
+
+# 剩余额度不超过这个数时只用缓存和备用来源，给同一出口IP后的其他机器留一些
+RESERVE_REQUESTS = 2
+
+USER_AGENT = 'GithubFaster'
+
+# 版本信息的来源 -> 显示名称
+SOURCE_NAMES = {
+    'api': "GitHub API",
+    'not_modified': "GitHub API（未变化）",
+    'cache': "本地缓存",
+    'lan': "局域网缓存节点",
+    'mirror': "镜像",
+    'stale': "本地缓存（可能已过期）",
+    'redirect': "GitHub发布页面",
+}
+
+
+class ReleaseError(Exception):
+    pass
+
+
+def parse_rate_limit(headers, now=None):
+    """解析 X-RateLimit-Limit/Remaining/Reset 和 Retry-After，没有这些头时返回None"""
+    remaining = headers.get('X-RateLimit-Remaining')
+    retry_after = headers.get('Retry-After')
+    if remaining is None and retry_after is None:
+        return None
+    now = now or time.time()
+    rate = {'checked': now}
+    try:
+        if remaining is not None:
+            rate['remaining'] = int(remaining)
+            rate['limit'] = int(headers.get('X-RateLimit-Limit') or 0)
+            rate['reset'] = int(headers.get('X-RateLimit-Reset') or 0)
+        if retry_after is not None and retry_after.isdigit():
+            # 次级限流：在Retry-After秒内不再请求
+            rate['remaining'] = 0
+            rate['reset'] = max(rate.get('reset', 0), int(now) + int(retry_after))
+    except ValueError:
+        return None
+    return rate
+
+
+def rate_limited(rate, now=None):
+    """按记录的额度判断现在是否应当避免请求API"""
+    if not rate or 'remaining' not in rate:
+        return False
+    now = now or time.time()
+    return rate['remaining'] <= RESERVE_REQUESTS and now < rate.get('reset', 0)
+
+
+class ReleaseClient:
+    """获取仓库的最新发布信息；可在多个线程中使用，同时只会有一个请求"""
+
+    def __init__(self, repo=DEFAULT_REPO, cache_file=CACHE_FILE, min_interval=MIN_CHECK_INTERVAL,
+                 lan_urls=(), mirrors=(), timeout=10):
+        self.repo = repo
+        self.cache_file = cache_file
+        self.min_interval = min_interval
+        self.lan_urls = list(lan_urls)      # 局域网缓存节点地址，如 http://192.168.1.10:9466
+        self.mirrors = list(mirrors)        # 返回与API相同JSON的地址，{repo}会替换为仓库名
+        self.timeout = timeout
+        self.lock = threading.Lock()
+
+    @property
+    def api_url(self):
+        return API_URL.format(repo=self.repo)
+
+    def _load_cache(self):
+        return read_config(self.cache_file)
+
+    def _save_cache(self, cache):
+        try:
+            write_config(self.cache_file, cache)
+        except OSError as e:
+            logging.warning(f"保存版本信息缓存失败: {str(e)}")
+
+    def latest(self, force=False):
+        """返回 (发布信息, 来源)，发布信息为API格式的dict；所有来源都不可用时抛出ReleaseError
+
+        force为True时忽略最小检查间隔（仍然使用ETag条件请求）
+        """
+        with self.lock:
+            cache = self._load_cache()
+            entry = cache.get(self.repo) or {}
+            rate = cache.get('rate_limit')
+            now = time.time()
+
+            if entry.get('release') and not force and now - entry.get('checked', 0) < self.min_interval:
+                return entry['release'], 'cache'
+
+            errors = []
+            if rate_limited(rate, now):
+                reset = time.strftime("%H:%M:%S", time.localtime(rate['reset']))
+                logging.info(f"GitHub API额度已用完，{reset}之前使用备用来源")
+                errors.append(f"API额度已用完（{reset}重置）")
+            else:
+                try:
+                    release, source = self._fetch_api(cache, entry)
+                    self._save_cache(cache)
+                    return release, source
+                except Exception as e:
+                    # 失败时也可能带回了新的额度信息
+                    self._save_cache(cache)
+                    logging.warning(f"从GitHub API获取版本信息失败: {str(e)}")
+                    errors.append(str(e))
+
+            for source, fetch in (('lan', self._fetch_lan), ('mirror', self._fetch_mirror)):
+                try:
+                    release = fetch()
+                except Exception as e:
+                    logging.warning(f"从备用来源获取版本信息失败({source}): {str(e)}")
+                    errors.append(str(e))
+                    continue
+                if release:
+                    return release, source
+
+            if entry.get('release'):
+                return entry['release'], 'stale'
+
+            try:
+                return self._fetch_redirect(), 'redirect'
+            except Exception as e:
+                errors.append(str(e))
+            raise ReleaseError("无法获取最新版本信息: " + "；".join(errors))
+
+    def _fetch_api(self, cache, entry):
+        headers = {'User-Agent': USER_AGENT, 'Accept': 'application/vnd.github+json'}
+        token = os.environ.get('GITHUB_TOKEN')
+        if token:
+            headers['Authorization'] = f"Bearer {token}"
+        if entry.get('etag') and entry.get('release'):
+            headers['If-None-Match'] = entry['etag']
+
+        request = urllib.request.Request(self.api_url, headers=headers)
+        now = time.time()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                rate = parse_rate_limit(response.headers, now)
+                release = json.loads(response.read().decode('utf-8'))
+                etag = response.headers.get('ETag')
+        except urllib.error.HTTPError as e:
+            rate = parse_rate_limit(e.headers, now)
+            if rate:
+                cache['rate_limit'] = rate
+            if e.code == 304:
+                entry['checked'] = now
+                cache[self.repo] = entry
+                return entry['release'], 'not_modified'
+            if e.code in (403, 429) and rate and rate.get('remaining') == 0:
+                raise ReleaseError(f"GitHub API请求被限流(HTTP {e.code})")
+            raise
+
+        if rate:
+            cache['rate_limit'] = rate
+        if not isinstance(release, dict) or 'tag_name' not in release:
+            raise ReleaseError("GitHub API返回的内容无效")
+        cache[self.repo] = {'release': release, 'etag': etag, 'checked': now}
+        return release, 'api'
+
+    def _fetch_lan(self):
+        """局域网缓存节点的 /release 由节点统一访问API，整个局域网只消耗节点的额度"""
+        for base_url in self.lan_urls:
+            try:
+                release = json.loads(hosts_core.fetch_from_lan(base_url, 'release'))
+            except Exception as e:
+                logging.info(f"局域网缓存节点无版本信息: {base_url} {str(e)}")
+                continue
+            if isinstance(release, dict) and 'tag_name' in release:
+                return release
+        return None
+
+    def _fetch_mirror(self):
+        for template in self.mirrors:
+            url = template.format(repo=self.repo)
+            request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    release = json.loads(response.read().decode('utf-8'))
+            except Exception as e:
+                logging.info(f"镜像不可用: {url} {str(e)}")
+                continue
+            if isinstance(release, dict) and 'tag_name' in release:
+                return release
+        return None
+
+    def _fetch_redirect(self):
+        """github.com/<仓库>/releases/latest 会跳转到最新版本的标签页，不受API限额影响，
+        只能得到版本号，没有更新说明和下载文件"""
+        url = LATEST_PAGE_URL.format(repo=self.repo)
+        request = urllib.request.Request(url, method='HEAD', headers={'User-Agent': USER_AGENT})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            final_url = response.geturl()
+        match = re.search(r'/releases/tag/([^/?#]+)$', final_url)
+        if not match:
+            raise ReleaseError("无法从发布页面确定最新版本")
+        tag = urllib.request.unquote(match.group(1))
+        return {'tag_name': tag, 'body': "", 'assets': [], 'html_url': final_url}
+
+    def rate_limit(self):
+        """最近一次记录的API额度，没有记录时返回None"""
+        with self.lock:
+            return self._load_cache().get('rate_limit')
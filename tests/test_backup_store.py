@@ -0,0 +1,167 @@
+import os
+import random
+
+import pytest
+
+import backup_store
+from backup_store import BackupStore
+
+NO_LIMITS = {'keep': None, 'max_age_days': None, 'max_bytes': None}
+
+
+def hosts_lines(count=300, seed=1):
+    rng = random.Random(seed)
+    return [f"{rng.randint(1, 255)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(0, 255)} "
+            f"host{i}.example.com\n" for i in range(count)]
+
+
+def save_versions(store, count, lines=None):
+    """保存count个相邻版本（每次改一行），返回各版本的内容"""
+    lines = lines or hosts_lines()
+    versions = []
+    for i in range(count):
+        lines[(i * 7) % len(lines)] = f"10.0.{i // 256}.{i % 256} changed{i}.example.com\n"
+        versions.append(''.join(lines))
+        store.save(versions[-1])
+    return versions
+
+
+def test_retention_max_bytes_frees_space_without_dropping_everything(tmp_path):
+    store = BackupStore(str(tmp_path), NO_LIMITS)
+    lines = hosts_lines()
+    versions = save_versions(store, 8, lines)
+    # 第9个备份使总大小略微超出限制，只需删除最旧的一个
+    store.retention['max_bytes'] = store.total_size() + 50
+
+    lines[100] = "10.1.1.1 last.example.com\n"
+    store.save(''.join(lines))
+
+    records = store.list()
+    assert store.total_size() <= store.retention['max_bytes']
+    assert len(records) == 8
+    assert store.verify() == []
+    # 保留的最旧版本改存为快照后仍能正确还原
+    assert store.read(records[-1]['name']) == versions[1]
+
+
+def test_retention_max_bytes_keeps_newest(tmp_path):
+    store = BackupStore(str(tmp_path), dict(NO_LIMITS, max_bytes=1))
+    versions = save_versions(store, 5)
+
+    records = store.list()
+    assert len(records) == 1
+    assert store.read(records[0]['name']) == versions[-1]
+    assert store.verify() == []
+
+
+def test_retention_keep(tmp_path):
+    store = BackupStore(str(tmp_path), dict(NO_LIMITS, keep=3))
+    versions = save_versions(store, 6)
+
+    records = store.list()
+    assert [store.read(r['name']) for r in records] == versions[:2:-1]
+    assert store.verify() == []
+
+
+def test_retention_max_age(tmp_path, monkeypatch):
+    now = [1700000000.0]
+    monkeypatch.setattr(backup_store.time, 'time', lambda: now[0])
+    store = BackupStore(str(tmp_path), dict(NO_LIMITS, max_age_days=1))
+    save_versions(store, 3)
+    now[0] += 2 * 86400
+    versions = save_versions(store, 2, hosts_lines(seed=2))
+
+    # 同一时刻保存的备份顺序不确定，只比较内容
+    assert sorted(store.read(r['name']) for r in store.list()) == sorted(versions)
+    assert store.verify() == []
+
+
+@pytest.mark.parametrize('base, data', [
+    (b"1.1.1.1 a.com\r\n2.2.2.2 b.com\r\n", b"1.1.1.1 a.com\r\n3.3.3.3 c.com\r\n2.2.2.2 b.com\r\n"),
+    (b"1.1.1.1 a.com\n2.2.2.2 b.com", b"1.1.1.1 a.com\n2.2.2.2 b.com\n4.4.4.4 d.com"),
+    (b"1.1.1.1 a.com\n", b"1.1.1.1 a.com"),
+    (b"", b"# \xe4\xb8\xad\xe6\x96\x87\n\xff\xfe raw\n"),
+    (b"1.1.1.1 a.com\n", b""),
+])
+def test_delta_round_trip(base, data):
+    assert backup_store.apply_delta(base, backup_store.encode_delta(base, data)) == data
+
+
+def test_save_and_read_crlf_without_trailing_newline(tmp_path):
+    store = BackupStore(str(tmp_path), NO_LIMITS)
+    first = store.save(b"127.0.0.1 localhost\r\n1.1.1.1 a.com\r\n" * 50)
+    second = store.save(b"127.0.0.1 localhost\r\n1.1.1.1 a.com\r\n" * 50 + b"2.2.2.2 b.com")
+
+    assert store.read_bytes(first['name']) == b"127.0.0.1 localhost\r\n1.1.1.1 a.com\r\n" * 50
+    assert store.read_bytes(second['name']).endswith(b"\r\n2.2.2.2 b.com")
+
+
+def test_delta_chain_past_snapshot_interval(tmp_path):
+    store = BackupStore(str(tmp_path), NO_LIMITS)
+    versions = save_versions(store, backup_store.SNAPSHOT_INTERVAL * 2 + 5)
+
+    objects = store._load()[1]
+    depths = [entry['depth'] for entry in objects.values()]
+    assert max(depths) == backup_store.SNAPSHOT_INTERVAL
+    # 链满后重新保存了快照
+    assert depths.count(0) >= 3
+    assert sorted(store.read(r['name']) for r in store.list()) == sorted(versions)
+    assert store.verify() == []
+
+
+def test_same_content_is_stored_once(tmp_path):
+    store = BackupStore(str(tmp_path), NO_LIMITS)
+    first = store.save("1.1.1.1 a.com\n")
+    assert store.save("1.1.1.1 a.com\n") == first
+    store.save("1.1.1.1 a.com\n", prefix="hosts.steam_backup_")
+
+    assert len(store.list()) == 2
+    assert len(store._load()[1]) == 1
+
+
+def test_delete_collects_unreferenced_objects(tmp_path):
+    store = BackupStore(str(tmp_path), NO_LIMITS)
+    save_versions(store, 3)
+    for record in store.list():
+        store.delete(record['name'])
+
+    assert store.list() == []
+    assert store.total_size() == 0
+    assert not any(files for _, _, files in os.walk(store.objects_dir))
+
+
+def test_verify_reports_corrupt_object(tmp_path):
+    store = BackupStore(str(tmp_path), NO_LIMITS)
+    save_versions(store, 3)
+    newest = store.list()[0]
+    with open(store._object_path(newest['hash']), 'wb') as f:
+        f.write(b"not zlib")
+
+    problems = store.verify()
+    assert [name for name, _ in problems] == [newest['name']]
+    with pytest.raises(Exception):
+        store.read(newest['name'])
+
+
+def test_import_legacy_files(tmp_path):
+    legacy = {
+        "hosts.backup_20240101_000000": b"1.1.1.1 github.com\n",
+        "hosts.steam_backup_20240102_000000": b"1.1.1.1 github.com\r\n2.2.2.2 steamcommunity.com",
+        "hosts.before_restore_20240103_000000": b"127.0.0.1 localhost\n",
+    }
+    for offset, (name, data) in enumerate(legacy.items()):
+        path = tmp_path / name
+        path.write_bytes(data)
+        os.utime(path, (1704067200 + offset * 86400,) * 2)
+    (tmp_path / "unrelated.txt").write_bytes(b"keep")
+
+    store = BackupStore(str(tmp_path), NO_LIMITS)
+
+    records = {r['name']: r for r in store.list()}
+    assert set(records) == set(legacy)
+    assert {name: store.read_bytes(name) for name in records} == legacy
+    assert records["hosts.steam_backup_20240102_000000"]['reason'] == 'steam_update'
+    assert records["hosts.before_restore_20240103_000000"]['time'] == 1704067200 + 2 * 86400
+    assert not any((tmp_path / name).exists() for name in legacy)
+    assert (tmp_path / "unrelated.txt").exists()
+    assert store.verify() == []
@@ -0,0 +1,124 @@
+import argparse
+import hashlib
+import lzma
+import random
+
+import pytest
+
+import cli
+import delta_update
+from delta_update import PatchError
+
+HEADER_END = len(delta_update.MAGIC) + delta_update._HEADER.size
+
+
+def program_versions():
+    rng = random.Random(7)
+    old = bytes(rng.getrandbits(8) for _ in range(200 * 1024))
+    # 新版本：中间插入新数据、修改一段、把一段内容移到开头
+    new = old[150000:160000] + old[:50000] + b"new code" * 100 + old[50000:120000] + \
+        bytes(rng.getrandbits(8) for _ in range(3000)) + old[123000:]
+    return old, new
+
+
+def write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def repack(patch, cut):
+    """解压补丁，截断到操作数据的cut字节处后重新压缩"""
+    data = lzma.decompress(patch)
+    return lzma.compress(data[:HEADER_END + cut])
+
+
+@pytest.fixture
+def files(tmp_path):
+    old, new = program_versions()
+    patch = delta_update.make_patch(old, new)
+    return {
+        'old': write(tmp_path / "old.exe", old),
+        'new': new,
+        'patch': patch,
+        'out': str(tmp_path / "new.exe"),
+        'tmp_path': tmp_path,
+    }
+
+
+def test_round_trip(files):
+    patch_path = write(files['tmp_path'] / "update.gfpatch", files['patch'])
+
+    delta_update.apply_patch(files['old'], patch_path, files['out'],
+                             hashlib.sha256(files['new']).hexdigest())
+
+    with open(files['out'], 'rb') as f:
+        assert f.read() == files['new']
+    # 大部分内容从旧文件复制，补丁远小于新文件
+    assert len(files['patch']) < len(files['new']) // 10
+
+
+@pytest.mark.parametrize('old, new', [(b"", b"abc" * 100), (b"abc" * 100, b""), (b"same" * 100, b"same" * 100)])
+def test_round_trip_edge_cases(tmp_path, old, new):
+    old_path = write(tmp_path / "old.exe", old)
+    patch_path = write(tmp_path / "update.gfpatch", delta_update.make_patch(old, new))
+    out = str(tmp_path / "new.exe")
+
+    delta_update.apply_patch(old_path, patch_path, out)
+
+    with open(out, 'rb') as f:
+        assert f.read() == new
+
+
+def test_header(files):
+    old_size, old_hash, new_size, new_hash, _ = delta_update.read_patch_header(files['patch'])
+    with open(files['old'], 'rb') as f:
+        old = f.read()
+    assert (old_size, old_hash) == (len(old), hashlib.sha256(old).hexdigest())
+    assert (new_size, new_hash) == (len(files['new']), hashlib.sha256(files['new']).hexdigest())
+
+
+@pytest.mark.parametrize('patch', [b"not a patch", lzma.compress(b"GFP0" + b"\0" * 80), lzma.compress(b"GFP1")])
+def test_corrupt_patch(files, patch):
+    patch_path = write(files['tmp_path'] / "update.gfpatch", patch)
+
+    with pytest.raises(PatchError):
+        delta_update.apply_patch(files['old'], patch_path, files['out'])
+
+
+@pytest.mark.parametrize('cut', [1, 5, 1 + delta_update._COPY.size + 3])
+def test_truncated_patch(files, cut):
+    patch_path = write(files['tmp_path'] / "update.gfpatch", repack(files['patch'], cut))
+
+    with pytest.raises(PatchError, match="不完整|校验失败"):
+        delta_update.apply_patch(files['old'], patch_path, files['out'])
+    assert not (files['tmp_path'] / "new.exe").exists()
+    assert not (files['tmp_path'] / "new.exe.patching").exists()
+
+
+def test_truncated_data_operation(tmp_path):
+    # 新旧内容完全不同时第一个操作是新数据
+    old_path = write(tmp_path / "old.exe", b"x" * 1000)
+    patch = delta_update.make_patch(b"x" * 1000, b"y" * 1000)
+    for cut in (3, 1 + delta_update._LENGTH.size + 10):
+        patch_path = write(tmp_path / "update.gfpatch", repack(patch, cut))
+        with pytest.raises(PatchError, match="不完整"):
+            delta_update.apply_patch(old_path, patch_path, str(tmp_path / "new.exe"))
+
+
+def test_wrong_old_file_and_expected_digest(files):
+    patch_path = write(files['tmp_path'] / "update.gfpatch", files['patch'])
+    other = write(files['tmp_path'] / "other.exe", b"other")
+
+    with pytest.raises(PatchError):
+        delta_update.apply_patch(other, patch_path, files['out'])
+    with pytest.raises(PatchError):
+        delta_update.apply_patch(files['old'], patch_path, files['out'], "0" * 64)
+
+
+def test_cli_apply_patch_reports_invalid_patch(files):
+    patch_path = write(files['tmp_path'] / "update.gfpatch", repack(files['patch'], 5))
+    args = argparse.Namespace(old=files['old'], patch=patch_path, output=files['out'], sha256=None)
+
+    with pytest.raises(cli.CliError) as error:
+        cli.cmd_apply_patch(args)
+    assert error.value.exit_code == cli.EXIT_INVALID
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import downloader
+
+DATA = bytes(range(256)) * 1024      # 256KB
+DATA_SHA256 = hashlib.sha256(DATA).hexdigest()
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """支持 Range: bytes=START-[END] 的静态文件，记录收到的Range和Host头"""
+
+    def do_GET(self):
+        self.server.ranges.append(self.headers.get('Range'))
+        self.server.hosts.append(self.headers.get('Host'))
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range') or '')
+        if match:
+            start = int(match.group(1))
+            end = int(match.group(2)) + 1 if match.group(2) else len(DATA)
+            body = DATA[start:end]
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{end - 1}/{len(DATA)}")
+        else:
+            body = DATA
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    httpd.ranges = []
+    httpd.hosts = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def small_segments(monkeypatch):
+    # 测试文件只有256KB，按16KB分段
+    monkeypatch.setattr(downloader, 'MIN_SEGMENT', 16 * 1024)
+
+
+def file_url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/file.bin"
+
+
+def test_download_segmented(server, tmp_path):
+    dest = str(tmp_path / "file.bin")
+
+    result = downloader.download_segmented(file_url(server), dest, size=len(DATA), sha256=DATA_SHA256,
+                                           connections=4, ips=[])
+
+    assert result == dest
+    with open(dest, 'rb') as f:
+        assert f.read() == DATA
+    # 第一个是探测大小的 bytes=0-0，之后每段一个请求
+    segment_ranges = [r for r in server.ranges if r != 'bytes=0-0']
+    assert len(segment_ranges) == 4 * downloader.SEGMENTS_PER_CONNECTION
+    assert not (tmp_path / "file.bin.part").exists()
+    assert not (tmp_path / "file.bin.part.json").exists()
+
+
+def test_pinned_connection_uses_ip_and_keeps_host(server):
+    # .invalid 域名无法解析，只有连接指定的IP才能成功
+    connection = downloader.PinnedHTTPConnection('mirror.invalid', server.server_address[1],
+                                                 ip='127.0.0.1', timeout=5)
+    try:
+        connection.request('GET', '/file.bin', headers={'Range': 'bytes=0-9'})
+        response = connection.getresponse()
+        assert response.status == 206
+        assert response.read() == DATA[:10]
+    finally:
+        connection.close()
+    assert server.hosts == [f"mirror.invalid:{server.server_address[1]}"]
+
+
+def test_download_resumes_from_part_file(server, tmp_path):
+    dest = str(tmp_path / "file.bin")
+    url = file_url(server)
+    offset = 100000
+    with open(dest + ".part", 'wb') as f:
+        f.write(DATA[:offset])
+    with open(dest + ".part.json", 'w', encoding='utf-8') as f:
+        json.dump({'url': url, 'size': len(DATA), 'sha256': DATA_SHA256}, f)
+
+    downloader.download(url, dest, size=len(DATA), sha256=DATA_SHA256)
+
+    assert server.ranges == [f"bytes={offset}-"]
+    with open(dest, 'rb') as f:
+        assert f.read() == DATA
+
+
+def test_download_segmented_resumes_saved_segments(server, tmp_path):
+    dest = str(tmp_path / "file.bin")
+    url = file_url(server)
+    half = len(DATA) // 2
+    with open(dest + ".part", 'wb') as f:
+        f.write(DATA[:half] + b'\0' * (len(DATA) - half))
+    segments = [[0, half, half], [half, len(DATA), 0]]
+    with open(dest + ".part.json", 'w', encoding='utf-8') as f:
+        json.dump({'url': url, 'size': len(DATA), 'sha256': DATA_SHA256, 'segments': segments}, f)
+
+    downloader.download_segmented(url, dest, size=len(DATA), sha256=DATA_SHA256, connections=2, ips=[])
+
+    assert server.ranges == ['bytes=0-0', f"bytes={half}-{len(DATA) - 1}"]
+    with open(dest, 'rb') as f:
+        assert f.read() == DATA
+
+
+def test_checksum_mismatch_raises(server, tmp_path):
+    dest = str(tmp_path / "file.bin")
+
+    with pytest.raises(downloader.ChecksumError):
+        downloader.download_segmented(file_url(server), dest, size=len(DATA), sha256="0" * 64,
+                                      connections=4, ips=[], sleep=lambda delay: None)
+
+    assert not (tmp_path / "file.bin").exists()
+    assert not (tmp_path / "file.bin.part").exists()
@@ -0,0 +1,64 @@
+import os
+import stat
+
+import hosts_core
+
+STEAM_HEADER = "# Steam Hosts 配置\n# 来源: https://github.com/Clov614/SteamHostSync\n# 更新时间: 2024-01-01 00:00:00\n\n"
+
+
+def steam_hosts(api_ip):
+    return hosts_core.merge_steam_hosts(
+        "127.0.0.1 localhost\n",
+        STEAM_HEADER + f"1.1.1.1 steamcommunity.com\n1.1.1.2 store.steampowered.com\n{api_ip} api.steampowered.com\n")
+
+
+def test_restore_steam_section_includes_entries_after_header_blank_line():
+    backup = steam_hosts("1.1.1.3")
+    current = steam_hosts("9.9.9.3").replace("1.1.1.1 steamcommunity.com", "9.9.9.1 steamcommunity.com")
+
+    restored = hosts_core.restore_section(current, backup, 'steam')
+
+    mapping = hosts_core.hosts_mapping(restored)
+    assert mapping['api.steampowered.com'] == "1.1.1.3"
+    assert mapping['steamcommunity.com'] == "1.1.1.1"
+    assert mapping['localhost'] == "127.0.0.1"
+    assert "9.9.9.3" not in restored
+    assert "# Steam Hosts 配置" in restored
+
+
+def test_restore_steam_section_without_steam_in_backup_removes_section():
+    restored = hosts_core.restore_section(steam_hosts("9.9.9.3"), "127.0.0.1 localhost\n", 'steam')
+
+    assert not any(hosts_core.is_steam_hostname(hostname) for hostname in hosts_core.hosts_mapping(restored))
+    assert "Steam Hosts" not in restored
+    assert "127.0.0.1 localhost" in restored
+
+
+def test_update_hosts_file_replaces_atomically(tmp_path, monkeypatch):
+    monkeypatch.setattr(hosts_core, 'HOSTS_LOCK', str(tmp_path / "hosts.lock"))
+    hosts_path = str(tmp_path / "hosts")
+    with open(hosts_path, 'w', encoding='utf-8') as f:
+        f.write("127.0.0.1 localhost\n")
+    os.chmod(hosts_path, 0o644)
+
+    backup_name, new_content, changed = hosts_core.update_hosts_file(
+        lambda current: current + "1.2.3.4 github.com\n", backup_prefix="hosts.backup_",
+        hosts_path=hosts_path, backup_dir=str(tmp_path / "backup"))
+
+    assert changed and backup_name
+    assert hosts_core.read_hosts_file(hosts_path) == new_content
+    assert stat.S_IMODE(os.stat(hosts_path).st_mode) == 0o644
+    assert not os.path.exists(hosts_path + ".tmp")
+    store = hosts_core.BackupStore(str(tmp_path / "backup"))
+    assert store.read(backup_name) == "127.0.0.1 localhost\n"
+
+
+def test_update_hosts_file_without_change_does_not_write(tmp_path, monkeypatch):
+    monkeypatch.setattr(hosts_core, 'HOSTS_LOCK', str(tmp_path / "hosts.lock"))
+    hosts_path = str(tmp_path / "hosts")
+    with open(hosts_path, 'w', encoding='utf-8') as f:
+        f.write("127.0.0.1 localhost\n")
+
+    assert hosts_core.update_hosts_file(lambda current: current, backup_prefix="hosts.backup_",
+                                        hosts_path=hosts_path, backup_dir=str(tmp_path / "backup")) == \
+        (None, "127.0.0.1 localhost\n", False)
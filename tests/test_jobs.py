@@ -0,0 +1,55 @@
+import threading
+
+import jobs
+
+
+def run_job(fn, **callbacks):
+    """提交任务并等待回调，deliver直接在工作线程调用回调"""
+    finished = threading.Event()
+    results = []
+
+    def record(kind):
+        def callback(*args):
+            results.append((kind,) + args)
+            finished.set()
+        return callback
+
+    executor = jobs.JobExecutor(lambda callback, *args: callback(*args))
+    job = executor.submit("测试", fn, on_done=record('done'), on_error=record('error'),
+                          on_cancel=record('cancel'), **callbacks)
+    assert finished.wait(5)
+    executor.shutdown()
+    return job, results
+
+
+def test_job_cancelled_after_work_finished_reports_done():
+    def work(job):
+        job.cancel()
+        return 'written'
+
+    job, results = run_job(work)
+
+    assert results == [('done', 'written')]
+    assert job.state == jobs.DONE
+
+
+def test_job_cancelled_while_working_reports_cancel():
+    def work(job):
+        job.cancel()
+        job.check()
+
+    job, results = run_job(work)
+
+    assert results == [('cancel',)]
+    assert job.state == jobs.CANCELLED
+
+
+def test_duplicate_key_is_rejected():
+    release = threading.Event()
+    executor = jobs.JobExecutor(lambda callback, *args: callback(*args))
+    try:
+        assert executor.submit("写入", lambda job: release.wait(5), key='hosts') is not None
+        assert executor.submit("写入", lambda job: None, key='hosts') is None
+    finally:
+        release.set()
+        executor.shutdown()
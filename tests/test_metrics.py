@@ -0,0 +1,69 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def registry():
+    registry = metrics.Registry()
+    requests = registry.register(metrics.Counter('test_requests', "Requests by source", ('source',)))
+    latency = registry.register(metrics.Histogram('test_latency_seconds', "Latency", ('phase',),
+                                                  buckets=(0.1, 1.0)))
+    size = registry.register(metrics.Gauge('test_size_bytes', "Size"))
+    requests.inc(source='github.com')
+    requests.inc(2, source='a"b')
+    latency.observe(0.05, phase='tcp')
+    latency.observe(0.5, phase='tcp')
+    size.set_function(lambda: 1024)
+    return registry
+
+
+@pytest.fixture
+def server(registry):
+    server = metrics.MetricsServer(port=0, registry=registry,
+                                   routes={'/status': lambda: ('application/json', b'{}')}).start()
+    yield server
+    server.stop()
+
+
+def scrape(server, path='/metrics'):
+    host, port = server.address
+    with urllib.request.urlopen(f"http://{host}:{port}{path}", timeout=5) as response:
+        return response.headers.get('Content-Type'), response.read().decode('utf-8')
+
+
+def test_scrape_openmetrics(server):
+    content_type, body = scrape(server)
+
+    assert content_type == metrics.CONTENT_TYPE
+    lines = body.splitlines()
+    assert "# TYPE test_requests counter" in lines
+    assert "# HELP test_requests Requests by source" in lines
+    assert 'test_requests_total{source="github.com"} 1' in lines
+    assert 'test_requests_total{source="a\\"b"} 2' in lines
+    assert "# TYPE test_latency_seconds histogram" in lines
+    assert 'test_latency_seconds_bucket{phase="tcp",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{phase="tcp",le="1"} 2' in lines
+    assert 'test_latency_seconds_bucket{phase="tcp",le="+Inf"} 2' in lines
+    assert 'test_latency_seconds_count{phase="tcp"} 2' in lines
+    assert 'test_latency_seconds_sum{phase="tcp"} 0.55' in lines
+    assert "# TYPE test_size_bytes gauge" in lines
+    assert "test_size_bytes 1024" in lines
+    assert lines[-1] == "# EOF"
+    assert body.endswith("# EOF\n")
+
+
+def test_extra_routes_and_404(server):
+    assert scrape(server, '/status') == ('application/json', '{}')
+    with pytest.raises(urllib.error.HTTPError) as error:
+        scrape(server, '/missing')
+    assert error.value.code == 404
+
+
+def test_labels_are_required():
+    counter = metrics.Counter('test_labeled', "Labeled", ('type',))
+    with pytest.raises(ValueError):
+        counter.inc()
@@ -0,0 +1,148 @@
+# timeseries.py
+"""探测与诊断结果的本地时序存储（SQLite），支持按小时统计p50/p95"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    ip TEXT NOT NULL DEFAULT '',
+    metric TEXT NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_samples_metric_ts ON samples (metric, ts);
+CREATE INDEX IF NOT EXISTS idx_samples_series ON samples (domain, ip, metric, ts);
+CREATE TABLE IF NOT EXISTS events (
+    ts REAL NOT NULL,
+    type TEXT NOT NULL,
+    detail TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events (ts);
+"""
+
+# 诊断结果中记录的指标
+PHASE_METRICS = ['resolve_ms', 'tcp_ms', 'tls_ms', 'ttfb_ms']
+
+
+def percentile(sorted_values, pct):
+    """最近秩法计算百分位数，sorted_values需已排序"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class TimeSeriesStore:
+    """按 域名/IP/指标 记录带时间戳的样本，可在多个线程中使用"""
+
+    def __init__(self, path, retention_days=90):
+        self.path = path
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.executescript(SCHEMA)
+        self.prune(retention_days)
+
+    def record(self, kind, domain, metric, value, ip=None, ts=None):
+        """记录单个样本"""
+        self.record_many([(ts or time.time(), kind, domain, ip or '', metric, value)])
+
+    def record_many(self, rows):
+        """批量记录样本，rows为 (ts, kind, domain, ip, metric, value) 元组"""
+        rows = [row for row in rows if row[5] is not None]
+        if not rows:
+            return
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO samples (ts, kind, domain, ip, metric, value) VALUES (?, ?, ?, ?, ?, ?)",
+                rows)
+
+    def record_phase_results(self, results, kind='diagnosis'):
+        """记录netprobe分阶段诊断的结果"""
+        now = time.time()
+        rows = []
+        for result in results:
+            for metric in PHASE_METRICS:
+                rows.append((now, kind, result['domain'], result.get('ip') or '',
+                             metric, result.get(metric)))
+            # 失败次数也记录下来，便于观察可用性
+            rows.append((now, kind, result['domain'], result.get('ip') or '',
+                         'failure', 1 if result.get('error') else 0))
+        self.record_many(rows)
+
+    def record_benchmark(self, result, kind='benchmark'):
+        """记录一次下载测速的吞吐量和首字节延迟"""
+        domain = urlparse(result.get('url') or '').hostname or ''
+        now = time.time()
+        self.record_many([
+            (now, kind, domain, result.get('ip') or '', 'throughput_kbps', result.get('throughput_kbps')),
+            (now, kind, domain, result.get('ip') or '', 'ttfb_ms', result.get('ttfb_ms')),
+        ])
+
+    def record_event(self, event_type, detail='', ts=None):
+        """记录hosts更新、恢复等事件，用于在趋势图上对照"""
+        with self.lock, self.conn:
+            self.conn.execute("INSERT INTO events (ts, type, detail) VALUES (?, ?, ?)",
+                              (ts or time.time(), event_type, detail))
+
+    def events(self, since=None):
+        """查询事件列表，返回 (ts, type, detail)"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT ts, type, detail FROM events WHERE ts >= ? ORDER BY ts",
+                (since or 0,)).fetchall()
+
+    def series_keys(self, metric, since=None):
+        """列出指定指标在时间窗口内出现过的 (域名, IP) 组合"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT DISTINCT domain, ip FROM samples WHERE metric = ? AND ts >= ? ORDER BY domain, ip",
+                (metric, since or 0)).fetchall()
+
+    def query(self, domain, metric, ip=None, since=None, until=None):
+        """查询原始样本，返回 (ts, value) 列表"""
+        sql = "SELECT ts, value FROM samples WHERE domain = ? AND metric = ? AND ts >= ? AND ts <= ?"
+        params = [domain, metric, since or 0, until or time.time()]
+        if ip is not None:
+            sql += " AND ip = ?"
+            params.append(ip)
+        with self.lock:
+            return self.conn.execute(sql + " ORDER BY ts", params).fetchall()
+
+    def aggregate(self, domain, metric, ip=None, since=None, until=None, bucket_seconds=3600):
+        """按时间窗口聚合，返回 [{'bucket', 'count', 'p50', 'p95'}]，默认每小时一个窗口"""
+        buckets = {}
+        for ts, value in self.query(domain, metric, ip, since, until):
+            buckets.setdefault(int(ts // bucket_seconds) * bucket_seconds, []).append(value)
+
+        aggregates = []
+        for bucket in sorted(buckets):
+            values = sorted(buckets[bucket])
+            aggregates.append({
+                'bucket': bucket,
+                'count': len(values),
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+            })
+        return aggregates
+
+    def prune(self, retention_days):
+        """删除超过保留天数的样本和事件"""
+        cutoff = time.time() - retention_days * 86400
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM samples WHERE ts < ?", (cutoff,))
+            self.conn.execute("DELETE FROM events WHERE ts < ?", (cutoff,))
+
+    def close(self):
+        """关闭数据库连接"""
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,228 @@
+# tracing.py
+"""耗时追踪：记录获取、解码、校验、提取、探测、备份、写入、刷新等步骤的耗时和嵌套关系
+
+用户反馈"很慢"时，日志只能看出第几次尝试获取，看不出时间花在获取、重试、备份、写入还是刷新DNS上。
+用 --trace <文件> 启动（命令行和GUI都支持）后记录每个步骤，退出时写入文件:
+    .json 结尾   Chrome追踪格式，可在 chrome://tracing 或 https://ui.perfetto.dev 中按线程查看
+    其他         JSON Lines，每行一个步骤，便于用脚本统计
+
+在代码中使用:
+    with tracing.span('fetch', url=url) as s:
+        data = response.read()
+        s.set(bytes=len(data))
+
+未启用时span()直接返回同一个空对象，只多一次函数调用和一次判断。
+"""
+import atexit
+import functools
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+
+# 最多保存的步骤数，之后的丢弃（长时间运行的后台服务不会无限占用内存）
+MAX_SPANS = 200000
+
+_enabled = False
+_path = None
+_spans = []
+_dropped = 0
+_lock = threading.Lock()
+_local = threading.local()
+_ids = itertools.count(1)
+# 记录的时间相对于此时刻
+_origin = time.perf_counter()
+
+
+class _NullSpan:
+    """未启用时使用的空步骤"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+class Span:
+    """一个步骤：名称、属性、开始时间、耗时、所在线程和同一线程中的父步骤"""
+
+    __slots__ = ('name', 'attrs', 'id', 'parent', 'thread', 'thread_name', 'start', 'duration', 'error')
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.id = next(_ids)
+        self.parent = None
+        self.thread = None
+        self.thread_name = None
+        self.start = None
+        self.duration = None
+        self.error = None
+
+    def set(self, **attrs):
+        """补充属性，如读取完成后的字节数"""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = _stack()
+        self.parent = stack[-1].id if stack else None
+        stack.append(self)
+        current = threading.current_thread()
+        self.thread = current.ident
+        self.thread_name = current.name
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        if exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _record(self)
+        return False
+
+    def to_dict(self):
+        """JSON Lines中的一行，时间单位为毫秒"""
+        record = {
+            'name': self.name,
+            'id': self.id,
+            'parent': self.parent,
+            'thread': self.thread_name,
+            'start_ms': round((self.start - _origin) * 1000, 3),
+            'duration_ms': round(self.duration * 1000, 3),
+        }
+        if self.attrs:
+            record['attrs'] = self.attrs
+        if self.error:
+            record['error'] = self.error
+        return record
+
+
+def _record(span):
+    global _dropped
+    with _lock:
+        if len(_spans) < MAX_SPANS:
+            _spans.append(span)
+        else:
+            _dropped += 1
+
+
+def span(name, **attrs):
+    """记录一个步骤（with语句），未启用时返回空对象"""
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, attrs)
+
+
+def traced(name, *arg_names):
+    """函数装饰器：把整个调用记录为一个步骤，前几个位置参数按arg_names记为属性"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(name, dict(zip(arg_names, args))):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable(path):
+    """开始记录，程序退出时写入path"""
+    global _enabled, _path
+    if _path is None:
+        atexit.register(dump)
+    _path = path
+    _enabled = True
+    logging.info(f"已启用耗时追踪，退出时写入: {path}")
+
+
+def trace_path_from_argv(argv):
+    """从命令行参数中取出 --trace <文件> 或 --trace=<文件>，没有时返回None"""
+    for index, arg in enumerate(argv):
+        if arg == '--trace' and index + 1 < len(argv):
+            return argv[index + 1]
+        if arg.startswith('--trace='):
+            return arg[len('--trace='):]
+    return None
+
+
+def spans():
+    """已记录的步骤（按结束时间排序）"""
+    with _lock:
+        return list(_spans)
+
+
+def chrome_trace(records):
+    """转换为Chrome追踪格式（完整事件 ph=X，时间单位为微秒）"""
+    pid = os.getpid()
+    events = []
+    thread_names = {}
+    for record in records:
+        thread_names[record.thread] = record.thread_name
+        args = dict(record.attrs)
+        args.update(id=record.id, parent=record.parent)
+        if record.error:
+            args['error'] = record.error
+        events.append({
+            'name': record.name,
+            'cat': record.name.split('.')[0],
+            'ph': 'X',
+            'ts': round((record.start - _origin) * 1e6, 1),
+            'dur': round(record.duration * 1e6, 1),
+            'pid': pid,
+            'tid': record.thread,
+            'args': args,
+        })
+    for tid, thread_name in thread_names.items():
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                       'args': {'name': thread_name}})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def dump(path=None):
+    """写入已记录的步骤，返回写入的路径；未启用或没有路径时返回None"""
+    path = path or _path
+    if not path:
+        return None
+    records = spans()
+    try:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            if path.lower().endswith('.json'):
+                json.dump(chrome_trace(records), f, ensure_ascii=False, default=str)
+            else:
+                for record in records:
+                    f.write(json.dumps(record.to_dict(), ensure_ascii=False, default=str) + "\n")
+    except OSError as e:
+        logging.error(f"写入耗时追踪失败: {path} {str(e)}")
+        return None
+    if _dropped:
+        logging.warning(f"耗时追踪超过{MAX_SPANS}条，丢弃了{_dropped}条")
+    logging.info(f"已写入耗时追踪({len(records)}条): {path}")
+    return path